@@ -3,8 +3,8 @@ from django.shortcuts import render
 from django.utils.deprecation import MiddlewareMixin
 import time
 from .models import ActivityLog
-from threatintel.models import ThreatIP
-from monitor.models import Alert
+from threatintel.matcher import matcher as threat_matcher
+from monitor import alerts
 
 class ThreatIntelMiddleware:
     def __init__(self, get_response):
@@ -13,8 +13,11 @@ class ThreatIntelMiddleware:
     def __call__(self, request):
         ip = request.META.get("REMOTE_ADDR")
 
-        if ThreatIP.objects.filter(ip=ip).exists():
-            Alert.objects.create(
+        threat_matcher.refresh_if_due()
+        if threat_matcher.match(ip):
+            # Coalesced: one Alert row per IP however many requests it sends
+            alerts.emitter.emit(
+                alerts.BLACKLISTED_CLIENT, ip,
                 severity="High",
                 message=f"User login attempt from blacklisted IP {ip}"
             )
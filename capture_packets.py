@@ -1,22 +1,37 @@
 import os
+import sys
+import argparse
 import django
+import multiprocessing
+import queue
+import signal
+import threading
 import traceback
 import time
-from django.utils import timezone
-from scapy.all import sniff, get_if_list, conf, IP, ICMP
+from scapy.all import sniff, get_if_list, conf
 
 # ------------------ 1. Django setup ------------------
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "network_monitor.settings")
 django.setup()
 
-from monitor.models import NetworkLog, Alert
+from django.conf import settings
+from django.db import connections
 
-# Optional ThreatIntel
-try:
-    from threatintel.models import ThreatIP
-    THREAT_INTEL_ENABLED = True
-except Exception:
-    THREAT_INTEL_ENABLED = False
+from monitor.capture import (
+    make_persister, make_detector, build_pipeline, decode_frame, parse_packet,
+    CAPTURE_MODE, MODES, CAPTURE_PARSER, PARSERS, RAW, THREAT_INTEL_ENABLED,
+)
+from monitor.pcapfile import Frame
+from monitor.sampling import CaptureProfile
+
+STATS_INTERVAL = 30   # seconds between pipeline stats reports
+WORKER_REPORT = 5     # seconds between worker -> supervisor stats messages
+RESTART_DELAY = 5     # seconds before a dead capture worker is restarted
+
+# Linux PACKET_FANOUT: spread one interface over several sockets by flow hash
+SOL_PACKET = 263
+PACKET_FANOUT = 18
+PACKET_FANOUT_HASH = 0
 
 # ------------------ 2. Auto-detect interface ------------------
 def choose_interface():
@@ -28,78 +43,272 @@ def choose_interface():
 
 INTERFACE = "\\Device\\NPF_{7BEE7DF4-F0AC-4A00-8426-F29888BA0183}"
 
-print(f"Sniffing on interface: {INTERFACE}")
-print(f"Threat Intelligence Enabled: {THREAT_INTEL_ENABLED}\n")
+# Interfaces to capture on; empty means just INTERFACE
+CAPTURE_INTERFACES = getattr(settings, "MONITOR_CAPTURE_INTERFACES", [])
 
 conf.use_pcap = True
 conf.sniff_promisc = True
 
-# ------------------ 3. Packet callback ------------------
-def packet_callback(pkt):
+# ------------------ 3. Raw capture ------------------
+def sniff_raw(iface, on_frame, bpf="ip", fanout_group=None):
+    """
+    Like sniff(), but hands over undissected frames: recv_raw() returns the
+    bytes and timestamp without building scapy layers.
+
+    With ``fanout_group`` the socket joins a Linux PACKET_FANOUT group, so
+    every process in the group receives its own share of the interface's
+    flows (one process per RSS queue / core).
+    """
+    sock = conf.L2listen(iface=iface, filter=bpf, promisc=conf.sniff_promisc)
+    if fanout_group is not None:
+        sock.ins.setsockopt(SOL_PACKET, PACKET_FANOUT, fanout_group | (PACKET_FANOUT_HASH << 16))
+    linktypes = {}
     try:
-        if IP not in pkt:
-            return
+        while True:
+            cls, data, ts = sock.recv_raw()
+            if not data:
+                continue
+            linktype = linktypes.get(cls)
+            if linktype is None:
+                linktype = linktypes[cls] = conf.l2types.layer2num.get(cls, 1)
+            on_frame(Frame(ts or time.time(), linktype, data, len(data)))
+    finally:
+        sock.close()
+
+# ------------------ 4. Stats reporter ------------------
+def print_stats(pipeline, persister, sampler, detector):
+    print("📊 Pipeline:", pipeline.stats())
+    print("📊 Writers:", persister.stats())
+    if sampler is not None:
+        print("📊 Sampling:", sampler.stats())
+    if detector is not None:
+        print("📊 Detection:", detector.stats())
+
+def report_stats(pipeline, persister, sampler, detector, stop):
+    while not stop.wait(STATS_INTERVAL):
+        print_stats(pipeline, persister, sampler, detector)
+
+def worker_summary(pipeline, persister):
+    stages = pipeline.stats()
+    return {
+        "packets": stages["parse"]["received"],
+        "dropped": sum(stage["dropped"] for stage in stages.values()),
+        "written": persister.log_writer.rows_written,
+    }
+
+def send_stats(pipeline, persister, stop, shard, stats_queue):
+    while not stop.wait(WORKER_REPORT):
+        stats_queue.put((shard, time.time(), worker_summary(pipeline, persister)))
+
+# ------------------ 5. Continuous sniffing ------------------
+def run_capture(iface, args, fanout_group=None, shard=None, stats_queue=None):
+    """Capture one interface (or one fanout share of it) until interrupted."""
+    profile = CaptureProfile.load(args.profile)
 
-        src = pkt[IP].src
-        dst = pkt[IP].dst
-        proto = str(pkt[IP].proto)
-        length = len(pkt)
-        now = timezone.now()
+    print(f"Sniffing on interface: {iface}" + (f" (fanout group {fanout_group})" if fanout_group is not None else ""))
+    print(f"Capture mode: {args.mode} | parser: {args.parser}")
+    print(f"Capture profile: {profile}")
+    print(f"Threat Intelligence Enabled: {THREAT_INTEL_ENABLED}\n")
 
-        # Print ICMP packets for clarity
-        if ICMP in pkt:
-            print(f"ICMP Packet: {src} -> {dst} | {length} bytes")
+    # capture -> parse (+ sampling) -> enrich/detect -> persist, joined by bounded queues
+    persister = make_persister(args.mode).start()
+    sampler = profile.sampler()
+    detector = make_detector()
+    parse = decode_frame if args.parser == RAW else parse_packet
+    pipeline = build_pipeline(persister, parse=parse, sampler=sampler, detector=detector).start()
 
-        # Log packet to DB
+    def on_packet(pkt):
+        pipeline.submit(pkt)  # returns None: scapy prints whatever prn returns
+
+    def on_frame(frame):
+        pipeline.submit(profile.truncate(frame))
+
+    stop = threading.Event()
+    threading.Thread(target=report_stats, args=(pipeline, persister, sampler, detector, stop), daemon=True).start()
+    if stats_queue is not None:
+        threading.Thread(target=send_stats, args=(pipeline, persister, stop, shard, stats_queue), daemon=True).start()
+
+    while True:
         try:
-            NetworkLog.objects.create(
-                source_ip=src,
-                destination_ip=dst,
-                protocol=proto,
-                bytes_transferred=length,
-                timestamp=now
-            )
-            print(f"[LOG] {src} → {dst} | {length} bytes | proto {proto}")
+            if args.parser == RAW:
+                sniff_raw(iface, on_frame, bpf=profile.bpf, fanout_group=fanout_group)
+            else:
+                sniff(iface=iface, prn=on_packet, store=False, filter=profile.bpf)
+        except PermissionError:
+            print("❌ Permission denied. Run the script as Administrator/root.")
+            break
+        except KeyboardInterrupt:
+            print(f"\n🛑 Sniffer on {iface} stopped.")
+            break
         except Exception as e:
-            print("❌ Failed to log packet:", e)
+            print("⚠ Sniffer error:", e)
             traceback.print_exc()
+            print("⏳ Restarting sniffing in 5 seconds...")
+            time.sleep(5)
 
-        # Threat Intelligence
-        if THREAT_INTEL_ENABLED:
-            if ThreatIP.objects.filter(ip=src).exists():
-                print(f"⚠ Threat: Malicious Source {src}")
-                Alert.objects.create(
-                    message=f"Malicious source IP detected: {src}",
-                    severity="High"
-                )
-            if ThreatIP.objects.filter(ip=dst).exists():
-                print(f"⚠ Threat: Malicious Destination {dst}")
-                Alert.objects.create(
-                    message=f"Connection to malicious IP: {dst}",
-                    severity="High"
-                )
-
-        # Placeholder for future anomaly detection
-        # detect_high_traffic()
-        # detect_port_scan()
-        # detect_icmp_flood()
-
-    except Exception as e:
-        print("❌ Callback error:", e)
-        traceback.print_exc()
-
-# ------------------ 4. Continuous sniffing ------------------
-while True:
-    try:
-        sniff(iface=INTERFACE, prn=packet_callback, store=False, filter="ip")
-    except PermissionError:
-        print("❌ Permission denied. Run the script as Administrator/root.")
-        break
-    except KeyboardInterrupt:
-        print("\n🛑 Sniffer stopped by user.")
-        break
-    except Exception as e:
-        print("⚠ Sniffer error:", e)
-        traceback.print_exc()
-        print("⏳ Restarting sniffing in 5 seconds...")
-        time.sleep(5)
\ No newline at end of file
+    # ------------------ 6. Shutdown ------------------
+    stop.set()
+    pipeline.stop()
+    persister.close()
+    print_stats(pipeline, persister, sampler, detector)
+    if stats_queue is not None:
+        stats_queue.put((shard, time.time(), worker_summary(pipeline, persister)))
+
+# ------------------ 7. Multi-interface supervisor ------------------
+def _raise_interrupt(signum, frame):
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)  # once: let the flush finish
+    raise KeyboardInterrupt
+
+def capture_worker(iface, args, fanout_group, shard, stats_queue):
+    # Ctrl+C reaches the whole process group; workers wait for the supervisor's
+    # SIGTERM instead, which takes the same flush-and-exit path
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    if fanout_group is not None:
+        conf.use_pcap = False  # fanout needs the native AF_PACKET socket
+    run_capture(iface, args, fanout_group, shard, stats_queue)
+
+def rates(previous, latest):
+    """
+    (packets/s, drops/s) of one worker between two (time, summary) samples.
+    Zero on its first sample, and when its counters went backwards because
+    the worker was restarted in between.
+    """
+    if previous is None:
+        return 0.0, 0.0
+    (then_at, then), (at, now) = previous, latest
+    if at <= then_at or now["packets"] < then["packets"] or now["dropped"] < then["dropped"]:
+        return 0.0, 0.0
+    elapsed = at - then_at
+    return (now["packets"] - then["packets"]) / elapsed, (now["dropped"] - then["dropped"]) / elapsed
+
+class Supervisor:
+    """
+    Runs one capture process per interface (or per fanout queue), each with
+    its own pipeline and batch writers, restarts workers that die, and prints
+    per-interface packet and drop rates.
+    """
+
+    def __init__(self, interfaces, args):
+        self.args = args
+        self.stats_queue = multiprocessing.Queue()
+        self.shards = []  # (iface, fanout group or None)
+        for n, iface in enumerate(interfaces):
+            if args.queues > 1:
+                group = (os.getpid() + n) & 0xFFFF
+                self.shards += [(iface, group)] * args.queues
+            else:
+                self.shards.append((iface, None))
+        self.procs = [None] * len(self.shards)
+        self.restarts = [0] * len(self.shards)
+        self.latest = {}    # shard -> (time, summary)
+        self.previous = {}  # shard -> (time, summary) at the last report
+        self.dead_since = {}  # shard -> monotonic time its worker was first seen dead
+
+    def start_worker(self, shard):
+        iface, group = self.shards[shard]
+        proc = multiprocessing.Process(
+            target=capture_worker,
+            args=(iface, self.args, group, shard, self.stats_queue),
+            name=f"capture-{shard}",
+        )
+        proc.start()
+        self.procs[shard] = proc
+
+    def run(self):
+        connections.close_all()  # never share the parent's DB connection with workers
+        for shard in range(len(self.shards)):
+            self.start_worker(shard)
+
+        next_report = time.monotonic() + STATS_INTERVAL
+        try:
+            while True:
+                self.drain_stats(timeout=1)
+                now = time.monotonic()
+                self.restart_dead(now)
+                if now >= next_report:
+                    next_report = now + STATS_INTERVAL
+                    self.report()
+        except KeyboardInterrupt:
+            print("\n🛑 Stopping capture workers...")
+        finally:
+            for proc in self.procs:
+                if proc.is_alive():
+                    proc.terminate()
+            for proc in self.procs:
+                proc.join()
+            self.drain_stats(timeout=0)
+            self.report()
+
+    def restart_dead(self, now):
+        """Restart workers that have been dead for RESTART_DELAY seconds."""
+        for shard, proc in enumerate(self.procs):
+            if proc.is_alive():
+                self.dead_since.pop(shard, None)
+                continue
+            self.dead_since.setdefault(shard, now)
+            if now - self.dead_since[shard] >= RESTART_DELAY:
+                print(f"⚠ Capture worker {shard} on {self.shards[shard][0]} exited "
+                      f"(code {proc.exitcode}); restarting")
+                del self.dead_since[shard]
+                self.restarts[shard] += 1
+                # The new worker counts from zero: its first sample starts a new rate
+                self.previous.pop(shard, None)
+                self.start_worker(shard)
+
+    def drain_stats(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                shard, at, summary = self.stats_queue.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                return
+            self.latest[shard] = (at, summary)
+
+    def report(self):
+        per_iface = {}
+        for shard, (iface, _) in enumerate(self.shards):
+            row = per_iface.setdefault(iface, {"pps": 0.0, "drops_ps": 0.0, "packets": 0,
+                                               "dropped": 0, "written": 0, "restarts": 0})
+            row["restarts"] += self.restarts[shard]
+            if shard not in self.latest:
+                continue
+            at, now = self.latest[shard]
+            pps, drops_ps = rates(self.previous.get(shard), (at, now))
+            self.previous[shard] = (at, now)
+            row["pps"] += pps
+            row["drops_ps"] += drops_ps
+            row["packets"] += now["packets"]
+            row["dropped"] += now["dropped"]
+            row["written"] += now["written"]
+        for iface, row in per_iface.items():
+            print(f"📊 {iface}: {row['pps']:.0f} pkt/s | {row['drops_ps']:.0f} drops/s | "
+                  f"{row['packets']} packets | {row['dropped']} dropped | {row['written']} rows | "
+                  f"{row['restarts']} restarts")
+
+def main():
+    parser = argparse.ArgumentParser(description="Live packet capture into the monitor database")
+    parser.add_argument("--iface", action="append", default=None,
+                        help="interface to capture on; repeat for several (default: MONITOR_CAPTURE_INTERFACES)")
+    parser.add_argument("--queues", type=int, default=1,
+                        help="capture processes per interface, sharing it by flow hash (Linux, raw parser)")
+    parser.add_argument("--mode", choices=MODES, default=CAPTURE_MODE,
+                        help="store one row per packet or aggregated 5-tuple flows")
+    parser.add_argument("--parser", choices=PARSERS, default=CAPTURE_PARSER,
+                        help="raw header decoder or full scapy dissection")
+    parser.add_argument("--profile", default=None,
+                        help="capture profile from MONITOR_CAPTURE_PROFILES (filter, snaplen, sampling)")
+    args = parser.parse_args()
+
+    if args.queues > 1 and (not sys.platform.startswith("linux") or args.parser != RAW):
+        parser.error("--queues needs Linux PACKET_FANOUT and the raw parser")
+
+    interfaces = args.iface or CAPTURE_INTERFACES or [INTERFACE]
+    if len(interfaces) == 1 and args.queues == 1:
+        run_capture(interfaces[0], args)
+    else:
+        Supervisor(interfaces, args).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Coalesced alert writing, shared by every alert producer.
+
+An alert is identified by (kind, ip). Occurrences of the same alert within
+``window`` seconds of the last one are merged into one Alert row, which
+keeps a count and the first/last time it was seen instead of gaining a new
+row each time. Occurrences are gathered in memory and written on a timer,
+so an alert storm costs at most one UPDATE per (kind, ip) per flush.
+A flush that fails (a locked database, a dropped connection) puts its
+occurrences back and they are written on the next one.
+"""
+import atexit
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import DateTimeField, F, Value
+from django.db.models.functions import Greatest
+
+from monitor import counters, snapshot
+from monitor.models import Alert
+
+
+WINDOW = getattr(settings, "MONITOR_ALERT_WINDOW", 300)                    # seconds
+FLUSH_INTERVAL = getattr(settings, "MONITOR_ALERT_FLUSH_INTERVAL", 2.0)    # seconds
+MAX_PENDING = getattr(settings, "MONITOR_ALERT_MAX_PENDING", 10000)        # distinct (kind, ip) per flush
+CLOSE_RETRIES = 5  # flush attempts on close() before pending alerts are given up
+
+# Alert kinds
+MALICIOUS_SOURCE = "malicious_src"
+MALICIOUS_DESTINATION = "malicious_dst"
+BLACKLISTED_CLIENT = "blacklisted_client"
+HIGH_TRAFFIC = "high_traffic"
+PORT_SCAN = "port_scan"
+ICMP_FLOOD = "icmp_flood"
+ANOMALY = "anomaly"              # traffic far off the host's own baseline
+
+
+class _Pending:
+    __slots__ = ("severity", "message", "count", "first_seen", "last_seen")
+
+    def __init__(self, severity, message, when):
+        self.severity = severity
+        self.message = message
+        self.count = 0
+        self.first_seen = when
+        self.last_seen = when
+
+
+class AlertEmitter:
+    """
+    Buffers alert occurrences by (kind, ip) and merges them into open Alert
+    rows: unreviewed rows of the same kind and IP last seen within the
+    window. Reviewed alerts are never reopened; a new occurrence starts a
+    fresh row.
+
+    The flush timer starts on the first ``emit()``. Batch producers (the
+    detection jobs) can call ``flush()`` directly when they are done.
+    """
+
+    def __init__(self, window=WINDOW, flush_interval=FLUSH_INTERVAL, max_pending=MAX_PENDING):
+        self.window = timedelta(seconds=window)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._pending = {}
+        self._open = {}  # (kind, ip) -> (alert id, last_seen) of rows this process wrote
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._timer = None
+
+        # Counters
+        self.emitted = 0
+        self.suppressed = 0
+        self.created = 0
+        self.updated = 0
+        self.flushes = 0
+        self.failed = 0
+
+    # ------------------ lifecycle ------------------
+    def start(self):
+        with self._lock:
+            if self._timer is None:
+                self._stop.clear()
+                self._timer = threading.Thread(target=self._run_timer, name="alert-emitter", daemon=True)
+                self._timer.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        timer, self._timer = self._timer, None
+        if timer is not None and timer is not threading.current_thread():
+            timer.join()
+        for attempt in range(CLOSE_RETRIES):
+            self.flush()
+            if not self._pending:
+                break
+            time.sleep(self.flush_interval * (attempt + 1))
+
+    # ------------------ producing ------------------
+    def emit(self, kind, ip, severity, message, when=None):
+        when = when or datetime.now()
+        key = (kind, ip or "")
+        with self._lock:
+            self.emitted += 1
+            pending = self._pending.get(key)
+            if pending is None:
+                if len(self._pending) >= self.max_pending:
+                    self.suppressed += 1
+                    return
+                pending = self._pending[key] = _Pending(severity, message, when)
+            pending.count += 1
+            pending.severity = severity
+            pending.message = message
+            if when < pending.first_seen:
+                pending.first_seen = when
+            if when > pending.last_seen:
+                pending.last_seen = when
+        if self._timer is None:
+            self.start()
+
+    # ------------------ writing ------------------
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            # Rows and counts of a rolled-back write never happened
+            saved = dict(self._open), self.created, self.updated
+            try:
+                with transaction.atomic():
+                    self.write(batch)
+            except Exception as e:
+                self._open, self.created, self.updated = saved
+                self._requeue(batch)
+                if not connection.in_atomic_block:
+                    connection.close_if_unusable_or_obsolete()  # reconnect after a dropped connection
+                self.failed += len(batch)
+                print(f"❌ Failed to write {len(batch)} alerts, retrying on the next flush:", e)
+                traceback.print_exc()
+                return 0
+            self.flushes += 1
+            snapshot.mark_changed()
+            return len(batch)
+
+    def _requeue(self, batch):
+        """Merge a batch that could not be written back into the pending occurrences."""
+        with self._lock:
+            for key, failed in batch.items():
+                pending = self._pending.get(key)
+                if pending is None:
+                    self._pending[key] = failed
+                    continue
+                # Newer occurrences keep their severity and message
+                pending.count += failed.count
+                pending.first_seen = min(pending.first_seen, failed.first_seen)
+                pending.last_seen = max(pending.last_seen, failed.last_seen)
+
+    def write(self, batch):
+        self._load_open(batch)
+
+        new = []
+        deltas = {}
+        for key, pending in batch.items():
+            open_alert = self._open.get(key)
+            if open_alert and pending.first_seen - open_alert[1] <= self.window:
+                rows = Alert.objects.filter(pk=open_alert[0], reviewed=False)
+                fields = dict(
+                    count=F("count") + pending.count,
+                    last_seen=Greatest("last_seen", Value(pending.last_seen, output_field=DateTimeField())),
+                    severity=pending.severity,
+                    message=pending.message,
+                )
+                # Same severity is the common case; otherwise the per-severity
+                # counters need the old one
+                updated = rows.filter(severity=pending.severity).update(**fields)
+                if not updated:
+                    old = rows.select_for_update().values_list("severity", flat=True).first()
+                    if old is not None:
+                        updated = rows.update(**fields)
+                        deltas = counters.merge(deltas, {counters.severity_counter(old): -1,
+                                                         counters.severity_counter(pending.severity): 1})
+                if updated:
+                    self.updated += 1
+                    self._open[key] = (open_alert[0], max(open_alert[1], pending.last_seen))
+                    continue
+            new.append((key, Alert(
+                kind=key[0], ip=key[1], severity=pending.severity, message=pending.message,
+                count=pending.count, first_seen=pending.first_seen, last_seen=pending.last_seen,
+            )))
+
+        if new:
+            Alert.objects.bulk_create([alert for _, alert in new])
+            self.created += len(new)
+            deltas = counters.merge(deltas, *(counters.alert_deltas(alert.severity, False) for _, alert in new))
+            for key, alert in new:
+                if alert.pk is not None:
+                    self._open[key] = (alert.pk, alert.last_seen)
+
+        counters.add(deltas)
+
+        # Forget rows that can no longer absorb occurrences
+        latest = max(pending.last_seen for pending in batch.values())
+        cutoff = latest - self.window
+        self._open = {key: value for key, value in self._open.items() if value[1] >= cutoff}
+
+    def _load_open(self, batch):
+        """Find open rows written by other processes (or before a restart)."""
+        missing = [key for key in batch if key not in self._open]
+        if not missing:
+            return
+        since = min(batch[key].first_seen for key in missing) - self.window
+        rows = (
+            Alert.objects
+            .filter(reviewed=False, last_seen__gte=since,
+                    kind__in={kind for kind, _ in missing}, ip__in={ip for _, ip in missing})
+            .order_by("last_seen")
+            .values_list("kind", "ip", "id", "last_seen")
+        )
+        wanted = set(missing)
+        for kind, ip, pk, last_seen in rows:
+            if (kind, ip) in wanted:
+                self._open[(kind, ip)] = (pk, last_seen)  # latest row wins
+
+    def _run_timer(self):
+        try:
+            while not self._stop.wait(self.flush_interval):
+                self.flush()
+        finally:
+            # The timer thread owns its own DB connection.
+            connection.close()
+
+    # ------------------ reporting ------------------
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "emitted": self.emitted,
+            "pending": pending,
+            "suppressed": self.suppressed,
+            "created": self.created,
+            "updated": self.updated,
+            "flushes": self.flushes,
+            "failed": self.failed,
+        }
+
+
+# Process-wide emitter shared by the sniffer, detection and the middleware
+emitter = AlertEmitter()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        emitter.flush()
+    except Exception:
+        pass
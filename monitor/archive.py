@@ -0,0 +1,462 @@
+"""
+Cold tier for NetworkLog: append-only columnar segments on disk.
+
+``archive_logs()`` (``manage.py archive_logs``) moves logs older than
+MONITOR_ARCHIVE_AFTER_DAYS out of the database into segment directories
+under MONITOR_ARCHIVE_DIR. A segment holds one .npy file per column, with
+the rows sorted by time, plus meta.json with its row count and min/max
+timestamps and id.npy with the database ids it holds (for the purge).
+Source and destination addresses are dictionary-encoded: the column holds
+uint32 codes into a sorted ``<column>.values.npy``.
+
+Queries memory-map the columns, skip segments outside the time range from
+their metadata, binary-search the sorted timestamps to a slice, and filter
+and group that slice with vectorized NumPy. The ``traffic_*`` functions
+run the same query over the rows still in the database and merge the two,
+so callers see one table.
+"""
+import ipaddress
+import json
+import os
+import shutil
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Length, TruncDay, TruncHour, TruncMinute
+from django.db.models.lookups import Exact
+
+from monitor import counters
+from monitor.models import NetworkLog
+
+
+ARCHIVE_DIR = Path(getattr(settings, "MONITOR_ARCHIVE_DIR", settings.BASE_DIR / "archive"))
+ARCHIVE_AFTER_DAYS = getattr(settings, "MONITOR_ARCHIVE_AFTER_DAYS", 7)
+SEGMENT_ROWS = getattr(settings, "MONITOR_ARCHIVE_SEGMENT_ROWS", 1000000)
+READ_CHUNK = 20000
+DELETE_CHUNK = getattr(settings, "MONITOR_RETENTION_CHUNK", 5000)
+
+COLUMNS = {
+    "timestamp": "datetime64[us]",
+    "src": "uint32",
+    "dst": "uint32",
+    "protocol": "uint8",
+    "bytes": "int64",
+    "packets": "uint32",
+}
+DICTIONARY = ("src", "dst")  # columns stored as codes into <column>.values.npy
+
+# Query column -> NetworkLog field, for the hot half of traffic_* queries.
+# src/dst take an address or an ipaddress network; "ip" matches either one.
+DB_FIELDS = {"src": "source_ip", "dst": "destination_ip", "protocol": "protocol"}
+NETWORKS = (ipaddress.IPv4Network, ipaddress.IPv6Network)
+TIME_GROUPS = {"minute": ("datetime64[m]", TruncMinute), "hour": ("datetime64[h]", TruncHour),
+               "day": ("datetime64[D]", TruncDay)}
+
+ArchivedLog = namedtuple("ArchivedLog", "timestamp source_ip destination_ip protocol bytes_transferred packets")
+
+
+# ------------------ segments ------------------
+class Segment:
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / "meta.json") as f:
+            self.meta = json.load(f)
+        self.rows = self.meta["rows"]
+        self.min_ts = datetime.fromisoformat(self.meta["min_ts"])
+        self.max_ts = datetime.fromisoformat(self.meta["max_ts"])
+        self._columns = {}
+        self._values = {}
+
+    def __repr__(self):
+        return f"<Segment {self.path.name} ({self.rows} rows)>"
+
+    def column(self, name):
+        if name not in self._columns:
+            self._columns[name] = np.load(self.path / f"{name}.npy", mmap_mode="r")
+        return self._columns[name]
+
+    def values(self, name):
+        if name not in self._values:
+            self._values[name] = np.load(self.path / f"{name}.values.npy")
+        return self._values[name]
+
+    def code(self, name, value):
+        """Dictionary code of ``value`` in this segment, or None if it never occurs."""
+        values = self.values(name)
+        i = int(np.searchsorted(values, value))
+        return i if i < len(values) and values[i] == value else None
+
+    def codes_in(self, name, network):
+        """Dictionary codes of the values inside ``network``."""
+        values = self.values(name)
+        return np.flatnonzero([ipaddress.ip_address(value) in network for value in values])
+
+    def overlaps(self, since=None, until=None):
+        return (since is None or self.max_ts >= since) and (until is None or self.min_ts < until)
+
+    def bounds(self, since=None, until=None):
+        """Row range [lo, hi) inside [since, until), from the sorted timestamps."""
+        ts = self.column("timestamp")
+        lo = 0 if since is None else int(np.searchsorted(ts, np.datetime64(since, "us"), side="left"))
+        hi = self.rows if until is None else int(np.searchsorted(ts, np.datetime64(until, "us"), side="left"))
+        return lo, hi
+
+    def ids(self):
+        """Sorted NetworkLog ids of the rows this segment holds."""
+        return np.load(self.path / "id.npy")
+
+    def mark_purged(self):
+        self.meta["purged"] = True
+        _write_json(self.path / "meta.json", self.meta)
+
+
+def segments(since=None, until=None):
+    """Segments overlapping [since, until), oldest first."""
+    if not ARCHIVE_DIR.is_dir():
+        return []
+    found = [Segment(path) for path in sorted(ARCHIVE_DIR.iterdir())
+             if path.is_dir() and not path.name.startswith(".") and (path / "meta.json").exists()]
+    return sorted((s for s in found if s.overlaps(since, until)), key=lambda s: s.min_ts)
+
+
+def _write_json(path, data):
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class SegmentBuffer:
+    """
+    The columns of a segment being built, preallocated for ``capacity`` rows
+    and filled one database chunk at a time, so archiving never holds more
+    than a chunk of row tuples. Addresses get codes in order of first
+    appearance; write_segment renumbers them in sorted order.
+    """
+
+    def __init__(self, capacity):
+        self.ids = np.empty(capacity, np.int64)
+        self.columns = {name: np.empty(capacity, dtype) for name, dtype in COLUMNS.items()}
+        self.codes = {name: {} for name in DICTIONARY}  # address -> code
+        self.rows = 0
+
+    def __len__(self):
+        return self.rows
+
+    def extend(self, chunk):
+        """Append rows of (id, timestamp, src, dst, protocol, bytes, packets)."""
+        ids, timestamps, srcs, dsts, protocols, sizes, packets = zip(*chunk)
+        start, end = self.rows, self.rows + len(chunk)
+        self.ids[start:end] = ids
+        for name, values in (("timestamp", timestamps), ("protocol", protocols),
+                             ("bytes", sizes), ("packets", packets)):
+            self.columns[name][start:end] = values
+        for name, values in (("src", srcs), ("dst", dsts)):
+            codes = self.codes[name]
+            self.columns[name][start:end] = [codes.setdefault(value, len(codes)) for value in values]
+        self.rows = end
+
+
+def write_segment(buffer, meta):
+    """Write a filled SegmentBuffer as a new segment, its rows sorted by time."""
+    n = len(buffer)
+    ids = buffer.ids[:n]
+    order = np.argsort(buffer.columns["timestamp"][:n], kind="stable")
+    columns = {name: buffer.columns[name][:n][order] for name in COLUMNS if name not in DICTIONARY}
+    dictionaries = {}
+    for name in DICTIONARY:
+        values = np.array(list(buffer.codes[name]), dtype=str)
+        by_value = np.argsort(values)
+        renumber = np.empty(len(values), COLUMNS[name])
+        renumber[by_value] = np.arange(len(values))
+        dictionaries[name] = values[by_value]
+        columns[name] = renumber[buffer.columns[name][:n][order]]
+
+    min_ts, max_ts = columns["timestamp"][0].item(), columns["timestamp"][-1].item()
+    min_id, max_id = int(ids.min()), int(ids.max())
+    name = f"{min_ts:%Y%m%dT%H%M%S}-{max_id}"
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = ARCHIVE_DIR / f".{name}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir()
+    for column, array in columns.items():
+        np.save(tmp / f"{column}.npy", array)
+    for column, values in dictionaries.items():
+        np.save(tmp / f"{column}.values.npy", values)
+    np.save(tmp / "id.npy", np.sort(ids))
+    _write_json(tmp / "meta.json", {
+        **meta,
+        "rows": n,
+        "min_id": min_id,
+        "max_id": max_id,
+        "min_ts": min_ts.isoformat(),
+        "max_ts": max_ts.isoformat(),
+        "purged": False,
+    })
+    os.replace(tmp, ARCHIVE_DIR / name)
+    return Segment(ARCHIVE_DIR / name)
+
+
+# ------------------ archiving ------------------
+def purge(segment):
+    """
+    Delete the rows the segment holds from the database, a chunk of ids at a
+    time. Only its own ids: a row committed late can take an id inside the
+    segment's range after the segment was read, and must stay for the next run.
+    """
+    if not (segment.path / "id.npy").exists():
+        return _purge_range(segment)
+    ids = segment.ids()
+    deleted = 0
+    for start in range(0, len(ids), DELETE_CHUNK):
+        with transaction.atomic():
+            chunk_deleted = NetworkLog.objects.filter(id__in=ids[start:start + DELETE_CHUNK].tolist()).delete()[0]
+            counters.rows_deleted(NetworkLog, chunk_deleted)
+        deleted += chunk_deleted
+    segment.mark_purged()
+    return deleted
+
+
+def _purge_range(segment):
+    """Segments written before id.npy: delete by id range and the archive cutoff."""
+    cutoff = datetime.fromisoformat(segment.meta["cutoff"])
+    end = segment.meta["max_id"] + 1  # ids past the segment may be old rows it does not hold
+    deleted = 0
+    for start in range(segment.meta["min_id"], end, DELETE_CHUNK):
+        with transaction.atomic():
+            chunk_deleted = NetworkLog.objects.filter(
+                id__gte=start, id__lt=min(start + DELETE_CHUNK, end), timestamp__lt=cutoff,
+            ).delete()[0]
+            counters.rows_deleted(NetworkLog, chunk_deleted)
+        deleted += chunk_deleted
+    segment.mark_purged()
+    return deleted
+
+
+def archive_logs(older_than_days=ARCHIVE_AFTER_DAYS, now=None, segment_rows=SEGMENT_ROWS):
+    """
+    Move logs older than ``older_than_days`` into new segments. Each segment
+    is on disk before its rows leave the database; a run that stopped in
+    between finishes the purge first. Returns (segments written, rows deleted).
+    """
+    deleted = sum(purge(segment) for segment in segments() if not segment.meta.get("purged"))
+
+    cutoff = (now or datetime.now()) - timedelta(days=older_than_days)
+    written = []
+    last_id = 0
+    columns = ("id", "timestamp", "source_ip", "destination_ip", "protocol", "bytes_transferred", "packets")
+    while True:
+        buffer = SegmentBuffer(segment_rows)
+        while len(buffer) < segment_rows:
+            chunk = list(
+                NetworkLog.objects.filter(id__gt=last_id, timestamp__lt=cutoff)
+                .order_by("id").values_list(*columns)[:min(READ_CHUNK, segment_rows - len(buffer))]
+            )
+            if not chunk:
+                break
+            buffer.extend(chunk)
+            last_id = chunk[-1][0]
+        if not len(buffer):
+            break
+        segment = write_segment(buffer, {"cutoff": cutoff.isoformat()})
+        deleted += purge(segment)
+        written.append(segment)
+    return written, deleted
+
+
+# ------------------ querying the archive ------------------
+def _match(segment, lo, hi, name, value):
+    """Mask of the rows [lo, hi) whose ``name`` column matches, or None if none can."""
+    if name == "ip":
+        matches = [m for m in (_match(segment, lo, hi, "src", value), _match(segment, lo, hi, "dst", value))
+                   if m is not None]
+        return matches[0] | matches[1] if len(matches) == 2 else (matches[0] if matches else None)
+    if name not in DICTIONARY:
+        return segment.column(name)[lo:hi] == int(value)
+    if isinstance(value, NETWORKS):
+        codes = segment.codes_in(name, value)
+        return np.isin(segment.column(name)[lo:hi], codes) if len(codes) else None
+    code = segment.code(name, value)
+    return None if code is None else segment.column(name)[lo:hi] == code
+
+
+def _select(segment, since, until, filters):
+    """(lo, hi, mask) of the segment rows matching the query, or None."""
+    lo, hi = segment.bounds(since, until)
+    if lo >= hi:
+        return None
+    mask = None
+    for name, value in filters.items():
+        if value is None:
+            continue
+        match = _match(segment, lo, hi, name, value)
+        if match is None:
+            return None
+        mask = match if mask is None else mask & match
+    return lo, hi, mask
+
+
+def _columns(segment, selection, *names):
+    lo, hi, mask = selection
+    arrays = [segment.column(name)[lo:hi] for name in names]
+    return [array if mask is None else array[mask] for array in arrays]
+
+
+def archive_count(since=None, until=None, **filters):
+    """{"rows", "packets", "bytes"} of the archived logs matching the query."""
+    totals = {"rows": 0, "packets": 0, "bytes": 0}
+    for segment in segments(since, until):
+        selection = _select(segment, since, until, filters)
+        if selection is None:
+            continue
+        packets, sizes = _columns(segment, selection, "packets", "bytes")
+        totals["rows"] += len(packets)
+        totals["packets"] += int(packets.sum(dtype=np.int64))
+        totals["bytes"] += int(sizes.sum(dtype=np.int64))
+    return totals
+
+
+def archive_aggregate(group_by, since=None, until=None, **filters):
+    """{item: [rows, packets, bytes]} of the archived logs, grouped by a column or time unit."""
+    totals = defaultdict(lambda: [0, 0, 0])
+    for segment in segments(since, until):
+        selection = _select(segment, since, until, filters)
+        if selection is None:
+            continue
+        packets, sizes = _columns(segment, selection, "packets", "bytes")
+        if group_by in TIME_GROUPS:
+            (ts,) = _columns(segment, selection, "timestamp")
+            labels, codes = np.unique(ts.astype(TIME_GROUPS[group_by][0]), return_inverse=True)
+            labels = [label.astype("datetime64[us]").item() for label in labels]
+        else:
+            (codes,) = _columns(segment, selection, group_by)
+            labels = segment.values(group_by).tolist() if group_by in DICTIONARY else range(256)
+        size = len(labels)
+        rows = np.bincount(codes, minlength=size)
+        packet_sums = np.bincount(codes, weights=packets, minlength=size)
+        byte_sums = np.bincount(codes, weights=sizes, minlength=size)
+        for i in np.flatnonzero(rows):
+            total = totals[labels[i]]
+            total[0] += int(rows[i])
+            total[1] += int(packet_sums[i])
+            total[2] += int(byte_sums[i])
+    return totals
+
+
+def archive_rows(since=None, until=None, **filters):
+    """Archived logs matching the query as ArchivedLog tuples, oldest first."""
+    for segment in segments(since, until):
+        selection = _select(segment, since, until, filters)
+        if selection is None:
+            continue
+        lo, hi, mask = selection
+        src_values, dst_values = segment.values("src"), segment.values("dst")
+        # READ_CHUNK rows at a time, so only one chunk of a segment is ever in memory
+        for start in range(lo, hi, READ_CHUNK):
+            end = min(start + READ_CHUNK, hi)
+            chunk = (start, end, None if mask is None else mask[start - lo:end - lo])
+            ts, src, dst, protocol, sizes, packets = _columns(
+                segment, chunk, "timestamp", "src", "dst", "protocol", "bytes", "packets")
+            for row in zip(ts.tolist(), src_values[src].tolist(), dst_values[dst].tolist(),
+                           protocol.tolist(), sizes.tolist(), packets.tolist()):
+                yield ArchivedLog(*row)
+
+
+def archive_stats():
+    found = segments()
+    return {
+        "segments": len(found),
+        "rows": sum(segment.rows for segment in found),
+        "oldest": found[0].min_ts if found else None,
+        "newest": max(segment.max_ts for segment in found) if found else None,
+        "disk_bytes": sum(f.stat().st_size for segment in found for f in segment.path.iterdir()),
+    }
+
+
+# ------------------ hot + cold ------------------
+def _hot_match(name, value):
+    if name == "ip":
+        return _hot_match("src", value) | _hot_match("dst", value)
+    field = DB_FIELDS[name]
+    if isinstance(value, NETWORKS):
+        # Packed addresses sort like the addresses; the length keeps the
+        # other family's addresses with the same leading bytes out
+        return (Q(**{f"{field}__range": (value.network_address.packed, value.broadcast_address.packed)})
+                & Q(Exact(Length(field), len(value.network_address.packed))))
+    return Q(**{field: value})
+
+
+def _hot(since, until, filters):
+    logs = NetworkLog.objects.all()
+    if since is not None:
+        logs = logs.filter(timestamp__gte=since)
+    if until is not None:
+        logs = logs.filter(timestamp__lt=until)
+    for name, value in filters.items():
+        if value is not None:
+            logs = logs.filter(_hot_match(name, value))
+    return logs
+
+
+def traffic_count(since=None, until=None, **filters):
+    """archive_count() plus the matching logs still in the database."""
+    totals = archive_count(since, until, **filters)
+    hot = _hot(since, until, filters).aggregate(rows=Count("id"), packets=Sum("packets"),
+                                               bytes=Sum("bytes_transferred"))
+    return {key: totals[key] + (hot[key] or 0) for key in totals}
+
+
+def traffic_totals(group_by, since=None, until=None, limit=None, **filters):
+    """
+    [{"item", "rows", "packets", "bytes"}] over the archive and the database.
+    Grouped by src/dst/protocol: largest byte count first. Grouped by
+    minute/hour/day: in time order.
+    """
+    totals = archive_aggregate(group_by, since, until, **filters)
+    hot = _hot(since, until, filters)
+    if group_by in TIME_GROUPS:
+        hot = hot.annotate(item=TIME_GROUPS[group_by][1]("timestamp")).values("item")
+    else:
+        hot = hot.values(item=F(DB_FIELDS[group_by]))
+    for row in hot.annotate(rows=Count("id"), packets=Sum("packets"), bytes=Sum("bytes_transferred")).order_by():
+        total = totals[row["item"]]
+        total[0] += row["rows"]
+        total[1] += row["packets"]
+        total[2] += row["bytes"]
+
+    result = [{"item": item, "rows": rows, "packets": packets, "bytes": size}
+              for item, (rows, packets, size) in totals.items()]
+    if group_by in TIME_GROUPS:
+        result.sort(key=lambda row: row["item"])
+    else:
+        result.sort(key=lambda row: row["bytes"], reverse=True)
+    return result[:limit] if limit else result
+
+
+def traffic_rows(since=None, until=None, **filters):
+    """
+    Logs matching the query, archived ones first, then the database's in
+    time order. The database half is read READ_CHUNK rows per query, each
+    continuing after the (timestamp, id) of the previous chunk. So a long
+    export behind a slow client never holds a cursor or a read
+    transaction open between chunks.
+    """
+    yield from archive_rows(since, until, **filters)
+    hot = _hot(since, until, filters).order_by("timestamp", "id").values_list(
+        "id", "timestamp", "source_ip", "destination_ip", "protocol", "bytes_transferred", "packets")
+    chunk = hot
+    while True:
+        rows = list(chunk[:READ_CHUNK])
+        for row in rows:
+            yield ArchivedLog(*row[1:])
+        if len(rows) < READ_CHUNK:
+            break
+        last_id, when = rows[-1][:2]
+        chunk = hot.filter(timestamp__gte=when).exclude(timestamp=when, id__lte=last_id)
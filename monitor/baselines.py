@@ -0,0 +1,306 @@
+"""
+Per-host adaptive traffic baselines (run by ``manage.py run_detection``).
+
+The rules in monitor/detection.py and monitor/streaming.py use one fixed
+threshold for every host. This module learns what is normal for each host
+instead. Every MONITOR_BASELINE_INTERVAL seconds of traffic becomes one
+sample per active source address, with these features:
+
+    log(1 + bytes), log(1 + packets), log(1 + distinct destinations),
+    TCP / UDP / ICMP share of the bytes
+
+For each host and hour of the day, the model keeps an exponentially
+weighted mean and variance of every feature. A sample is scored by its
+z-score against its own hour. A host is flagged when a volume feature is
+unusually high or its protocol mix has moved, once the hour has seen
+MONITOR_BASELINE_MIN_SAMPLES samples.
+
+The state is a few dense float32 arrays indexed by host code, saved as a
+compressed .npz file per traffic source (``source_path``). Feature extraction, scoring and the update are
+array operations over all hosts of an interval at once; Python only loops
+over intervals and over the hosts that alert.
+"""
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from monitor import alerts
+from monitor.models import DetectorState, Protocol
+from monitor.reports import AddressCodes, raw_columns
+
+
+INTERVAL = getattr(settings, "MONITOR_BASELINE_INTERVAL", 60)              # seconds per sample
+ALPHA = getattr(settings, "MONITOR_BASELINE_ALPHA", 0.05)                  # EWMA weight of a new sample
+THRESHOLD = getattr(settings, "MONITOR_BASELINE_Z", 4.0)                   # z-score that raises an alert
+MIN_SAMPLES = getattr(settings, "MONITOR_BASELINE_MIN_SAMPLES", 8)         # per host and hour before scoring
+FORGET_DAYS = getattr(settings, "MONITOR_BASELINE_FORGET_DAYS", 30)        # drop hosts idle this long
+PATH = getattr(settings, "MONITOR_BASELINE_PATH", settings.BASE_DIR / "baselines.npz")
+
+LAG = timedelta(seconds=30)           # wait this long after an interval ends for late rows
+BOOTSTRAP = timedelta(days=1)         # history a new baseline learns from
+MAX_INTERVALS = 240                   # per tick; a backlog is worked off over several ticks
+
+SLOTS = 24                            # hour of day
+FEATURES = ("bytes", "packets", "destinations", "tcp share", "udp share", "icmp share")
+VOLUME = 3                            # the first VOLUME features are log counts; only rises alert
+SHARE_PROTOCOLS = (Protocol.TCP, Protocol.UDP, Protocol.ICMP)
+# Standard deviation floors, so a host that never varies does not alert on
+# noise: about x1.65 in volume, 15 points of protocol share
+MIN_STD = np.array([0.5, 0.5, 0.5, 0.15, 0.15, 0.15], dtype=np.float32)
+
+
+def source_path(name, path=PATH):
+    """The baselines file of one traffic source: baselines.npz -> baselines-packets.npz."""
+    path = Path(path)
+    return path.with_name(f"{path.stem}-{name}{path.suffix}")
+
+
+def _seconds(when):
+    return int(np.datetime64(when, "s").astype(np.int64))
+
+
+def _datetime(seconds):
+    return np.datetime64(int(seconds), "s").astype(datetime)
+
+
+class Baselines:
+    """EWMA mean/variance per (host, hour of day, feature)."""
+
+    def __init__(self):
+        self.hosts = AddressCodes()
+        self.mean = np.zeros((0, SLOTS, len(FEATURES)), dtype=np.float32)
+        self.var = np.zeros((0, SLOTS, len(FEATURES)), dtype=np.float32)
+        self.count = np.zeros((0, SLOTS), dtype=np.uint16)
+        self.last_seen = np.zeros(0, dtype=np.int64)   # epoch seconds
+        self.until = None                              # end of the last interval learned
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def _grow(self):
+        missing = len(self.hosts) - len(self.last_seen)
+        if missing <= 0:
+            return
+        self.mean = np.concatenate([self.mean, np.zeros((missing, SLOTS, len(FEATURES)), np.float32)])
+        self.var = np.concatenate([self.var, np.zeros((missing, SLOTS, len(FEATURES)), np.float32)])
+        self.count = np.concatenate([self.count, np.zeros((missing, SLOTS), np.uint16)])
+        self.last_seen = np.concatenate([self.last_seen, np.zeros(missing, np.int64)])
+
+    # ------------------ storage ------------------
+    @classmethod
+    def load(cls, path):
+        baselines = cls()
+        if not os.path.exists(path):
+            return baselines
+        with np.load(path) as data:
+            for name in data["hosts"].tolist():
+                baselines.hosts.code(name)
+            baselines.mean = data["mean"]
+            baselines.var = data["var"]
+            baselines.count = data["count"]
+            baselines.last_seen = data["last_seen"]
+            until = int(data["until"])
+            baselines.until = _datetime(until) if until else None
+        return baselines
+
+    def save(self, path):
+        """Write atomically: a crash leaves the previous file in place."""
+        self.forget()
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez_compressed(
+                f, hosts=np.array(self.hosts.names, dtype=str), mean=self.mean, var=self.var,
+                count=self.count, last_seen=self.last_seen,
+                until=np.int64(_seconds(self.until) if self.until else 0),
+            )
+        os.replace(tmp, path)
+
+    def forget(self, days=FORGET_DAYS):
+        """Drop hosts not seen for ``days``, keeping the arrays dense."""
+        if not days or self.until is None or not len(self):
+            return 0
+        keep = self.last_seen >= _seconds(self.until - timedelta(days=days))
+        dropped = int((~keep).sum())
+        if dropped:
+            hosts = AddressCodes()
+            for name in np.array(self.hosts.names, dtype=object)[keep]:
+                hosts.code(name)
+            self.hosts = hosts
+            self.mean, self.var = self.mean[keep], self.var[keep]
+            self.count, self.last_seen = self.count[keep], self.last_seen[keep]
+        return dropped
+
+    # ------------------ learning ------------------
+    def reduce(self, start, ts, src, dst, protocol, sizes, packets, interval=INTERVAL):
+        """
+        One chunk of rows (timestamps datetime64, host codes from self.hosts,
+        numbers), summed per (interval from ``start``, source, destination).
+        Chunks only need the reduced form, so a backlog never sits in memory row by row.
+        """
+        index = (ts.astype("datetime64[s]").astype(np.int64) - _seconds(start)) // interval
+        sizes = sizes.astype(np.float64)
+        weights = [sizes, packets.astype(np.float64)] + [sizes * (protocol == number) for number in SHARE_PROTOCOLS]
+        return _triples(index, src, dst, np.stack(weights, axis=1), len(self.hosts))
+
+    def observe(self, start, chunks, interval=INTERVAL):
+        """
+        Score and learn the reduced ``chunks`` interval by interval.
+        Returns (when, host code, score, feature, value, expected) per anomaly.
+        """
+        self._grow()
+        if not chunks:
+            return []
+        hosts = len(self.hosts)
+        index, src, dst, sums = (np.concatenate(column) for column in zip(*chunks))
+        # Chunks may share triples; then one group per (interval, source host), sorted by interval
+        index, src, dst, sums = _triples(index, src, dst, sums, hosts)
+        groups, inverse = np.unique(index * hosts + src, return_inverse=True)
+        totals = np.stack([np.bincount(inverse, weights=w, minlength=len(groups)) for w in sums.T], axis=1)
+        features = np.empty((len(groups), len(FEATURES)), dtype=np.float32)
+        features[:, 0] = np.log1p(totals[:, 0])
+        features[:, 1] = np.log1p(totals[:, 1])
+        features[:, 2] = np.log1p(np.bincount(inverse, minlength=len(groups)))
+        features[:, VOLUME:] = totals[:, 2:] / np.maximum(totals[:, :1], 1.0)
+
+        intervals = groups // hosts
+        host_codes = groups % hosts
+        bounds = np.flatnonzero(np.diff(intervals)) + 1
+        found = []
+        for lo, hi in zip([0, *bounds.tolist()], [*bounds.tolist(), len(groups)]):
+            end = _seconds(start) + (int(intervals[lo]) + 1) * interval
+            found.extend(self._step(end, host_codes[lo:hi], features[lo:hi]))
+        return found
+
+    def _step(self, end, hosts, x):
+        """Score then learn one interval: ``x`` is one feature row per host in ``hosts``."""
+        slot = int(np.datetime64(end - 1, "s").astype("datetime64[h]").astype(np.int64) % SLOTS)
+        mean = self.mean[hosts, slot]
+        var = self.var[hosts, slot]
+        count = self.count[hosts, slot]
+
+        std = np.sqrt(np.maximum(var, MIN_STD ** 2))
+        diff = x - mean
+        z = diff / std
+        z[:, VOLUME:] = np.abs(z[:, VOLUME:])
+        z[:, :VOLUME] = np.maximum(z[:, :VOLUME], 0.0)
+        worst = z.argmax(axis=1)
+        score = z[np.arange(len(hosts)), worst]
+        anomalous = (count >= MIN_SAMPLES) & (score >= THRESHOLD)
+
+        # Plain running average until the hour has ~1/ALPHA samples, then EWMA.
+        # An anomalous sample moves the mean by at most THRESHOLD standard
+        # deviations' worth and leaves the variance alone: an attack cannot
+        # widen the band and hide itself, but a lasting change is still learned.
+        alpha = np.maximum(ALPHA, 1.0 / (count.astype(np.float32) + 1))[:, None]
+        diff = np.where(anomalous[:, None], np.clip(diff, -THRESHOLD * std, THRESHOLD * std), diff)
+        increment = alpha * diff
+        self.mean[hosts, slot] = mean + increment
+        self.var[hosts, slot] = np.where(anomalous[:, None], var, (1 - alpha) * (var + diff * increment))
+        self.count[hosts, slot] = np.minimum(count.astype(np.int64) + 1, np.iinfo(np.uint16).max)
+        self.last_seen[hosts] = end
+
+        return [
+            (_datetime(end), int(hosts[i]), float(score[i]), int(worst[i]), float(x[i, worst[i]]),
+             float(mean[i, worst[i]]))
+            for i in np.flatnonzero(anomalous)
+        ]
+
+
+def _triples(index, src, dst, weights, hosts):
+    """Sum the ``weights`` rows sharing (interval, source, destination)."""
+    keys, inverse = np.unique((index * hosts + src) * hosts + dst, return_inverse=True)
+    sums = np.stack([np.bincount(inverse, weights=w, minlength=len(keys)) for w in weights.T], axis=1)
+    return keys // hosts // hosts, keys // hosts % hosts, keys % hosts, sums
+
+
+def describe(feature, value, expected):
+    name = FEATURES[feature]
+    if feature < VOLUME:
+        return f"{name} {np.expm1(value):,.0f} vs usual {np.expm1(expected):,.0f}"
+    return f"{name} {100 * value:.0f}% vs usual {100 * expected:.0f}%"
+
+
+class BaselineRunner:
+    """Feeds complete intervals of a traffic source to the host baselines."""
+
+    def __init__(self, source, path=None, interval=INTERVAL, max_intervals=MAX_INTERVALS):
+        self.source = source
+        # Packets and flows learn different baselines, so each has its own file
+        self.path = path or source_path(source.name)
+        self.interval = interval
+        self.max_intervals = max_intervals
+        self.name = f"{source.name}:baseline"
+        self.state = None
+        self.baselines = None
+
+    @property
+    def watermark(self):
+        return self.baselines.until
+
+    def load(self):
+        self.state, _ = DetectorState.objects.get_or_create(name=self.name)
+        self.baselines = Baselines.load(self.path)
+        return self
+
+    def _aligned(self, when):
+        return _datetime(_seconds(when) // self.interval * self.interval)
+
+    def run(self):
+        started = time.perf_counter()
+        baselines = self.baselines
+        end = self._aligned(datetime.now() - LAG)
+        start = baselines.until or end - BOOTSTRAP
+        end = min(end, start + timedelta(seconds=self.interval * self.max_intervals))
+        rows = fired = 0
+
+        if end > start:
+            field = self.source.time_field
+            logs = self.source.all().filter(**{f"{field}__gte": start, f"{field}__lt": end}).values_list(
+                field, "source_ip", "destination_ip", "protocol", "bytes_transferred", "packets")
+            chunks = []
+            for ts, src, dst, protocol, sizes, packets in raw_columns(logs):
+                rows += len(ts)
+                chunks.append(baselines.reduce(
+                    start,
+                    np.array(ts, dtype="datetime64[us]"),
+                    baselines.hosts.encode_packed(src),
+                    baselines.hosts.encode_packed(dst),
+                    np.array(protocol, dtype=np.int64),
+                    np.array(sizes, dtype=np.int64),
+                    np.array(packets, dtype=np.int64),
+                    self.interval,
+                ))
+            anomalies = baselines.observe(start, chunks, self.interval)
+            for when, host, score, feature, value, expected in anomalies:
+                ip = baselines.hosts.names[host]
+                severity = "High" if score >= 2 * THRESHOLD else "Medium"
+                alerts.emitter.emit(
+                    alerts.ANOMALY, ip, severity,
+                    f"Unusual traffic from {ip}: {describe(feature, value, expected)} (z={score:.1f})",
+                    when=when,
+                )
+            fired = len(anomalies)
+            baselines.until = end
+            baselines.save(self.path)
+
+        elapsed_ms = 1000 * (time.perf_counter() - started)
+        state = self.state
+        state.last_timestamp = baselines.until
+        state.state = {"hosts": len(baselines), "interval": self.interval}
+        state.last_run_ms = round(elapsed_ms, 2)
+        state.last_rows = rows
+        state.runs += 1
+        state.save()
+        return {"detector": self.name, "rows": rows, "alerts": fired,
+                "ms": round(elapsed_ms, 2), "watermark": baselines.until}
+
+    def reset(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        DetectorState.objects.filter(name=self.name).delete()
+        self.state = None
+        self.baselines = None
@@ -0,0 +1,298 @@
+"""
+Stage handlers shared by the live sniffer (capture_packets.py) and anything
+else that feeds packets through the same parse -> enrich -> persist path.
+"""
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import partial
+
+from django.conf import settings
+
+from monitor import alerts
+from monitor.decoder import decode, PROTO_ICMP
+from monitor.flows import FlowTable
+from monitor.models import NetworkLog, Flow
+from monitor.pipeline import Stage, Pipeline, BLOCK, DROP_OLDEST
+from monitor.rollups import RollupWriter
+from monitor.sampling import sampled
+from monitor.sketches import SketchRecorder
+from monitor.streaming import StreamingDetector
+
+# Optional ThreatIntel
+try:
+    from threatintel.matcher import matcher as threat_matcher
+    THREAT_INTEL_ENABLED = True
+except Exception:
+    THREAT_INTEL_ENABLED = False
+
+
+# Capture modes: one NetworkLog row per packet, or aggregated Flow rows
+PACKETS = "packets"
+FLOWS = "flows"
+MODES = (PACKETS, FLOWS)
+
+CAPTURE_MODE = getattr(settings, "MONITOR_CAPTURE_MODE", PACKETS)
+
+# Parsers: "raw" decodes headers straight from frame bytes (monitor/decoder.py),
+# "scapy" does a full scapy dissection of every packet
+RAW = "raw"
+SCAPY = "scapy"
+PARSERS = (RAW, SCAPY)
+
+CAPTURE_PARSER = getattr(settings, "MONITOR_CAPTURE_PARSER", RAW)
+
+# Run the detection rules on the packet stream (monitor/streaming.py)
+STREAMING_DETECTION = getattr(settings, "MONITOR_STREAMING_DETECTION", True)
+
+DEFAULT_STAGES = {
+    "parse": {"workers": 1, "maxsize": 10000, "policy": DROP_OLDEST},
+    "enrich": {"workers": 2, "maxsize": 10000, "policy": DROP_OLDEST},
+    "persist": {"workers": 1, "maxsize": 20000, "policy": BLOCK},
+}
+
+
+@dataclass(slots=True)
+class PacketRecord:
+    timestamp: datetime
+    src: str
+    dst: str
+    proto: int
+    length: int
+    sport: int = None
+    dport: int = None
+    weight: int = 1  # packets this record stands for under sampling
+    alerts: list = field(default_factory=list)  # (kind, ip, severity, message)
+
+    @property
+    def size(self):
+        return self.length * self.weight  # bytes, scaled for sampling
+
+    @property
+    def packets(self):
+        return self.weight
+
+
+# ------------------ 1. Parse ------------------
+def parse_packet(pkt, verbose=True):
+    from scapy.all import IP, ICMP, TCP, UDP
+
+    if IP not in pkt:
+        return None
+
+    record = PacketRecord(
+        timestamp=datetime.fromtimestamp(float(pkt.time)),
+        src=pkt[IP].src,
+        dst=pkt[IP].dst,
+        proto=pkt[IP].proto,
+        length=len(pkt),
+    )
+
+    for layer in (TCP, UDP):
+        if layer in pkt:
+            record.sport = pkt[layer].sport
+            record.dport = pkt[layer].dport
+            break
+
+    # Print ICMP packets for clarity (not when bulk-ingesting files)
+    if verbose and ICMP in pkt:
+        print(f"ICMP Packet: {record.src} -> {record.dst} | {record.length} bytes")
+
+    return record
+
+
+def parse_frame(frame, verbose=True):
+    """Parse a raw pcapfile.Frame through the same scapy path as live capture."""
+    from scapy.all import conf, Raw
+
+    cls = conf.l2types.get(frame.linktype, Raw)
+    pkt = cls(frame.data)
+    pkt.time = frame.timestamp
+    record = parse_packet(pkt, verbose)
+    if record is not None:
+        record.length = frame.wirelen  # the frame may have been truncated on disk
+    return record
+
+
+def decode_frame(frame, verbose=True):
+    """Parse a raw pcapfile.Frame with the struct-based header decoder."""
+    fields = decode(frame.data, frame.linktype)
+    if fields is None:
+        return None
+    src, dst, proto, sport, dport = fields
+
+    record = PacketRecord(
+        timestamp=datetime.fromtimestamp(frame.timestamp),
+        src=src,
+        dst=dst,
+        proto=proto,
+        length=frame.wirelen,
+        sport=sport,
+        dport=dport,
+    )
+
+    # Print ICMP packets for clarity (not when bulk-ingesting files)
+    if verbose and proto == PROTO_ICMP:
+        print(f"ICMP Packet: {src} -> {dst} | {frame.wirelen} bytes")
+
+    return record
+
+
+FRAME_PARSERS = {RAW: decode_frame, SCAPY: parse_frame}
+
+
+# ------------------ 2. Enrich / detect ------------------
+def _listed_as(ip, network):
+    # Name the listed range when the hit came from a CIDR entry
+    return "" if network.num_addresses == 1 else f" (listed range {network})"
+
+
+def enrich_record(record, verbose=True):
+    if THREAT_INTEL_ENABLED:
+        # In-memory lookups; new/deleted ThreatIP rows are polled for periodically
+        threat_matcher.refresh_if_due()
+        hit = threat_matcher.match(record.src)
+        if hit:
+            if verbose:
+                print(f"⚠ Threat: Malicious Source {record.src} ({hit})")
+            record.alerts.append((alerts.MALICIOUS_SOURCE, record.src, "High",
+                                  f"Malicious source IP detected: {record.src}{_listed_as(record.src, hit)}"))
+        hit = threat_matcher.match(record.dst)
+        if hit:
+            if verbose:
+                print(f"⚠ Threat: Malicious Destination {record.dst} ({hit})")
+            record.alerts.append((alerts.MALICIOUS_DESTINATION, record.dst, "High",
+                                  f"Connection to malicious IP: {record.dst}{_listed_as(record.dst, hit)}"))
+    return record
+
+
+# ------------------ 3. Persist ------------------
+class Persister:
+    """
+    Turns records into NetworkLog rows on a batched writer; alerts go to the
+    coalescing emitter (monitor/alerts.py), one row per (kind, IP) storm.
+    Every record also feeds the dashboard's traffic sketches.
+    """
+
+    def __init__(self, log_writer=None, alert_emitter=None, sketches=None):
+        self.log_writer = log_writer or RollupWriter(model=NetworkLog)
+        self.alert_emitter = alert_emitter or alerts.emitter
+        self.sketches = sketches or SketchRecorder()
+
+    def __call__(self, record):
+        self.log_writer.add(NetworkLog(
+            source_ip=record.src,
+            destination_ip=record.dst,
+            protocol=record.proto,
+            bytes_transferred=record.length * record.weight,
+            packets=record.weight,
+            timestamp=record.timestamp,
+        ))
+        self.record_extras(record)
+        return None
+
+    def record_extras(self, record):
+        self.sketches.observe(record)
+        for kind, ip, severity, message in record.alerts:
+            self.alert_emitter.emit(kind, ip, severity, message, when=record.timestamp)
+
+    def start(self):
+        self.log_writer.start()
+        self.alert_emitter.start()
+        self.sketches.start()
+        return self
+
+    def close(self):
+        self.log_writer.close()
+        self.alert_emitter.close()
+        self.sketches.close()
+
+    def stats(self):
+        return {"logs": self.log_writer.stats(), "alerts": self.alert_emitter.stats(),
+                "sketches": self.sketches.stats()}
+
+
+class FlowPersister(Persister):
+    """Aggregates records into 5-tuple flows and writes closed Flow rows."""
+
+    def __init__(self, log_writer=None, alert_emitter=None, sketches=None, live=True):
+        super().__init__(log_writer or RollupWriter(model=Flow), alert_emitter, sketches)
+        self.flows = FlowTable(on_close=self.log_writer.add)
+        self.live = live
+        self._stop = threading.Event()
+        self._sweeper = None
+
+    def __call__(self, record):
+        self.flows.add(record)
+        self.record_extras(record)
+        return None
+
+    def start(self):
+        super().start()
+        if self.live:
+            # Idle flows still have to close when no packets arrive at all
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="flow-sweeper", daemon=True)
+            self._sweeper.start()
+        return self
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.flows.sweep_interval.total_seconds()):
+            self.flows.sweep()
+
+    def close(self):
+        self._stop.set()
+        if self._sweeper is not None:
+            self._sweeper.join()
+        self.flows.close_all()
+        super().close()
+
+    def stats(self):
+        return {"flows": self.flows.stats(), **super().stats()}
+
+
+def make_persister(mode=CAPTURE_MODE, live=True, batch_size=None):
+    if mode not in MODES:
+        raise ValueError(f"Unknown capture mode {mode!r}")
+    model = Flow if mode == FLOWS else NetworkLog
+    log_writer = RollupWriter(model=model, batch_size=batch_size) if batch_size else None
+    if mode == FLOWS:
+        return FlowPersister(log_writer=log_writer, live=live)
+    return Persister(log_writer=log_writer)
+
+
+def stage_config(name):
+    config = dict(DEFAULT_STAGES[name])
+    config.update(getattr(settings, "MONITOR_PIPELINE", {}).get(name, {}))
+    return config
+
+
+def make_detector():
+    return StreamingDetector() if STREAMING_DETECTION else None
+
+
+def build_pipeline(persister, parse=parse_packet, policy=None, sampler=None, detector=None, verbose=True):
+    """
+    parse -> enrich -> persist. ``policy`` overrides every stage's overflow
+    policy (offline ingestion uses "block" so nothing is ever dropped).
+    ``verbose=False`` silences the per-packet ICMP and threat lines.
+
+    A sampler (see monitor/sampling.py) drops and weights records right
+    after parsing, and in adaptive mode watches the downstream queues.
+    A detector (see monitor/streaming.py) runs in the enrich stage.
+    """
+    parse = partial(parse, verbose=verbose)
+    enrich = partial(enrich_record, verbose=verbose)
+    if detector is not None:
+        def enrich(record):
+            return detector(enrich_record(record, verbose))
+
+    stages = []
+    handlers = (("parse", sampled(parse, sampler)), ("enrich", enrich), ("persist", persister))
+    for name, handler in handlers:
+        config = stage_config(name)
+        if policy:
+            config["policy"] = policy
+        stages.append(Stage(name, handler, **config))
+    if sampler is not None:
+        sampler.watch(*(stage.queue for stage in stages[1:]))
+    return Pipeline(stages)
@@ -0,0 +1,192 @@
+"""
+Exact running totals, so pages never COUNT(*) or DISTINCT the big tables.
+
+Each total is one Counter row, changed by a delta in the same transaction
+as the write it counts:
+
+* ``rows:networklog`` / ``rows:flow``: the log writer (BatchWriter.write)
+  and every bulk delete (retention, archiving).
+* ``hosts``: distinct source addresses ever ingested. Each batch's new
+  sources go into KnownHost.
+
+On SQLite and PostgreSQL a batch costs two statements on top of its rows:
+one INSERT ... ON CONFLICT DO NOTHING of its unseen sources into KnownHost,
+whose row count is the number of new hosts, and one upsert of all its
+counter deltas.
+* ``alerts``, ``alerts:<severity>``, ``alerts:reviewed``: the alert
+  emitter for its bulk writes, and signals (monitor/signals.py) for
+  everything that goes through save()/delete().
+* ``threat_ips``: signals on ThreatIP, plus a recount after feed imports.
+
+Reading is a single-row lookup (``get``), or one query for several names
+(``get_many``). ``manage.py rebuild_counters`` recomputes everything from
+the tables if a total ever drifts.
+"""
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+
+from monitor import archive
+from monitor.models import Alert, Counter, Flow, KnownHost, NetworkLog
+from threatintel.models import ThreatIP
+
+
+ALERTS = "alerts"
+ALERTS_REVIEWED = "alerts:reviewed"
+THREAT_IPS = "threat_ips"
+HOSTS = "hosts"
+
+# Sources this process has already seen in KnownHost, so most batches skip the lookup
+KNOWN_HOSTS_CACHE = 100000
+HOSTS_PER_STATEMENT = 400  # two parameters each, within SQLite's limit
+_known_hosts = set()
+
+
+def _upserts():
+    return connection.vendor in ("sqlite", "postgresql")
+
+
+def rows_counter(model):
+    return f"rows:{model._meta.model_name}"
+
+
+def severity_counter(severity):
+    return f"alerts:{severity.lower()}"
+
+
+# ------------------ reading ------------------
+def get(name):
+    return Counter.objects.filter(name=name).values_list("value", flat=True).first() or 0
+
+
+def get_many(names):
+    values = dict(Counter.objects.filter(name__in=names).values_list("name", "value"))
+    return {name: values.get(name, 0) for name in names}
+
+
+# ------------------ writing ------------------
+def add(deltas):
+    """Apply {name: delta}; call inside the transaction of the change being counted."""
+    deltas = sorted((name, delta) for name, delta in deltas.items() if delta)
+    if not deltas:
+        return
+    if _upserts():
+        table = connection.ops.quote_name(Counter._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (name, value) VALUES {', '.join(['(%s, %s)'] * len(deltas))} "
+                f"ON CONFLICT (name) DO UPDATE SET value = {table}.value + excluded.value",
+                [value for pair in deltas for value in pair],
+            )
+        return
+
+    # Other backends: update, then create what was missing
+    for name, delta in deltas:
+        if not Counter.objects.filter(name=name).update(value=F("value") + delta):
+            Counter.objects.create(name=name, value=delta)
+
+
+def set_value(name, value):
+    Counter.objects.update_or_create(name=name, defaults={"value": value})
+
+
+def merge(*deltas):
+    total = {}
+    for delta in deltas:
+        for name, value in delta.items():
+            total[name] = total.get(name, 0) + value
+    return total
+
+
+def alert_deltas(severity, reviewed, sign=1):
+    """Counter deltas for one alert appearing (sign=1) or disappearing (sign=-1)."""
+    deltas = {ALERTS: sign, severity_counter(severity): sign}
+    if reviewed:
+        deltas[ALERTS_REVIEWED] = sign
+    return deltas
+
+
+def record_rows(model, batch):
+    """Count a written batch of NetworkLog/Flow rows and any new source hosts."""
+    sources = {row.source_ip for row in batch} - _known_hosts
+    new = 0
+    if sources:
+        new = _insert_hosts(sorted(sources))
+        transaction.on_commit(lambda: _remember_known(sources))
+    add({rows_counter(model): len(batch), HOSTS: new})
+
+
+def _insert_hosts(sources):
+    """Add the addresses KnownHost lacks; returns how many were new."""
+    if not _upserts():
+        new = set(sources) - set(KnownHost.objects.filter(ip__in=sources).values_list("ip", flat=True))
+        # Another writer may insert the same host first; rebuild_counters
+        # corrects the (rare) double count
+        KnownHost.objects.bulk_create([KnownHost(ip=ip) for ip in new], ignore_conflicts=True)
+        return len(new)
+
+    table = connection.ops.quote_name(KnownHost._meta.db_table)
+    ip_field = KnownHost._meta.get_field("ip")
+    now = KnownHost._meta.get_field("first_seen").get_db_prep_value(datetime.now(), connection)
+    new = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(sources), HOSTS_PER_STATEMENT):
+            chunk = sources[start:start + HOSTS_PER_STATEMENT]
+            cursor.execute(
+                f"INSERT INTO {table} (ip, first_seen) VALUES {', '.join(['(%s, %s)'] * len(chunk))} "
+                f"ON CONFLICT (ip) DO NOTHING",
+                [value for ip in chunk for value in (ip_field.get_db_prep_value(ip, connection), now)],
+            )
+            new += cursor.rowcount  # rows inserted: conflicts are not counted
+    return new
+
+
+def hosts_deleted(deleted):
+    """Count KnownHost rows removed outside ingest (bench_ingest's cleanup)."""
+    _known_hosts.clear()
+    add({HOSTS: -deleted})
+
+
+def _remember_known(sources):
+    if len(_known_hosts) + len(sources) > KNOWN_HOSTS_CACHE:
+        _known_hosts.clear()
+    _known_hosts.update(sources)
+
+
+def rows_deleted(model, deleted):
+    add({rows_counter(model): -deleted})
+
+
+# ------------------ rebuilding ------------------
+def _remember_hosts(addresses, chunk=5000):
+    addresses = list(addresses)
+    for start in range(0, len(addresses), chunk):
+        KnownHost.objects.bulk_create([KnownHost(ip=ip) for ip in addresses[start:start + chunk]],
+                                      ignore_conflicts=True)
+
+
+def rebuild():
+    """Recompute every counter from the tables (and the archive's hosts); returns them."""
+    # Hosts are never forgotten, even when their logs are gone
+    for model in (NetworkLog, Flow):
+        _remember_hosts(model.objects.values_list("source_ip", flat=True).distinct().iterator())
+    for segment in archive.segments():
+        _remember_hosts(str(value) for value in segment.values("src"))
+
+    totals = {rows_counter(model): model.objects.count() for model in (NetworkLog, Flow)}
+    alerts = Alert.objects.aggregate(
+        total=Count("id"),
+        reviewed=Count("id", filter=Q(reviewed=True)),
+        **{severity.lower(): Count("id", filter=Q(severity=severity)) for severity, _ in Alert.SEVERITY_CHOICES},
+    )
+    totals[ALERTS] = alerts["total"]
+    totals[ALERTS_REVIEWED] = alerts["reviewed"]
+    for severity, _ in Alert.SEVERITY_CHOICES:
+        totals[severity_counter(severity)] = alerts[severity.lower()]
+    totals[THREAT_IPS] = ThreatIP.objects.count()
+    totals[HOSTS] = KnownHost.objects.count()
+    with transaction.atomic():
+        for name, value in totals.items():
+            set_value(name, value)
+    return totals
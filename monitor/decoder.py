@@ -0,0 +1,116 @@
+"""
+Minimal header decoder for raw link-layer frames.
+
+Reads only what the capture pipeline stores (addresses, protocol, ports)
+straight from the frame bytes with struct, without building scapy layer
+objects. Anything it cannot place (ARP, unknown link types, truncated
+headers) decodes to None, like a non-IP packet in the scapy path.
+"""
+import socket
+import struct
+
+
+# Link types (pcap LINKTYPE_* values)
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = (12, 14, 101, 228, 229)
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_LINUX_SLL2 = 276
+
+ETH_IPV4 = 0x0800
+ETH_IPV6 = 0x86DD
+ETH_VLAN = (0x8100, 0x88A8, 0x9100)
+
+PROTO_TCP = 6
+PROTO_UDP = 17
+PROTO_ICMP = 1
+
+# IPv6 extension headers that sit between the fixed header and the payload
+IPV6_EXT = (0, 43, 44, 60)
+
+_ushort = struct.Struct("!H")
+_ports = struct.Struct("!HH")
+_inet_ntoa = socket.inet_ntoa
+_inet_ntop = socket.inet_ntop
+_AF_INET6 = socket.AF_INET6
+
+
+def network_offset(data, linktype):
+    """Offset of the IP header inside the frame, or -1 if there is none."""
+    if linktype == LINKTYPE_ETHERNET:
+        if len(data) < 14:
+            return -1
+        ethertype = _ushort.unpack_from(data, 12)[0]
+        offset = 14
+        while ethertype in ETH_VLAN and len(data) >= offset + 4:
+            ethertype = _ushort.unpack_from(data, offset + 2)[0]
+            offset += 4
+        return offset if ethertype in (ETH_IPV4, ETH_IPV6) else -1
+
+    if linktype in LINKTYPE_RAW:
+        return 0
+    if linktype in (LINKTYPE_NULL, LINKTYPE_LOOP):
+        return 4  # 4-byte address family; the IP version nibble tells v4/v6
+    if linktype == LINKTYPE_LINUX_SLL:
+        if len(data) < 16 or _ushort.unpack_from(data, 14)[0] not in (ETH_IPV4, ETH_IPV6):
+            return -1
+        return 16
+    if linktype == LINKTYPE_LINUX_SLL2:
+        if len(data) < 20 or _ushort.unpack_from(data, 0)[0] not in (ETH_IPV4, ETH_IPV6):
+            return -1
+        return 20
+    return -1
+
+
+def decode(data, linktype=LINKTYPE_ETHERNET):
+    """
+    (src, dst, proto, sport, dport) for an IPv4/IPv6 frame, else None.
+    Ports are None unless the packet is an unfragmented-first TCP/UDP segment.
+    """
+    offset = network_offset(data, linktype)
+    if offset < 0 or len(data) <= offset:
+        return None
+
+    mv = memoryview(data)
+    version = mv[offset] >> 4
+
+    if version == 4:
+        if len(data) < offset + 20:
+            return None
+        ihl = (mv[offset] & 0x0F) * 4
+        if ihl < 20:
+            return None  # malformed: the header cannot be shorter than its fixed part
+        proto = mv[offset + 9]
+        src = _inet_ntoa(mv[offset + 12:offset + 16])
+        dst = _inet_ntoa(mv[offset + 16:offset + 20])
+        # Only the first fragment carries the transport header, and only
+        # when the options did not run past the captured bytes
+        if _ushort.unpack_from(mv, offset + 6)[0] & 0x1FFF or len(data) < offset + ihl:
+            return src, dst, proto, None, None
+        l4 = offset + ihl
+
+    elif version == 6:
+        if len(data) < offset + 40:
+            return None
+        proto = mv[offset + 6]
+        src = _inet_ntop(_AF_INET6, mv[offset + 8:offset + 24])
+        dst = _inet_ntop(_AF_INET6, mv[offset + 24:offset + 40])
+        l4 = offset + 40
+        while proto in IPV6_EXT and len(data) >= l4 + 8:
+            if proto == 44:
+                if _ushort.unpack_from(mv, l4 + 2)[0] & 0xFFF8:
+                    return src, dst, mv[l4], None, None  # non-first fragment
+                size = 8
+            else:
+                size = (mv[l4 + 1] + 1) * 8
+            proto = mv[l4]
+            l4 += size
+
+    else:
+        return None
+
+    if proto in (PROTO_TCP, PROTO_UDP) and len(data) >= l4 + 4:
+        sport, dport = _ports.unpack_from(mv, l4)
+        return src, dst, proto, sport, dport
+    return src, dst, proto, None, None
@@ -1,58 +1,83 @@
-from monitor.models import NetworkLog, Alert
+from monitor import alerts
+from monitor.models import Protocol
+from monitor.sources import traffic_source
 from datetime import datetime, timedelta
 from django.db.models import Count, Sum
 
 
+# Each detector reads per-packet logs or flows, following MONITOR_CAPTURE_MODE
+# unless a source name ("packets"/"flows") is passed in. Alerts go through the
+# shared emitter, so re-running a detector extends the open alert for an IP
+# instead of adding a new row.
+#
+# The same rules run in the capture pipeline as they happen (monitor/streaming.py);
+# both read their thresholds from here.
 
-def detect_high_traffic():
-    window = datetime.now() - timedelta(minutes=5)
+HIGH_TRAFFIC_WINDOW = timedelta(minutes=5)
+HIGH_TRAFFIC_BYTES = 1000000  # 1 MB threshold
+PORT_SCAN_WINDOW = timedelta(minutes=2)
+PORT_SCAN_TARGETS = 10
+ICMP_FLOOD_WINDOW = timedelta(minutes=1)
+ICMP_FLOOD_PACKETS = 50
+
+
+def detect_high_traffic(source=None):
+    window = datetime.now() - HIGH_TRAFFIC_WINDOW
 
     heavy = (
-        NetworkLog.objects
-        .filter(timestamp__gte=window)
+        traffic_source(source)
+        .since(window)
         .values("source_ip")
         .annotate(total=Sum("bytes_transferred"))
-        .filter(total__gte=1000000)  # 1 MB threshold
+        .filter(total__gte=HIGH_TRAFFIC_BYTES)
     )
 
     for item in heavy:
-        Alert.objects.create(
+        alerts.emitter.emit(
+            alerts.HIGH_TRAFFIC, item["source_ip"],
             message=f"High bandwidth usage from {item['source_ip']} ({item['total']} bytes)",
             severity="High"
         )
+    alerts.emitter.flush()
 
 
-def detect_port_scan():
-    window = datetime.now() - timedelta(minutes=2)
+def detect_port_scan(source=None):
+    window = datetime.now() - PORT_SCAN_WINDOW
 
     scans = (
-        NetworkLog.objects
-        .filter(timestamp__gte=window)
+        traffic_source(source)
+        .since(window)
         .values("source_ip")
         .annotate(targets=Count("destination_ip", distinct=True))
-        .filter(targets__gte=10)
+        .filter(targets__gte=PORT_SCAN_TARGETS)
     )
 
     for item in scans:
-        Alert.objects.create(
+        alerts.emitter.emit(
+            alerts.PORT_SCAN, item["source_ip"],
             message=f"Possible port scanning detected from {item['source_ip']}",
             severity="Medium"
         )
+    alerts.emitter.flush()
 
 
-def detect_icmp_flood():
-    window = datetime.now() - timedelta(minutes=1)
+def detect_icmp_flood(source=None):
+    window = datetime.now() - ICMP_FLOOD_WINDOW
+    source = traffic_source(source)
 
     floods = (
-        NetworkLog.objects
-        .filter(timestamp__gte=window, protocol="ICMP")
+        source
+        .since(window)
+        .filter(protocol=Protocol.ICMP)
         .values("source_ip")
-        .annotate(count=Count("id"))
-        .filter(count__gte=50)
+        .annotate(count=source.packets())
+        .filter(count__gte=ICMP_FLOOD_PACKETS)
     )
 
     for item in floods:
-        Alert.objects.create(
+        alerts.emitter.emit(
+            alerts.ICMP_FLOOD, item["source_ip"],
             message=f"ICMP flood detected from {item['source_ip']}",
             severity="High"
         )
+    alerts.emitter.flush()
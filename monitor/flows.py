@@ -0,0 +1,110 @@
+import threading
+from datetime import datetime, timedelta
+
+from django.conf import settings
+
+from monitor.models import Flow
+
+
+IDLE_TIMEOUT = getattr(settings, "MONITOR_FLOW_IDLE_TIMEOUT", 30)        # seconds
+ACTIVE_TIMEOUT = getattr(settings, "MONITOR_FLOW_ACTIVE_TIMEOUT", 300)   # seconds
+SWEEP_INTERVAL = 1  # seconds between idle-timeout scans
+
+
+class FlowTable:
+    """
+    Aggregates packet records into 5-tuple flows.
+
+    A flow closes when it has seen no packet for ``idle_timeout`` seconds, or
+    when it has been open for ``active_timeout`` seconds (long-lived
+    connections are reported in slices). Closed flows are handed to
+    ``on_close`` as unsaved Flow instances.
+
+    Timeouts are evaluated against packet timestamps, so the same table works
+    for live capture and for replaying old captures.
+    """
+
+    def __init__(self, on_close, idle_timeout=IDLE_TIMEOUT, active_timeout=ACTIVE_TIMEOUT):
+        self.on_close = on_close
+        self.idle_timeout = timedelta(seconds=idle_timeout)
+        self.active_timeout = timedelta(seconds=active_timeout)
+        self.sweep_interval = timedelta(seconds=SWEEP_INTERVAL)
+
+        # key -> [first_seen, last_seen, packets, bytes]
+        self._flows = {}
+        self._lock = threading.Lock()
+        self._last_sweep = None
+
+        # Counters
+        self.packets_seen = 0
+        self.flows_closed = 0
+
+    def __len__(self):
+        return len(self._flows)
+
+    def add(self, record):
+        key = (record.src, record.dst, record.sport, record.dport, record.proto)
+        ts = record.timestamp
+        weight = record.weight
+        closed = []
+
+        with self._lock:
+            self.packets_seen += 1
+            entry = self._flows.get(key)
+            if entry is None:
+                self._flows[key] = [ts, ts, weight, record.length * weight]
+            else:
+                entry[1] = max(entry[1], ts)
+                entry[2] += weight
+                entry[3] += record.length * weight
+                if entry[1] - entry[0] >= self.active_timeout:
+                    closed.append(self._close(key))
+
+            due = self._last_sweep is None or ts - self._last_sweep >= self.sweep_interval
+        self._emit(closed)
+        if due:
+            self.sweep(ts)
+
+    def sweep(self, now=None):
+        """Close every flow that has been idle past the timeout at ``now``."""
+        now = now or datetime.now()
+        with self._lock:
+            self._last_sweep = now
+            cutoff = now - self.idle_timeout
+            closed = [self._close(key) for key in [k for k, entry in self._flows.items() if entry[1] <= cutoff]]
+        self._emit(closed)
+
+    def close_all(self):
+        with self._lock:
+            closed = [self._close(key) for key in list(self._flows)]
+        self._emit(closed)
+
+    def _close(self, key):
+        """Remove a flow from the table; called with the lock held."""
+        first_seen, last_seen, packets, nbytes = self._flows.pop(key)
+        src, dst, sport, dport, proto = key
+        self.flows_closed += 1
+        return Flow(
+            first_seen=first_seen,
+            last_seen=last_seen,
+            source_ip=src,
+            destination_ip=dst,
+            source_port=sport,
+            destination_port=dport,
+            protocol=proto,
+            packets=packets,
+            bytes_transferred=nbytes,
+        )
+
+    def _emit(self, closed):
+        # Outside the lock: on_close may write to the database, and other
+        # threads must keep adding packets meanwhile
+        for flow in closed:
+            self.on_close(flow)
+
+    def stats(self):
+        return {
+            "active_flows": len(self._flows),
+            "packets_seen": self.packets_seen,
+            "flows_closed": self.flows_closed,
+        }
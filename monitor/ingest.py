@@ -0,0 +1,301 @@
+import io
+import threading
+import time
+import traceback
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from monitor import counters
+from monitor.models import NetworkLog
+
+
+BATCH_SIZE = getattr(settings, "MONITOR_BATCH_SIZE", 500)
+MAX_LATENCY = getattr(settings, "MONITOR_BATCH_MAX_LATENCY", 1.0)  # seconds
+BACKEND = getattr(settings, "MONITOR_INGEST_BACKEND", "auto")
+# Extra pragmas for the SQLite writer connection (WAL and synchronous=NORMAL
+# are set for every connection in DATABASES OPTIONS)
+SQLITE_WRITER_PRAGMAS = getattr(settings, "MONITOR_SQLITE_WRITER_PRAGMAS", [
+    "cache_size = -65536",   # 64 MB page cache
+    "temp_store = MEMORY",
+])
+MAX_RETRIES = getattr(settings, "MONITOR_BATCH_MAX_RETRIES", 5)            # retries before a batch is dropped
+RETRY_BACKOFF = getattr(settings, "MONITOR_BATCH_RETRY_BACKOFF", 0.5)      # seconds, doubled on each retry
+MAX_BACKLOG = 4  # batches a single-writer buffer may hold before add() waits
+
+
+# ------------------ backends ------------------
+class OrmBackend:
+    """Plain bulk_create; works on every database."""
+
+    name = "orm"
+    single_writer = False  # True: only the writer thread touches the database
+
+    def prepare(self):
+        """Called once on the writer thread before its first write."""
+
+    def write(self, model, batch, batch_size):
+        model.objects.bulk_create(batch, batch_size=batch_size)
+
+
+class CopyBackend(OrmBackend):
+    """PostgreSQL: stream each batch with COPY ... FROM STDIN instead of INSERTs."""
+
+    name = "copy"
+
+    def write(self, model, batch, batch_size):
+        fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+        qn = connection.ops.quote_name
+        sql = (f"COPY {qn(model._meta.db_table)} ({', '.join(qn(field.column) for field in fields)}) "
+               f"FROM STDIN")
+        rows = ([field.get_prep_value(field.pre_save(obj, True)) for field in fields] for obj in batch)
+        with connection.cursor() as cursor:
+            raw = cursor.cursor
+            if hasattr(raw, "copy"):  # psycopg 3
+                with raw.copy(sql) as copy:
+                    for row in rows:
+                        copy.write_row(row)
+            else:                     # psycopg2
+                data = "".join("\t".join(_copy_text(value) for value in row) + "\n" for row in rows)
+                raw.copy_expert(sql, io.StringIO(data))
+
+
+def _copy_text(value):
+    """One column in COPY's text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "\\\\x" + bytes(value).hex()  # bytea hex, backslash escaped
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+class SqliteBackend(OrmBackend):
+    """
+    SQLite: every write goes through the writer thread's connection, tuned
+    for bulk inserts. With WAL, web readers keep reading while it commits.
+    """
+
+    name = "sqlite"
+    single_writer = True
+
+    def prepare(self):
+        with connection.cursor() as cursor:
+            for pragma in SQLITE_WRITER_PRAGMAS:
+                cursor.execute(f"PRAGMA {pragma}")
+
+    def write(self, model, batch, batch_size):
+        # One prepared INSERT run by executemany: the values bulk_create would
+        # send, without building a multi-row statement per slice of the batch
+        db = transaction.get_connection()  # not the thread-local proxy, once per value
+        fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+        qn = db.ops.quote_name
+        sql = (f"INSERT INTO {qn(model._meta.db_table)} ({', '.join(qn(field.column) for field in fields)}) "
+               f"VALUES ({', '.join(['%s'] * len(fields))})")
+        rows = [[field.get_db_prep_save(field.pre_save(obj, True), db) for field in fields] for obj in batch]
+        with db.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+
+BACKENDS = {backend.name: backend for backend in (OrmBackend, CopyBackend, SqliteBackend)}
+AUTO_BACKENDS = {"postgresql": CopyBackend, "sqlite": SqliteBackend}
+
+
+def ingest_backend(name=None):
+    """The named backend; "auto" picks COPY on PostgreSQL and the tuned writer on SQLite."""
+    name = name or BACKEND
+    if name == "auto":
+        return AUTO_BACKENDS.get(connection.vendor, OrmBackend)()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown ingest backend {name!r} (choose from auto, {', '.join(BACKENDS)})")
+    if name == CopyBackend.name and connection.vendor != "postgresql":
+        raise ValueError("The copy ingest backend needs PostgreSQL")
+    return BACKENDS[name]()
+
+
+# ------------------ batching ------------------
+
+class BatchWriter:
+    """
+    Buffers model instances and writes them with one bulk_create per batch.
+
+    A flush is triggered when the buffer holds ``batch_size`` rows or when the
+    oldest buffered row has waited ``max_latency`` seconds, whichever comes
+    first. Call ``close()`` (or use the writer as a context manager) so the
+    tail of the buffer is written on shutdown.
+
+    Rows are written by an ingest backend (see ``ingest_backend``). With a
+    single-writer backend, full batches are handed to the timer thread
+    instead of being written by the thread that called ``add()``.
+
+    A batch whose write fails (a locked database, a dropped connection) goes
+    back to the front of the buffer and is retried with a doubling backoff.
+    Its rows only count as failed once ``max_retries`` retries have failed.
+    """
+
+    def __init__(self, model=NetworkLog, batch_size=BATCH_SIZE, max_latency=MAX_LATENCY, backend=None,
+                 max_retries=MAX_RETRIES, retry_backoff=RETRY_BACKOFF):
+        self.model = model
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.backend = ingest_backend(backend)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self._buffer = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._timer = None
+        self._single_writer = False
+        self._failures = 0       # failed writes in a row of the batch at the front of the buffer
+        self._retry_at = None    # monotonic time before which that batch is not retried
+
+        # Counters
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.flushes = 0
+        self.retries = 0
+        self.flush_time_total = 0.0
+        self.flush_time_max = 0.0
+        self.flush_time_last = 0.0
+
+    # ------------------ lifecycle ------------------
+    def start(self):
+        if self._timer is None:
+            self._timer = threading.Thread(target=self._run_timer, name="batch-writer", daemon=True)
+            self._single_writer = self.backend.single_writer
+            self._timer.start()
+        return self
+
+    def close(self):
+        self._single_writer = False
+        self._stop.set()
+        self._wake.set()
+        if self._timer is not None:
+            self._timer.join()
+            self._timer = None
+        # Keep retrying a failing batch until it is written or given up
+        while not self.flush() and self._retry_at is not None:
+            time.sleep(max(0.0, self._retry_at - time.monotonic()))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # ------------------ buffering ------------------
+    def add(self, obj):
+        with self._lock:
+            # Let the writer thread catch up rather than buffer without bound
+            while self._single_writer and len(self._buffer) >= self.batch_size * MAX_BACKLOG:
+                self._drained.wait(self.max_latency)
+            if not self._buffer:
+                self._oldest = time.monotonic()
+            self._buffer.append(obj)
+            full = len(self._buffer) >= self.batch_size and not self._backing_off()
+        if full:
+            if self._single_writer:
+                self._wake.set()
+            else:
+                self.flush()
+
+    def extend(self, objs):
+        for obj in objs:
+            self.add(obj)
+
+    def pending(self):
+        with self._lock:
+            return len(self._buffer)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+                self._oldest = None
+                self._drained.notify_all()
+            if not batch:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    self.write(batch)
+            except Exception as e:
+                if not connection.in_atomic_block:
+                    connection.close_if_unusable_or_obsolete()  # reconnect after a dropped connection
+                self._failed(batch, e)
+                return 0
+
+            self._failures = 0
+            self._retry_at = None
+            elapsed = time.perf_counter() - started
+            self.rows_written += len(batch)
+            self.flushes += 1
+            self.flush_time_total += elapsed
+            self.flush_time_last = elapsed
+            self.flush_time_max = max(self.flush_time_max, elapsed)
+            return len(batch)
+
+    def _failed(self, batch, error):
+        """Put a batch that could not be written back in front of the buffer, or give it up."""
+        self._failures += 1
+        if self._failures > self.max_retries:
+            self._failures = 0
+            self._retry_at = None
+            self.rows_failed += len(batch)
+            print(f"❌ Failed to write batch of {len(batch)} rows after {self.max_retries} retries, "
+                  f"dropping it:", error)
+            traceback.print_exc()
+            return
+        delay = self.retry_backoff * 2 ** (self._failures - 1)
+        with self._lock:
+            self._buffer[:0] = batch
+            self._oldest = time.monotonic() - self.max_latency  # due as soon as the backoff ends
+            self._retry_at = time.monotonic() + delay
+        self.retries += 1
+        print(f"❌ Failed to write batch of {len(batch)} rows, retrying in {delay:.1f}s:", error)
+
+    def _backing_off(self):
+        return self._retry_at is not None and time.monotonic() < self._retry_at
+
+    def write(self, batch):
+        self.backend.write(self.model, batch, self.batch_size)
+        counters.record_rows(self.model, batch)
+
+    def _run_timer(self):
+        try:
+            self.backend.prepare()
+            while not self._stop.is_set():
+                self._wake.wait(self.max_latency / 4)
+                self._wake.clear()
+                with self._lock:
+                    due = self._oldest is not None and not self._backing_off() and (
+                        len(self._buffer) >= self.batch_size
+                        or time.monotonic() - self._oldest >= self.max_latency
+                    )
+                if due:
+                    self.flush()
+        finally:
+            # The timer thread owns its own DB connection.
+            connection.close()
+
+    # ------------------ reporting ------------------
+    def stats(self):
+        return {
+            "backend": self.backend.name,
+            "rows_written": self.rows_written,
+            "rows_failed": self.rows_failed,
+            "rows_pending": self.pending(),
+            "retries": self.retries,
+            "flushes": self.flushes,
+            "flush_ms_avg": round(1000 * self.flush_time_total / self.flushes, 2) if self.flushes else 0.0,
+            "flush_ms_last": round(1000 * self.flush_time_last, 2),
+            "flush_ms_max": round(1000 * self.flush_time_max, 2),
+        }
@@ -0,0 +1,208 @@
+"""
+Server-sent live updates for the dashboard and traffic pages (``/monitor/live/``).
+
+Open pages keep one EventSource connection instead of polling. Each
+server process has one ``Hub``, an in-process pub/sub. Every connection
+subscribes to the topics its page shows:
+
+* ``stats``: the summary cards (re-rendered HTML, sent only when it changes)
+* ``charts``: timeline and top-source chart data, sent only when it changes
+* ``traffic``: just the new log rows, as table rows to prepend
+* ``alerts``: just the alerts that are new or have had new occurrences
+
+The log writer and the alert emitter run in other processes (capture,
+run_detection). They already publish "new data" through the shared cache
+marker that invalidates the dashboard snapshot (snapshot.mark_changed).
+While it has subscribers, the hub reads that one marker every
+MONITOR_LIVE_POLL seconds. When the marker moves, the hub computes each
+delta once and fans it out to every subscriber. So the per-page cost is
+a queued message, and with no new data nobody queries anything. When
+the last subscriber leaves, the hub's task stops.
+
+This needs an ASGI server (``uvicorn network_monitor.asgi:application``).
+Under WSGI the endpoint answers 204, and the pages go back to polling.
+"""
+import asyncio
+import json
+import time
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from monitor import snapshot
+from monitor.models import Alert
+from monitor.sources import traffic_source
+
+
+POLL_INTERVAL = getattr(settings, "MONITOR_LIVE_POLL", 1.0)   # seconds between marker reads, per process
+HEARTBEAT = 30         # seconds; an SSE comment keeps proxies from closing idle streams
+QUEUE_SIZE = 100       # messages a slow client may fall behind before it is told to reload
+TRAFFIC_ROWS = 300     # rows on the traffic page
+ALERT_ROWS = 10
+
+STATS = "stats"
+CHARTS = "charts"
+TRAFFIC = "traffic"
+ALERTS = "alerts"
+TOPICS = frozenset((STATS, CHARTS, TRAFFIC, ALERTS))
+
+_UNSEEN = object()
+
+
+class Subscriber:
+    def __init__(self, topics, source):
+        self.topics = frozenset(topics)
+        self.source = source
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.lagging = False
+
+    def send(self, topic, data):
+        try:
+            self.queue.put_nowait((topic, data))
+        except asyncio.QueueFull:
+            self.lagging = True
+
+
+class Hub:
+    """Fans deltas out to the connections of this process."""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.messages = 0
+        self._task = None
+        self._reset()
+
+    def _reset(self):
+        self._marker = _UNSEEN
+        self._stats_due = False
+        self._stats_at = 0.0
+        self._sent = {}         # (topic, source) -> last full-state payload sent
+        self._last_id = {}      # source -> newest log id pushed
+        self._alerts_since = None
+
+    def prime(self, subscriber):
+        """Start the subscriber's deltas from now (the page already shows the rest)."""
+        if TRAFFIC in subscriber.topics and subscriber.source not in self._last_id:
+            self._last_id[subscriber.source] = traffic_source(subscriber.source).last_id()
+        if ALERTS in subscriber.topics and self._alerts_since is None:
+            self._alerts_since = (Alert.objects.order_by("-last_seen").values_list("last_seen", flat=True).first()
+                                  or datetime.min)
+
+    def subscribe(self, topics, source):
+        subscriber = Subscriber(topics, source)
+        self.subscribers.add(subscriber)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def _run(self):
+        try:
+            while self.subscribers:
+                marker = await sync_to_async(cache.get)(snapshot.CHANGED_KEY)
+                changed = marker != self._marker
+                self._marker = marker
+                self._stats_due = self._stats_due or changed
+                # Cards and charts at most once per snapshot interval; rows and alerts at once
+                stats = self._stats_due and time.monotonic() - self._stats_at >= snapshot.INTERVAL
+                if changed or stats:
+                    wanted = {(topic, subscriber.source) for subscriber in self.subscribers
+                              for topic in subscriber.topics}
+                    if stats:
+                        self._stats_due, self._stats_at = False, time.monotonic()
+                    else:
+                        wanted = {(topic, source) for topic, source in wanted if topic in (TRAFFIC, ALERTS)}
+                    self._publish(await sync_to_async(self._collect)(wanted))
+                await asyncio.sleep(POLL_INTERVAL)
+        finally:
+            self._reset()
+
+    def _publish(self, messages):
+        for subscriber in list(self.subscribers):
+            for topic in subscriber.topics:
+                data = messages.get((topic, subscriber.source))
+                if data is not None:
+                    subscriber.send(topic, data)
+                    self.messages += 1
+
+    # ------------------ deltas (sync, one query set per change) ------------------
+    def _collect(self, wanted):
+        messages = {}
+        snapshots = {}
+        alerts = self._new_alerts() if any(topic == ALERTS for topic, _ in wanted) else None
+        for topic, source in wanted:
+            if topic == ALERTS:
+                data = alerts
+            elif topic == TRAFFIC:
+                data = self._new_rows(source)
+            else:
+                if source not in snapshots:
+                    snapshots[source] = snapshot.build(source)
+                data = self._changed(topic, source, snapshots[source])
+            if data is not None:
+                messages[(topic, source)] = data
+        return messages
+
+    def _changed(self, topic, source, data):
+        if topic == STATS:
+            payload = {"html": render_to_string("monitor/partials/stats_partial.html", data)}
+        else:
+            payload = {key: data[key] for key in ("timeline_labels", "timeline_data", "top_ip_labels", "top_ip_values")}
+        if self._sent.get((topic, source)) == payload:
+            return None
+        self._sent[(topic, source)] = payload
+        return payload
+
+    def _new_rows(self, source):
+        last_id = self._last_id.get(source)
+        if last_id is None:
+            return None
+        logs = list(traffic_source(source).newer(last_id, TRAFFIC_ROWS))
+        if not logs:
+            return None
+        self._last_id[source] = logs[0].id
+        return {"html": render_to_string("monitor/partials/traffic_rows.html", {"logs": logs}), "last_id": logs[0].id}
+
+    def _new_alerts(self):
+        if self._alerts_since is None:
+            return None
+        alerts = list(Alert.objects.filter(last_seen__gt=self._alerts_since).order_by("-last_seen")[:ALERT_ROWS])
+        if not alerts:
+            return None
+        self._alerts_since = alerts[0].last_seen
+        return {"items": [
+            {"id": alert.id, "html": render_to_string("monitor/partials/alert_item.html", {"alert": alert})}
+            for alert in reversed(alerts)
+        ]}
+
+
+hub = Hub()
+
+
+def _event(topic, data):
+    return f"event: {topic}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream(topics, source):
+    """The SSE body for one connection."""
+    subscriber = hub.subscribe(topics, source)
+    try:
+        await sync_to_async(hub.prime)(subscriber)
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                topic, data = await asyncio.wait_for(subscriber.queue.get(), HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if subscriber.lagging:
+                yield _event("reload", {})
+                return
+            yield _event(topic, data)
+    finally:
+        hub.unsubscribe(subscriber)
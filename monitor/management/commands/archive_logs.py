@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from monitor.archive import ARCHIVE_AFTER_DAYS, ARCHIVE_DIR, archive_logs, archive_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Move logs older than MONITOR_ARCHIVE_AFTER_DAYS from the database into "
+        "columnar segments under MONITOR_ARCHIVE_DIR (see monitor/archive.py)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", type=float, default=ARCHIVE_AFTER_DAYS,
+                            help="archive logs older than this many days")
+        parser.add_argument("--stats", action="store_true", help="only show what the archive holds")
+
+    def handle(self, *args, **opts):
+        if not opts["stats"]:
+            started = time.monotonic()
+            written, deleted = archive_logs(opts["older_than"])
+            for segment in written:
+                self.stdout.write(f"  {segment.path.name}: {segment.rows} rows "
+                                  f"({segment.min_ts:%Y-%m-%d %H:%M} .. {segment.max_ts:%Y-%m-%d %H:%M})")
+            self.stdout.write(self.style.SUCCESS(
+                f"Archived {sum(s.rows for s in written)} logs into {len(written)} segments, "
+                f"deleted {deleted} from the database in {time.monotonic() - started:.1f}s"
+            ))
+
+        stats = archive_stats()
+        self.stdout.write(f"Archive {ARCHIVE_DIR}: {stats['segments']} segments, {stats['rows']} rows, "
+                          f"{stats['disk_bytes'] / 1e6:.1f} MB"
+                          + (f", {stats['oldest']:%Y-%m-%d} .. {stats['newest']:%Y-%m-%d}" if stats["rows"] else ""))
@@ -0,0 +1,119 @@
+import random
+import statistics
+import threading
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Sum
+
+from monitor import counters
+from monitor.ingest import BACKENDS, BatchWriter, ingest_backend
+from monitor.models import KnownHost, NetworkLog, Protocol
+
+
+def synthetic_rows(n, seed=1):
+    """The same ``n`` NetworkLog rows for every backend: 2000 sources over the last 10 minutes."""
+    rng = random.Random(seed)
+    start = datetime.now() - timedelta(minutes=10)
+    protocols = [Protocol.TCP] * 6 + [Protocol.UDP] * 3 + [Protocol.ICMP]
+    return [
+        (
+            start + timedelta(seconds=600 * i / n),
+            f"10.0.{rng.randrange(8)}.{rng.randrange(250)}",
+            f"192.168.1.{rng.randrange(250)}",
+            rng.choice(protocols),
+            rng.randrange(60, 1500),
+        )
+        for i in range(n)
+    ]
+
+
+class Reader(threading.Thread):
+    """A dashboard-like client querying the table while the writer runs."""
+
+    def __init__(self, stop):
+        super().__init__(daemon=True)
+        self.stop = stop
+        self.latencies = []
+        self.errors = 0
+
+    def run(self):
+        since = datetime.now() - timedelta(minutes=5)
+        try:
+            while not self.stop.is_set():
+                started = time.perf_counter()
+                try:
+                    list(NetworkLog.objects.order_by("-timestamp")[:50])
+                    NetworkLog.objects.filter(timestamp__gte=since).aggregate(Sum("bytes_transferred"))
+                except DatabaseError:
+                    self.errors += 1
+                else:
+                    self.latencies.append(time.perf_counter() - started)
+                time.sleep(0.01)
+        finally:
+            connection.close()
+
+
+class Command(BaseCommand):
+    help = "Write the same synthetic NetworkLog workload through each ingest backend and compare them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100000, help="rows per run (default: 100000)")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--backend", action="append", choices=["auto", *BACKENDS],
+                            help="backend to run (repeatable); default: auto and orm")
+        parser.add_argument("--readers", type=int, default=2,
+                            help="threads querying the table during each run (default: 2)")
+        parser.add_argument("--keep", action="store_true", help="keep the synthetic rows")
+
+    def handle(self, *args, **opts):
+        names = opts["backend"] or ["auto", "orm"]
+        for name in names:
+            try:
+                ingest_backend(name)
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        rows = synthetic_rows(opts["rows"])
+        self.stdout.write(f"{len(rows)} synthetic rows, batch size {opts['batch_size']}, "
+                          f"{opts['readers']} readers, {connection.vendor}")
+
+        for name in names:
+            first_id = NetworkLog.objects.order_by("-id").values_list("id", flat=True).first() or 0
+            first_host = KnownHost.objects.order_by("-id").values_list("id", flat=True).first() or 0
+            stop = threading.Event()
+            readers = [Reader(stop) for _ in range(opts["readers"])]
+            for reader in readers:
+                reader.start()
+
+            writer = BatchWriter(batch_size=opts["batch_size"], backend=name).start()
+            started = time.perf_counter()
+            for timestamp, src, dst, proto, size in rows:
+                writer.add(NetworkLog(timestamp=timestamp, source_ip=src, destination_ip=dst,
+                                      protocol=proto, bytes_transferred=size))
+            writer.close()
+            elapsed = time.perf_counter() - started
+
+            stop.set()
+            for reader in readers:
+                reader.join()
+
+            stats = writer.stats()
+            latencies = sorted(latency for reader in readers for latency in reader.latencies)
+            errors = sum(reader.errors for reader in readers)
+            line = (f"  {stats['backend']:>6}: {stats['rows_written'] / elapsed:>9.0f} rows/s, "
+                    f"flush avg {stats['flush_ms_avg']} ms / max {stats['flush_ms_max']} ms, "
+                    f"{stats['rows_failed']} rows failed")
+            if latencies:
+                p95 = latencies[int(0.95 * (len(latencies) - 1))]
+                line += (f" | reads: {len(latencies)}, median {1000 * statistics.median(latencies):.1f} ms, "
+                         f"p95 {1000 * p95:.1f} ms, {errors} errors")
+            self.stdout.write(line)
+
+            if not opts["keep"]:
+                with transaction.atomic():
+                    counters.rows_deleted(NetworkLog, NetworkLog.objects.filter(id__gt=first_id).delete()[0])
+                    # The synthetic sources are not hosts this network has seen
+                    counters.hosts_deleted(KnownHost.objects.filter(id__gt=first_host).delete()[0])
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from monitor.capture import FRAME_PARSERS, RAW, SCAPY
+from monitor.pcapfile import PcapFormatError, read_frames
+
+
+class Command(BaseCommand):
+    help = "Compare packets/sec of the raw header decoder and the scapy parser on one capture."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="pcap/pcapng file to parse")
+        parser.add_argument("--limit", type=int, default=100000,
+                            help="frames loaded into memory for the run (default: 100000)")
+        parser.add_argument("--repeat", type=int, default=3,
+                            help="timed passes per parser; the best one is reported")
+
+    def handle(self, *args, **opts):
+        try:
+            frames = []
+            for frame in read_frames(opts["path"]):
+                frames.append(frame)
+                if len(frames) >= opts["limit"]:
+                    break
+        except (OSError, PcapFormatError) as e:
+            raise CommandError(str(e))
+        if not frames:
+            raise CommandError("No frames in capture")
+
+        self.stdout.write(f"{len(frames)} frames from {opts['path']}")
+
+        records, times = {}, {}
+        for name in (SCAPY, RAW):
+            parse = FRAME_PARSERS[name]
+            best = None
+            for _ in range(opts["repeat"]):
+                started = time.perf_counter()
+                records[name] = [parse(frame, verbose=False) for frame in frames]
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            times[name] = best
+            self.stdout.write(
+                f"  {name:>5}: {len(frames) / best:>10.0f} pkt/s "
+                f"({1e6 * best / len(frames):.1f} us/pkt)"
+            )
+
+        speedup = times[SCAPY] / times[RAW]
+        self.stdout.write(self.style.SUCCESS(f"raw decoder is {speedup:.1f}x faster"))
+
+        # Both parsers must agree on what gets stored
+        mismatches = sum(
+            1 for a, b in zip(records[SCAPY], records[RAW])
+            if a is not None and (b is None or (a.src, a.dst, a.proto, a.length) != (b.src, b.dst, b.proto, b.length))
+        )
+        if mismatches:
+            self.stdout.write(self.style.WARNING(f"{mismatches} records differ between parsers"))
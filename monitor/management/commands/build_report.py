@@ -0,0 +1,43 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+
+from monitor.reports import PERIODS, build_report, period_bounds
+
+
+class Command(BaseCommand):
+    help = "Build the daily/weekly/monthly traffic report (the Reports page) and print it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--period", choices=PERIODS, default="week")
+        parser.add_argument("--end", help="last day of the report, YYYY-MM-DD (default: today)")
+
+    def handle(self, *args, **opts):
+        try:
+            end = date.fromisoformat(opts["end"]) if opts["end"] else None
+        except ValueError:
+            raise CommandError(f"Not a date: {opts['end']!r}")
+        report = build_report(*period_bounds(opts["period"], end))
+
+        self.stdout.write(f"Traffic {report.since:%Y-%m-%d} .. {report.until:%Y-%m-%d}: {report.rows} logs, "
+                          f"{report.packets} packets, {filesizeformat(report.bytes)}")
+        sections = (
+            ("Daily", [(f"{d['day']:%a %d %b}", d["packets"], d["bytes"]) for d in report.daily]),
+            ("Protocols", [(f"{p['protocol']} ({p['share']:.1f}%)", p["packets"], p["bytes"]) for p in report.protocols]),
+            ("Top sources", [(r["ip"], r["packets"], r["bytes"]) for r in report.top_sources]),
+            ("Top destinations", [(r["ip"], r["packets"], r["bytes"]) for r in report.top_destinations]),
+            ("Hour of day", [(f"{h['hour']:02d}:00", h["packets"], h["bytes"]) for h in report.hourly if h["packets"]]),
+        )
+        for title, rows in sections:
+            self.stdout.write(f"\n{title}")
+            for label, packets, size in rows:
+                self.stdout.write(f"  {label:<36} {packets:>12} pkts {filesizeformat(size):>12}")
+        self.stdout.write("\nTop conversations" + (f" (within {filesizeformat(report.conversation_error)})"
+                                                      if report.conversation_error else ""))
+        for c in report.conversations:
+            self.stdout.write(f"  {c['src'] + ' -> ' + c['dst']:<36} {filesizeformat(c['bytes']):>22}")
+        self.stdout.write("\nAlerts")
+        for row in report.alerts:
+            self.stdout.write(f"  {row['severity']:<8} {row['alerts']:>6} alerts {row['occurrences']:>8} occurrences")
+        self.stdout.write(self.style.SUCCESS(f"\nBuilt in {report.seconds:.2f}s"))
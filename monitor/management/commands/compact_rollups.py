@@ -0,0 +1,55 @@
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from monitor.archive import archive_rows
+from monitor.models import NetworkLog, TrafficRollup
+from monitor.rollups import aggregate, compact, upsert
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold 1-second traffic rollups into minutes and minutes into hours. "
+        "With --rebuild, first recompute all rollups from NetworkLog and the log archive."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true",
+                            help="delete the rollups and rebuild them from the stored and archived logs")
+        parser.add_argument("--chunk-size", type=int, default=20000,
+                            help="logs aggregated per transaction when rebuilding")
+
+    def handle(self, *args, **opts):
+        started = time.monotonic()
+        if opts["rebuild"]:
+            self.rebuild(opts["chunk_size"])
+
+        folded = compact()
+        self.stdout.write(self.style.SUCCESS(
+            f"Compacted {folded.get(1, 0)} second rows and {folded.get(60, 0)} minute rows; "
+            f"{TrafficRollup.objects.count()} rollup rows in {time.monotonic() - started:.1f}s"
+        ))
+
+    def rebuild(self, chunk):
+        TrafficRollup.objects.all().delete()
+        rows = 0
+        archived = archive_rows()
+        while batch := list(islice(archived, chunk)):
+            with transaction.atomic():
+                upsert(aggregate(batch))
+            rows += len(batch)
+
+        last_id = 0
+        while True:
+            batch = list(NetworkLog.objects.filter(id__gt=last_id).order_by("id").only(
+                "id", "timestamp", "source_ip", "destination_ip", "protocol", "bytes_transferred", "packets",
+            )[:chunk])
+            if not batch:
+                break
+            with transaction.atomic():
+                upsert(aggregate(batch))
+            last_id = batch[-1].id
+            rows += len(batch)
+        self.stdout.write(f"Rebuilt rollups from {rows} logs (archived and stored)")
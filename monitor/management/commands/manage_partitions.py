@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from monitor.partitions import RETENTION_DAYS, apply_retention
+
+
+class Command(BaseCommand):
+    help = (
+        "PostgreSQL: create the coming days' NetworkLog partitions and drop those "
+        "older than MONITOR_LOG_RETENTION_DAYS. SQLite (no partitions): delete "
+        "expired logs in chunks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS,
+                            help="override MONITOR_LOG_RETENTION_DAYS (0 keeps everything)")
+        parser.add_argument("--loop", action="store_true",
+                            help="keep running, once every --interval seconds")
+        parser.add_argument("--interval", type=float, default=3600,
+                            help="seconds between runs with --loop (default: 3600)")
+
+    def handle(self, *args, **opts):
+        try:
+            while True:
+                started = time.monotonic()
+                summary = apply_retention(opts["retention_days"])
+                self.report(summary, time.monotonic() - started)
+                if not opts["loop"]:
+                    break
+                time.sleep(opts["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped")
+
+    def report(self, summary, elapsed):
+        if summary["partitioned"]:
+            for day in summary["created"]:
+                self.stdout.write(f"  created partition for {day}")
+            for day in summary["dropped"]:
+                self.stdout.write(f"  dropped partition for {day}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Retention done in {elapsed:.1f}s: {len(summary['dropped'])} partitions dropped, "
+            f"{summary['deleted']} logs and {summary['flows_deleted']} flows deleted"
+        ))
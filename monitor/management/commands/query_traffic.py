@@ -0,0 +1,44 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from monitor.archive import DB_FIELDS, TIME_GROUPS, traffic_count, traffic_totals
+from monitor.models import Protocol
+
+
+def parse_time(value):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Not an ISO date/time: {value!r}")
+
+
+class Command(BaseCommand):
+    help = "Count or group stored traffic across the database and the log archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", type=parse_time, help="ISO date/time (inclusive)")
+        parser.add_argument("--until", type=parse_time, help="ISO date/time (exclusive)")
+        parser.add_argument("--src", help="only this source IP")
+        parser.add_argument("--dst", help="only this destination IP")
+        parser.add_argument("--protocol", type=int, help="only this protocol number (6 = TCP)")
+        parser.add_argument("--group-by", choices=[*DB_FIELDS, *TIME_GROUPS],
+                            help="group by a column or a time unit instead of just counting")
+        parser.add_argument("--limit", type=int, default=20)
+
+    def handle(self, *args, **opts):
+        filters = {"src": opts["src"], "dst": opts["dst"], "protocol": opts["protocol"]}
+        started = time.perf_counter()
+        if not opts["group_by"]:
+            totals = traffic_count(opts["since"], opts["until"], **filters)
+            self.stdout.write(f"{totals['rows']} logs, {totals['packets']} packets, {totals['bytes']} bytes")
+        else:
+            rows = traffic_totals(opts["group_by"], opts["since"], opts["until"], limit=opts["limit"], **filters)
+            for row in rows:
+                item = row["item"]
+                if opts["group_by"] == "protocol" and item in Protocol.values:
+                    item = Protocol(item).label
+                self.stdout.write(f"  {str(item):<26} {row['rows']:>10} logs {row['packets']:>10} pkts "
+                                  f"{row['bytes']:>14} bytes")
+        self.stdout.write(f"({1000 * (time.perf_counter() - started):.1f} ms)")
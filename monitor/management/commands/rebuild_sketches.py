@@ -0,0 +1,41 @@
+import time
+from itertools import chain
+
+from django.core.management.base import BaseCommand
+
+from monitor.archive import archive_rows
+from monitor.models import NetworkLog, TrafficSketch
+from monitor.sketches import SketchRecorder
+
+
+class Command(BaseCommand):
+    help = "Rebuild the dashboard traffic sketches from the stored NetworkLog rows and the log archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=20000,
+                            help="rows read per query and merged per flush (default: 20000)")
+
+    def handle(self, *args, **opts):
+        chunk = opts["chunk_size"]
+        started = time.monotonic()
+
+        deleted, _ = TrafficSketch.objects.all().delete()
+        self.stdout.write(f"Deleted {deleted} sketch rows")
+
+        recorder = SketchRecorder()
+        rows = NetworkLog.objects.order_by("id").values_list(
+            "timestamp", "source_ip", "bytes_transferred", "packets"
+        )
+        archived = ((log.timestamp, log.source_ip, log.bytes_transferred, log.packets) for log in archive_rows())
+        count = 0
+        for when, src, size, packets in chain(archived, rows.iterator(chunk_size=chunk)):
+            recorder.add(when, src, size, packets)
+            count += 1
+            if count % chunk == 0:
+                recorder.flush()
+        recorder.flush()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Recorded {count} rows into {TrafficSketch.objects.count()} sketch rows in {elapsed:.1f}s"
+        ))
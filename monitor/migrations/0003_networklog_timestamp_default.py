@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0002_alter_alert_severity'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='networklog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0003_networklog_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Flow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_seen', models.DateTimeField()),
+                ('last_seen', models.DateTimeField(db_index=True)),
+                ('source_ip', models.CharField(max_length=50)),
+                ('destination_ip', models.CharField(max_length=50)),
+                ('source_port', models.PositiveIntegerField(blank=True, null=True)),
+                ('destination_port', models.PositiveIntegerField(blank=True, null=True)),
+                ('protocol', models.CharField(max_length=20)),
+                ('packets', models.PositiveIntegerField(default=1)),
+                ('bytes_transferred', models.BigIntegerField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0004_flow'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='networklog',
+            name='packets',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
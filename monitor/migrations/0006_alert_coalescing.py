@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:55
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_seen(apps, schema_editor):
+    Alert = apps.get_model("monitor", "Alert")
+    Alert.objects.update(first_seen=F("timestamp"), last_seen=F("timestamp"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0005_networklog_packets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alert',
+            name='count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='first_seen',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='ip',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='kind',
+            field=models.CharField(blank=True, default='', max_length=30),
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='last_seen',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_seen, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['kind', 'ip', 'last_seen'], name='monitor_ale_kind_9edd1b_idx'),
+        ),
+    ]
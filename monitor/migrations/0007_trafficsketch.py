@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0006_alert_coalescing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrafficSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(max_length=10)),
+                ('bucket', models.DateTimeField()),
+                ('packets', models.BigIntegerField(default=0)),
+                ('bytes_transferred', models.BigIntegerField(default=0)),
+                ('talkers', models.JSONField(default=dict)),
+                ('sources', models.BinaryField()),
+            ],
+            options={
+                'unique_together': {('resolution', 'bucket')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0008_detectorstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrafficRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.PositiveIntegerField()),
+                ('bucket', models.DateTimeField()),
+                ('dimension', models.CharField(max_length=10)),
+                ('item', models.CharField(blank=True, default='', max_length=50)),
+                ('packets', models.BigIntegerField(default=0)),
+                ('bytes_transferred', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dimension', 'bucket'], name='monitor_tra_dimensi_4a9a65_idx')],
+                'constraints': [models.UniqueConstraint(fields=('resolution', 'bucket', 'dimension', 'item'), name='monitor_rollup_unique_bucket')],
+            },
+        ),
+    ]
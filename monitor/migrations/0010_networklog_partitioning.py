@@ -0,0 +1,71 @@
+# Turns monitor_networklog into a table partitioned by day on PostgreSQL.
+# Other databases have no native partitioning and are left unchanged
+# (retention falls back to chunked deletes, see monitor/partitions.py).
+#
+# Only the days that already hold rows get a partition here, so the schema
+# does not depend on the day the migration runs. Today's and the coming
+# days' partitions are created by the log writer when it starts (and hourly)
+# and by manage_partitions, both through partitions.ensure_partitions().
+
+from datetime import timedelta
+
+from django.db import migrations
+
+TABLE = "monitor_networklog"
+
+
+def partition(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {TABLE}_old")
+        cursor.execute(f"ALTER TABLE {TABLE}_old RENAME CONSTRAINT {TABLE}_pkey TO {TABLE}_old_pkey")
+        cursor.execute(
+            f"CREATE TABLE {TABLE} (LIKE {TABLE}_old INCLUDING DEFAULTS INCLUDING IDENTITY) "
+            f"PARTITION BY RANGE (timestamp)"
+        )
+        # The partition key has to be part of the primary key
+        cursor.execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id, timestamp)")
+        cursor.execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+
+        cursor.execute(f"SELECT MIN(timestamp)::date, MAX(timestamp)::date FROM {TABLE}_old")
+        day, last = cursor.fetchone()
+        while day is not None and day <= last:
+            cursor.execute(
+                f"CREATE TABLE {TABLE}_p{day:%Y%m%d} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)",
+                [day, day + timedelta(days=1)],
+            )
+            day += timedelta(days=1)
+
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {TABLE}_old")
+        cursor.execute(f"DROP TABLE {TABLE}_old")
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {TABLE}"
+        )
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {TABLE}_parted")
+        cursor.execute(f"CREATE TABLE {TABLE} (LIKE {TABLE}_parted INCLUDING DEFAULTS INCLUDING IDENTITY)")
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {TABLE}_parted")
+        cursor.execute(f"DROP TABLE {TABLE}_parted")
+        cursor.execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id)")
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {TABLE}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    atomic = True
+
+    dependencies = [
+        ('monitor', '0009_trafficrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
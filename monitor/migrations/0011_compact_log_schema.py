@@ -0,0 +1,161 @@
+# Stores NetworkLog/Flow addresses as packed bytes and protocols as numbers,
+# and indexes NetworkLog on (timestamp) and (source_ip, timestamp).
+#
+# The new columns are added next to the old ones and filled CHUNK_SIZE rows
+# at a time, each chunk in its own transaction, before the old columns are
+# dropped. The migration is therefore not atomic as a whole.
+
+import ipaddress
+
+from django.db import migrations, models, transaction
+
+import monitor.fields
+
+CHUNK_SIZE = 5000
+PROTOCOL_NAMES = {"ICMP": 1, "TCP": 6, "UDP": 17, "ICMPV6": 58}
+
+
+def _pack(value):
+    try:
+        return ipaddress.ip_address((value or "").strip()).packed
+    except ValueError:
+        return ipaddress.IPv4Address(0).packed  # unparseable: stored as 0.0.0.0
+
+
+def _protocol(value):
+    value = (value or "").strip().upper()
+    if value.isdigit():
+        return int(value)
+    return PROTOCOL_NAMES.get(value, 0)
+
+
+def convert_rows(model_name):
+    def convert(apps, schema_editor):
+        model = apps.get_model("monitor", model_name)
+        connection = schema_editor.connection
+        qn = connection.ops.quote_name
+        packed = model._meta.get_field("packed_source_ip")
+        sql = (
+            f"UPDATE {qn(model._meta.db_table)} SET packed_source_ip = %s, "
+            f"packed_destination_ip = %s, protocol_number = %s WHERE id = %s"
+        )
+        last_id = 0
+        while True:
+            rows = list(
+                model.objects.filter(id__gt=last_id).order_by("id")
+                .values_list("id", "source_ip", "destination_ip", "protocol")[:CHUNK_SIZE]
+            )
+            if not rows:
+                break
+            params = [
+                (packed.get_db_prep_value(_pack(src), connection),
+                 packed.get_db_prep_value(_pack(dst), connection),
+                 _protocol(protocol), pk)
+                for pk, src, dst, protocol in rows
+            ]
+            with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                cursor.executemany(sql, params)
+            last_id = rows[-1][0]
+    return convert
+
+
+def restore_rows(model_name):
+    def restore(apps, schema_editor):
+        model = apps.get_model("monitor", model_name)
+        last_id = 0
+        while True:
+            rows = list(
+                model.objects.filter(id__gt=last_id).order_by("id")
+                .values_list("id", "packed_source_ip", "packed_destination_ip", "protocol_number")[:CHUNK_SIZE]
+            )
+            if not rows:
+                break
+            with transaction.atomic(using=schema_editor.connection.alias):
+                for pk, src, dst, protocol in rows:
+                    model.objects.filter(id=pk).update(source_ip=src, destination_ip=dst, protocol=str(protocol))
+            last_id = rows[-1][0]
+    return restore
+
+
+def compact_operations(model_name):
+    return [
+        migrations.AddField(
+            model_name=model_name,
+            name='packed_source_ip',
+            field=monitor.fields.PackedIPField(null=True),
+        ),
+        migrations.AddField(
+            model_name=model_name,
+            name='packed_destination_ip',
+            field=monitor.fields.PackedIPField(null=True),
+        ),
+        migrations.AddField(
+            model_name=model_name,
+            name='protocol_number',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        # The old columns become nullable so that the reverse can re-add them
+        migrations.AlterField(
+            model_name=model_name,
+            name='source_ip',
+            field=models.CharField(max_length=50, null=True),
+        ),
+        migrations.AlterField(
+            model_name=model_name,
+            name='destination_ip',
+            field=models.CharField(max_length=50, null=True),
+        ),
+        migrations.AlterField(
+            model_name=model_name,
+            name='protocol',
+            field=models.CharField(max_length=20, null=True),
+        ),
+        migrations.RunPython(convert_rows(model_name), restore_rows(model_name)),
+        migrations.RemoveField(model_name=model_name, name='source_ip'),
+        migrations.RemoveField(model_name=model_name, name='destination_ip'),
+        migrations.RemoveField(model_name=model_name, name='protocol'),
+        migrations.RenameField(model_name=model_name, old_name='packed_source_ip', new_name='source_ip'),
+        migrations.RenameField(model_name=model_name, old_name='packed_destination_ip', new_name='destination_ip'),
+        migrations.RenameField(model_name=model_name, old_name='protocol_number', new_name='protocol'),
+        migrations.AlterField(
+            model_name=model_name,
+            name='source_ip',
+            field=monitor.fields.PackedIPField(),
+        ),
+        migrations.AlterField(
+            model_name=model_name,
+            name='destination_ip',
+            field=monitor.fields.PackedIPField(),
+        ),
+        migrations.AlterField(
+            model_name=model_name,
+            name='protocol',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'ICMP'), (6, 'TCP'), (17, 'UDP'), (58, 'ICMPv6')]),
+        ),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('monitor', '0010_networklog_partitioning'),
+    ]
+
+    operations = [
+        *compact_operations('networklog'),
+        *compact_operations('flow'),
+        migrations.AddIndex(
+            model_name='networklog',
+            index=models.Index(fields=['timestamp'], name='monitor_log_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='networklog',
+            index=models.Index(fields=['source_ip', 'timestamp'], name='monitor_log_src_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flow',
+            index=models.Index(fields=['source_ip', 'last_seen'], name='monitor_flow_src_seen_idx'),
+        ),
+    ]
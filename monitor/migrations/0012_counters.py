@@ -0,0 +1,68 @@
+# Maintained counters (monitor/counters.py) and the known-hosts table
+# behind the distinct-hosts counter, filled from the current tables once.
+# Hosts that only exist in the log archive are added by
+# ``manage.py rebuild_counters``.
+
+import monitor.fields
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+CHUNK_SIZE = 5000
+
+
+def fill_counters(apps, schema_editor):
+    Counter = apps.get_model("monitor", "Counter")
+    KnownHost = apps.get_model("monitor", "KnownHost")
+    Alert = apps.get_model("monitor", "Alert")
+    ThreatIP = apps.get_model("threatintel", "ThreatIP")
+
+    totals = {}
+    for model_name in ("networklog", "flow"):
+        model = apps.get_model("monitor", model_name)
+        totals[f"rows:{model_name}"] = model.objects.count()
+        hosts = list(model.objects.values_list("source_ip", flat=True).distinct())
+        for start in range(0, len(hosts), CHUNK_SIZE):
+            KnownHost.objects.bulk_create([KnownHost(ip=ip) for ip in hosts[start:start + CHUNK_SIZE]],
+                                          ignore_conflicts=True)
+    totals["hosts"] = KnownHost.objects.count()
+    totals["threat_ips"] = ThreatIP.objects.count()
+
+    alerts = Alert.objects.aggregate(
+        total=Count("id"),
+        reviewed=Count("id", filter=Q(reviewed=True)),
+        **{severity.lower(): Count("id", filter=Q(severity=severity)) for severity in ("Low", "Medium", "High")},
+    )
+    totals["alerts"] = alerts["total"]
+    totals["alerts:reviewed"] = alerts["reviewed"]
+    for severity in ("low", "medium", "high"):
+        totals[f"alerts:{severity}"] = alerts[severity]
+
+    Counter.objects.bulk_create([Counter(name=name, value=value) for name, value in totals.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0011_compact_log_schema'),
+        ('threatintel', '0003_threatip_ip_network'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Counter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='KnownHost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ip', monitor.fields.PackedIPField(max_length=16, unique=True)),
+                ('first_seen', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
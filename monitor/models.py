@@ -1,17 +1,118 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+
+from monitor.fields import PackedIPField
+
+
+class Protocol(models.IntegerChoices):
+    """IP protocol numbers; other numbers are stored as-is."""
+    ICMP = 1, "ICMP"
+    TCP = 6, "TCP"
+    UDP = 17, "UDP"
+    ICMPV6 = 58, "ICMPv6"
+
 
 class NetworkLog(models.Model):
-    timestamp = models.DateTimeField(auto_now_add=True)
-    source_ip = models.CharField(max_length=50)
-    destination_ip = models.CharField(max_length=50)
-    protocol = models.CharField(max_length=20)
+    # Set by the capture process, not on insert: rows are written in batches.
+    timestamp = models.DateTimeField(default=timezone.now)
+    source_ip = PackedIPField()
+    destination_ip = PackedIPField()
+    protocol = models.PositiveSmallIntegerField(choices=Protocol.choices)
     bytes_transferred = models.IntegerField()
+    # Packets this row stands for: 1, or the sampling rate when the capture
+    # profile samples (bytes_transferred is scaled the same way)
+    packets = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["timestamp"], name="monitor_log_ts_idx"),
+            models.Index(fields=["source_ip", "timestamp"], name="monitor_log_src_ts_idx"),
+        ]
 
     def __str__(self):
         return f"{self.source_ip} -> {self.destination_ip}"
 
 
+class Flow(models.Model):
+    """A 5-tuple flow, written by the capture process when it closes."""
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField(db_index=True)
+    source_ip = PackedIPField()
+    destination_ip = PackedIPField()
+    source_port = models.PositiveIntegerField(null=True, blank=True)
+    destination_port = models.PositiveIntegerField(null=True, blank=True)
+    protocol = models.PositiveSmallIntegerField(choices=Protocol.choices)
+    packets = models.PositiveIntegerField(default=1)
+    bytes_transferred = models.BigIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=["source_ip", "last_seen"], name="monitor_flow_src_seen_idx")]
+
+    @property
+    def timestamp(self):
+        return self.last_seen
+
+    def __str__(self):
+        return f"{self.source_ip}:{self.source_port} -> {self.destination_ip}:{self.destination_port}"
+
+
+class TrafficSketch(models.Model):
+    """
+    Mergeable traffic summary for one minute, one hour, or all time
+    (top talkers by bytes and a distinct-source estimate; see monitor/sketches.py).
+    """
+    resolution = models.CharField(max_length=10)
+    bucket = models.DateTimeField()
+    packets = models.BigIntegerField(default=0)
+    bytes_transferred = models.BigIntegerField(default=0)
+    talkers = models.JSONField(default=dict)  # SpaceSaving top-K
+    sources = models.BinaryField()           # HyperLogLog registers
+
+    class Meta:
+        unique_together = [("resolution", "bucket")]
+
+    def __str__(self):
+        return f"{self.resolution} {self.bucket}"
+
+
+class TrafficRollup(models.Model):
+    """
+    Packets/bytes in one time bucket (1 s, 1 min or 1 h), overall or for one
+    source IP, destination IP or protocol (see monitor/rollups.py).
+    """
+    resolution = models.PositiveIntegerField()   # bucket length in seconds
+    bucket = models.DateTimeField()
+    dimension = models.CharField(max_length=10)  # total / src / dst / proto
+    item = models.CharField(max_length=50, blank=True, default="")
+    packets = models.BigIntegerField(default=0)
+    bytes_transferred = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["resolution", "bucket", "dimension", "item"],
+                                    name="monitor_rollup_unique_bucket"),
+        ]
+        indexes = [models.Index(fields=["dimension", "bucket"])]
+
+    def __str__(self):
+        return f"{self.dimension}:{self.item} {self.bucket} ({self.resolution}s)"
+
+
+class DetectorState(models.Model):
+    """Watermark and window state of one detection rule (run_detection)."""
+    name = models.CharField(max_length=30, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    last_timestamp = models.DateTimeField(null=True, blank=True)
+    state = models.JSONField(default=dict)
+    last_run_ms = models.FloatField(default=0)
+    last_rows = models.PositiveIntegerField(default=0)
+    runs = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_id}"
+
+
 class Alert(models.Model):
     SEVERITY_CHOICES = [
         ("Low", "Low"),
@@ -23,6 +124,38 @@ class Alert(models.Model):
     message = models.CharField(max_length=200)
     severity = models.CharField(max_length=20, choices=SEVERITY_CHOICES, default="Low")
     reviewed = models.BooleanField(default=False)
+    # Repeats of the same (kind, ip) are coalesced into one row (monitor/alerts.py)
+    kind = models.CharField(max_length=30, blank=True, default="")
+    ip = models.CharField(max_length=50, blank=True, default="")
+    count = models.PositiveIntegerField(default=1)
+    first_seen = models.DateTimeField(default=timezone.now)
+    last_seen = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["kind", "ip", "last_seen"])]
+
+    def save(self, *args, **kwargs):
+        # The post_save counter update (monitor/signals.py) commits or rolls back with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"[{self.severity}] {self.message}"
+
+
+class Counter(models.Model):
+    """An exact running total, kept current by the writers (monitor/counters.py)."""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+class KnownHost(models.Model):
+    """Every source address ever ingested, behind the distinct-hosts counter."""
+    ip = PackedIPField(unique=True)
+    first_seen = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.ip
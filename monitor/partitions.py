@@ -0,0 +1,159 @@
+"""
+Day partitions and retention for NetworkLog.
+
+Partitioning is PostgreSQL only. There, monitor_networklog is a native
+RANGE-partitioned table (see migration 0010) with one partition per day
+and a DEFAULT partition as a safety net. Queries go through the parent
+table, so the ORM never sees the partitions. Retention detaches and drops
+whole days. That is a metadata operation, so the capture process is never
+blocked behind a long DELETE. The log writer creates today's and the
+coming MONITOR_PARTITION_PREMAKE_DAYS partitions when it starts and then
+hourly (rollups.RollupWriter), and manage_partitions does too. So a
+capture that runs past midnight never fills DEFAULT.
+
+SQLite has no partitioning, and this module does not emulate it with
+per-day tables: every reader (ORM queries, the archive, reports) would
+have to union them. There, retention deletes expired rows in small
+id-ordered chunks with a pause between them, so every write lock is held
+only briefly. To keep SQLite small without large deletes, archive logs
+first (manage.py archive_logs, monitor/archive.py) and delete whatever
+is left.
+
+Run ``manage.py manage_partitions`` (once a day, or with --loop) next to the
+capture process; the sniffer itself never deletes anything.
+"""
+import re
+import time
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from monitor import counters
+from monitor.models import NetworkLog, Flow
+
+
+RETENTION_DAYS = getattr(settings, "MONITOR_LOG_RETENTION_DAYS", 30)  # None keeps everything
+PREMAKE_DAYS = getattr(settings, "MONITOR_PARTITION_PREMAKE_DAYS", 3)
+DELETE_CHUNK = getattr(settings, "MONITOR_RETENTION_CHUNK", 5000)
+DELETE_PAUSE = getattr(settings, "MONITOR_RETENTION_PAUSE", 0.05)  # seconds between chunks
+
+TABLE = NetworkLog._meta.db_table
+_PARTITION_NAME = re.compile(rf"^{TABLE}_p(\d{{8}})$")
+
+
+def partitioned():
+    return connection.vendor == "postgresql"
+
+
+def partition_name(day):
+    return f"{TABLE}_p{day:%Y%m%d}"
+
+
+def _day_bounds(day):
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=1)
+
+
+# ------------------ PostgreSQL ------------------
+def list_partitions():
+    """{day: table name} of the existing day partitions."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    days = {}
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            days[datetime.strptime(match.group(1), "%Y%m%d").date()] = name
+    return days
+
+
+def create_partition(day):
+    """Create the partition for ``day``; False if the DEFAULT partition already holds rows for it."""
+    start, end = _day_bounds(day)
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT 1 FROM {qn(TABLE + '_default')} WHERE timestamp >= %s AND timestamp < %s LIMIT 1",
+                       [start, end])
+        if cursor.fetchone():
+            return False
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {qn(partition_name(day))} PARTITION OF {qn(TABLE)} "
+            f"FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+    return True
+
+
+def ensure_partitions(today=None, days=PREMAKE_DAYS):
+    """Make sure today's and the next ``days`` partitions exist; returns the days created."""
+    today = today or date.today()
+    existing = list_partitions()
+    created = []
+    for offset in range(days + 1):
+        day = today + timedelta(days=offset)
+        if day not in existing and create_partition(day):
+            created.append(day)
+    return created
+
+
+def drop_partitions(before):
+    """Detach and drop every day partition older than ``before``; returns the days dropped."""
+    qn = connection.ops.quote_name
+    dropped = []
+    for day, name in sorted(list_partitions().items()):
+        if day >= before:
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {qn(TABLE)} DETACH PARTITION {qn(name)}")
+            cursor.execute(f"SELECT count(*) FROM {qn(name)}")
+            counters.rows_deleted(NetworkLog, cursor.fetchone()[0])
+            cursor.execute(f"DROP TABLE {qn(name)}")
+        dropped.append(day)
+    return dropped
+
+
+# ------------------ everywhere ------------------
+def delete_chunked(model, field, cutoff, chunk=DELETE_CHUNK, pause=DELETE_PAUSE):
+    """Delete rows with ``field`` < cutoff a chunk at a time; returns the number deleted."""
+    deleted = 0
+    while True:
+        ids = list(model.objects.filter(**{f"{field}__lt": cutoff}).order_by("id").values_list("id", flat=True)[:chunk])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            chunk_deleted = model.objects.filter(id__in=ids).delete()[0]
+            counters.rows_deleted(model, chunk_deleted)
+        deleted += chunk_deleted
+        if pause:
+            time.sleep(pause)
+
+
+def apply_retention(retention_days=RETENTION_DAYS, today=None):
+    """
+    Drop (PostgreSQL) or delete (elsewhere) logs older than the retention
+    period, and premake the coming days' partitions. Returns a summary dict.
+    """
+    today = today or date.today()
+    summary = {"partitioned": partitioned(), "created": [], "dropped": [], "deleted": 0, "flows_deleted": 0}
+    if summary["partitioned"]:
+        summary["created"] = ensure_partitions(today)
+    if not retention_days:
+        return summary
+
+    cutoff_day = today - timedelta(days=retention_days)
+    cutoff = datetime.combine(cutoff_day, datetime.min.time())
+    if summary["partitioned"]:
+        summary["dropped"] = drop_partitions(cutoff_day)
+    # Without partitions this is the whole job; with them it only finds rows
+    # that landed in DEFAULT while their day had no partition
+    summary["deleted"] = delete_chunked(NetworkLog, "timestamp", cutoff)
+    summary["flows_deleted"] = delete_chunked(Flow, "last_seen", cutoff)
+    return summary
@@ -0,0 +1,176 @@
+"""
+Streaming reader for pcap and pcapng capture files.
+
+Frames are yielded one at a time straight from the file, so memory use does
+not depend on the size of the capture. Gzip-compressed captures (*.gz) are
+read transparently.
+"""
+import gzip
+import struct
+from collections import namedtuple
+
+
+Frame = namedtuple("Frame", "timestamp linktype data wirelen")
+
+# pcap magic numbers -> (byte order, timestamp fraction divisor)
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e9),
+}
+PCAPNG_SHB = b"\x0a\x0d\x0d\x0a"
+
+# pcapng block types
+BLOCK_IDB = 1
+BLOCK_OPB = 2  # obsolete packet block
+BLOCK_SPB = 3
+BLOCK_EPB = 6
+BLOCK_SHB = 0x0A0D0D0A
+
+OPT_IF_TSRESOL = 9
+
+
+class PcapFormatError(ValueError):
+    pass
+
+
+def open_capture(path):
+    """
+    (stream, raw) for a capture path. ``raw.tell()`` is the position in the
+    file on disk, which is what progress reporting wants for gzip input.
+    """
+    raw = open(path, "rb", buffering=1024 * 1024)
+    if str(path).endswith(".gz"):
+        return gzip.GzipFile(fileobj=raw, mode="rb"), raw
+    return raw, raw
+
+
+def read_frames(source):
+    """Yield every Frame in a pcap or pcapng file (a path or binary stream)."""
+    if hasattr(source, "read"):
+        yield from _read_stream(source)
+        return
+    stream, raw = open_capture(source)
+    with raw, stream:
+        yield from _read_stream(stream)
+
+
+def _read_stream(f):
+    magic = f.read(4)
+    if magic == PCAPNG_SHB:
+        yield from _read_pcapng(f, magic)
+    elif magic in PCAP_MAGIC:
+        yield from _read_pcap(f, magic)
+    else:
+        raise PcapFormatError("not a pcap or pcapng file")
+
+
+# ------------------ pcap ------------------
+def _read_pcap(f, magic):
+    order, divisor = PCAP_MAGIC[magic]
+    header = f.read(20)
+    if len(header) < 20:
+        raise PcapFormatError("truncated pcap header")
+    linktype = struct.unpack(order + "HHiIII", header)[5] & 0x0FFFFFFF
+
+    record = struct.Struct(order + "IIII")
+    read = f.read
+    while True:
+        raw = read(16)
+        if len(raw) < 16:
+            return
+        sec, frac, incl_len, orig_len = record.unpack(raw)
+        data = read(incl_len)
+        if len(data) < incl_len:
+            return  # truncated final record
+        yield Frame(sec + frac / divisor, linktype, data, orig_len)
+
+
+# ------------------ pcapng ------------------
+def _read_pcapng(f, magic):
+    order = "<"
+    interfaces = []  # (linktype, snaplen, ticks per second) per IDB
+    last_ts = 0.0
+    read = f.read
+
+    while True:
+        head = magic if magic else read(4)
+        magic = None
+        if len(head) < 4:
+            return
+        rest = read(4)
+        if len(rest) < 4:
+            return
+
+        if head == PCAPNG_SHB:
+            # A new section can switch byte order; interface ids restart.
+            bom = read(4)
+            order = "<" if bom == b"\x4d\x3c\x2b\x1a" else ">"
+            total_len = struct.unpack(order + "I", rest)[0]
+            read(total_len - 12)
+            interfaces = []
+            continue
+
+        block_type = struct.unpack(order + "I", head)[0]
+        total_len = struct.unpack(order + "I", rest)[0]
+        if total_len < 12:
+            raise PcapFormatError("corrupt pcapng block length")
+        body = read(total_len - 8)
+        if len(body) < total_len - 8:
+            return
+        body = memoryview(body)[:-4]  # drop trailing length copy
+
+        if block_type == BLOCK_IDB:
+            if len(body) < 8:
+                raise PcapFormatError("corrupt pcapng interface block")
+            linktype, _, snaplen = struct.unpack_from(order + "HHI", body)
+            interfaces.append((linktype, snaplen, _tsresol(body[8:], order)))
+
+        elif block_type == BLOCK_EPB:
+            if len(body) < 20:
+                continue  # truncated block
+            iface, ts_high, ts_low, cap_len, orig_len = struct.unpack_from(order + "IIIII", body)
+            if iface >= len(interfaces):
+                continue  # no such interface: skip the packet, not the file
+            linktype, _, ticks = interfaces[iface]
+            last_ts = ((ts_high << 32) | ts_low) / ticks
+            yield Frame(last_ts, linktype, bytes(body[20:20 + cap_len]), orig_len)
+
+        elif block_type == BLOCK_OPB:
+            if len(body) < 20:
+                continue
+            iface, _, ts_high, ts_low, cap_len, orig_len = struct.unpack_from(order + "HHIIII", body)
+            if iface >= len(interfaces):
+                continue
+            linktype, _, ticks = interfaces[iface]
+            last_ts = ((ts_high << 32) | ts_low) / ticks
+            yield Frame(last_ts, linktype, bytes(body[20:20 + cap_len]), orig_len)
+
+        elif block_type == BLOCK_SPB:
+            # Simple packet blocks have no timestamp (reuse the last one seen)
+            # and always belong to interface 0
+            if len(body) < 4 or not interfaces:
+                continue
+            orig_len = struct.unpack_from(order + "I", body)[0]
+            linktype, snaplen, _ = interfaces[0]
+            cap_len = min(orig_len, snaplen) if snaplen else orig_len
+            yield Frame(last_ts, linktype, bytes(body[4:4 + cap_len]), orig_len)
+
+        # Name resolution, statistics and custom blocks are skipped.
+
+
+def _tsresol(options, order):
+    """Ticks per second from an IDB's if_tsresol option (default: microseconds)."""
+    offset = 0
+    while offset + 4 <= len(options):
+        code, length = struct.unpack_from(order + "HH", options, offset)
+        if code == 0:
+            break
+        if code == OPT_IF_TSRESOL and length >= 1:
+            value = options[offset + 4]
+            if value & 0x80:
+                return 2 ** (value & 0x7F)
+            return 10 ** value
+        offset += 4 + ((length + 3) & ~3)
+    return 10 ** 6
@@ -0,0 +1,198 @@
+import queue
+import threading
+import time
+import traceback
+
+from django.db import connection
+
+
+# Overflow policies for a saturated stage queue
+BLOCK = "block"              # wait for room (back-pressure on the producer)
+DROP_OLDEST = "drop_oldest"  # evict the oldest queued item to make room
+SAMPLE = "sample"            # above the high watermark admit only 1 in N items
+
+POLICIES = (BLOCK, DROP_OLDEST, SAMPLE)
+
+_STOP = object()
+
+LOGGED_ERRORS = 10  # per stage in Pipeline.process; a bad file must not flood the console
+
+
+class Stage:
+    """
+    One step of the capture pipeline: a bounded queue drained by a pool of
+    worker threads.
+
+    ``handler(item)`` returns the item to hand to the next stage, or None to
+    stop processing it. When the queue is full the stage applies its overflow
+    policy, so a slow downstream stage never blocks an upstream producer
+    unless the policy is ``block``.
+    """
+
+    def __init__(self, name, handler, workers=1, maxsize=10000, policy=BLOCK,
+                 sample_rate=10, high_watermark=0.8):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy!r} for stage {name!r}")
+
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.policy = policy
+        self.sample_rate = sample_rate
+        self.high_watermark = int(maxsize * high_watermark)
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.next = None
+
+        self._threads = []
+        self._lock = threading.Lock()
+        self._seen_while_saturated = 0
+
+        # Counters
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+
+    # ------------------ producer side ------------------
+    def put(self, item):
+        with self._lock:
+            self.received += 1
+
+        if self.policy == BLOCK:
+            self.queue.put(item)
+            return True
+
+        if self.policy == SAMPLE and self.queue.qsize() >= self.high_watermark:
+            with self._lock:
+                self._seen_while_saturated += 1
+                keep = self._seen_while_saturated % self.sample_rate == 0
+            if not keep:
+                self._drop()
+                return False
+        elif self._seen_while_saturated:
+            with self._lock:
+                self._seen_while_saturated = 0
+
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return True
+            except queue.Full:
+                if self.policy != DROP_OLDEST:
+                    self._drop()
+                    return False
+            try:
+                self.queue.get_nowait()
+                self._drop()
+            except queue.Empty:
+                pass
+
+    def _drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    # ------------------ workers ------------------
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        # One sentinel per worker, queued behind the remaining items.
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def _work(self):
+        try:
+            while True:
+                item = self.queue.get()
+                if item is _STOP:
+                    return
+                try:
+                    result = self.handler(item)
+                except Exception as e:
+                    with self._lock:
+                        self.errors += 1
+                    print(f"❌ Stage '{self.name}' error:", e)
+                    traceback.print_exc()
+                    continue
+
+                with self._lock:
+                    self.processed += 1
+                if result is not None and self.next is not None:
+                    self.next.put(result)
+        finally:
+            connection.close()
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+
+class Pipeline:
+    """Stages joined head to tail; ``submit()`` feeds the first stage."""
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        for upstream, downstream in zip(self.stages, self.stages[1:]):
+            upstream.next = downstream
+        self.started_at = None
+
+    def submit(self, item):
+        return self.stages[0].put(item)
+
+    def process(self, item):
+        """
+        Run one item through every handler in the caller's thread. An item
+        whose handler raises is counted as an error of that stage and
+        skipped, as in a stage's worker threads.
+        """
+        for stage in self.stages:
+            # Under the stage's lock: stats() may be read from another thread
+            with stage._lock:
+                stage.received += 1
+            try:
+                item = stage.handler(item)
+            except Exception as e:
+                with stage._lock:
+                    stage.errors += 1
+                    errors = stage.errors
+                if errors <= LOGGED_ERRORS:
+                    print(f"❌ Stage '{stage.name}' error:", e)
+                    traceback.print_exc()
+                elif errors == LOGGED_ERRORS + 1:
+                    print(f"❌ Stage '{stage.name}': more errors, see its error count")
+                return
+            with stage._lock:
+                stage.processed += 1
+            if item is None:
+                return
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        self.started_at = time.monotonic()
+        return self
+
+    def stop(self):
+        # Stop head first so every queued item drains into the next stage.
+        for stage in self.stages:
+            stage.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def stats(self):
+        return {stage.name: stage.stats() for stage in self.stages}
@@ -0,0 +1,272 @@
+"""
+Summary reports over a period of traffic (Reports page, ``manage.py build_report``).
+
+Logs are read a chunk of columns at a time, never as model instances:
+archived segments (monitor/archive.py) are already columnar, and database
+rows come through a raw cursor as plain tuples. Each chunk becomes NumPy
+arrays, and every section of the report is a vectorized group-by on them
+(np.bincount over integer codes). Addresses are mapped to report-wide
+integer codes on the way in, and only the winners are turned back into
+strings at the end.
+"""
+import ipaddress
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Sum
+
+from monitor import archive
+from monitor.models import Alert, NetworkLog, Protocol
+from monitor.sketches import SpaceSaving
+
+
+CHUNK_ROWS = getattr(settings, "MONITOR_REPORT_CHUNK_ROWS", 200000)
+TOP_N = 10
+# Conversations (source/destination pairs) can outnumber rows, so they go
+# through a Space-Saving summary: exact while there are at most this many,
+# overestimated by at most its floor otherwise
+CONVERSATION_K = 5000
+PERIODS = {"day": 1, "week": 7, "month": 30}
+
+
+class AddressCodes:
+    """Report-wide integer code per address, from packed bytes or strings."""
+
+    def __init__(self):
+        self.names = []
+        self._by_name = {}
+        self._by_packed = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def code(self, name):
+        code = self._by_name.get(name)
+        if code is None:
+            code = self._by_name[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def encode_packed(self, column):
+        """Codes for a column of packed addresses; only its distinct values are looked up."""
+        if len(column) and not isinstance(column[0], bytes):
+            column = [bytes(value) for value in column]  # memoryview (psycopg)
+        # Fixed-width bytes sort in C. NumPy drops trailing zero bytes, which
+        # would make 10.0.0.0 equal to a00::, so the family is part of the key
+        values, inverse = np.unique(np.array(column, dtype="S16"), return_inverse=True)
+        ipv6 = np.fromiter(map(len, column), dtype=np.int64, count=len(column)) == 16
+        keys, inverse = np.unique(inverse.reshape(-1) * 2 + ipv6, return_inverse=True)
+        by_packed = self._by_packed
+        codes = np.empty(len(keys), dtype=np.int64)
+        for i, key in enumerate(keys.tolist()):
+            packed = values[key >> 1].ljust(16 if key & 1 else 4, b"\x00")
+            code = by_packed.get(packed)
+            if code is None:
+                code = by_packed[packed] = self.code(str(ipaddress.ip_address(packed)))
+            codes[i] = code
+        return codes[inverse.reshape(-1)]
+
+    def remap(self, values):
+        """Codes for a segment's dictionary (its codes index into ``values``)."""
+        return np.array([self.code(str(value)) for value in values], dtype=np.int64)
+
+
+def raw_columns(queryset, chunk=CHUNK_ROWS):
+    """
+    Column tuples of a values_list() queryset, ``chunk`` rows at a time.
+    Raw values straight from the driver: no model or field conversion per row.
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        while rows := cursor.fetchmany(chunk):
+            yield tuple(zip(*rows))
+
+
+def _chunk_top(keys, counts, k):
+    """SpaceSaving of one chunk's exact per-key counts."""
+    if len(keys) <= k:
+        return SpaceSaving(k, dict(zip(keys.tolist(), counts.tolist())))
+    top = np.argpartition(counts, -(k + 1))[-(k + 1):]
+    top = top[np.argsort(counts[top])[::-1]]
+    return SpaceSaving(k, dict(zip(keys[top[:k]].tolist(), counts[top[:k]].tolist())), floor=int(counts[top[k]]))
+
+
+def _add(total, values):
+    """total += values, growing ``total`` to the length of ``values`` first."""
+    if len(total) < len(values):
+        total = np.concatenate([total, np.zeros(len(values) - len(total), dtype=total.dtype)])
+    total[:len(values)] += values
+    return total
+
+
+@dataclass
+class Report:
+    since: datetime
+    until: datetime
+    rows: int = 0
+    packets: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    daily: list = field(default_factory=list)          # [{"day", "packets", "bytes"}]
+    hourly: list = field(default_factory=list)         # 24 x {"hour", "packets", "bytes"}, hour of day
+    protocols: list = field(default_factory=list)      # [{"protocol", "packets", "bytes", "share"}]
+    top_sources: list = field(default_factory=list)    # [{"ip", "packets", "bytes"}]
+    top_destinations: list = field(default_factory=list)
+    conversations: list = field(default_factory=list)  # [{"src", "dst", "bytes"}]
+    conversation_error: int = 0                        # bytes a conversation may be overstated by
+    alerts: list = field(default_factory=list)         # [{"severity", "alerts", "occurrences"}]
+
+
+class ReportBuilder:
+    """Accumulates report sections one chunk of columns at a time."""
+
+    def __init__(self, since, until):
+        self.since = since
+        self.until = until
+        self.addresses = AddressCodes()
+        self.rows = 0
+        self.day0 = np.datetime64(since, "D")
+        last_day = np.datetime64(until - timedelta(microseconds=1), "D")
+        days = int((last_day - self.day0).astype(np.int64)) + 1
+        self.day_packets = np.zeros(days, dtype=np.int64)
+        self.day_bytes = np.zeros(days, dtype=np.int64)
+        self.hour_packets = np.zeros(24, dtype=np.int64)
+        self.hour_bytes = np.zeros(24, dtype=np.int64)
+        self.proto_packets = np.zeros(256, dtype=np.int64)
+        self.proto_bytes = np.zeros(256, dtype=np.int64)
+        self.src_packets = np.zeros(0, dtype=np.int64)
+        self.src_bytes = np.zeros(0, dtype=np.int64)
+        self.dst_packets = np.zeros(0, dtype=np.int64)
+        self.dst_bytes = np.zeros(0, dtype=np.int64)
+        self.pairs = SpaceSaving(CONVERSATION_K)
+
+    def add(self, ts, src, dst, protocol, sizes, packets):
+        """One chunk: timestamps (datetime64), address codes, protocol numbers, bytes, packets."""
+        if not len(ts):
+            return
+        self.rows += len(ts)
+        sizes = sizes.astype(np.int64, copy=False)
+        packets = packets.astype(np.int64, copy=False)
+
+        day = (ts.astype("datetime64[D]") - self.day0).astype(np.int64)
+        hour = ts.astype("datetime64[h]").astype(np.int64) % 24
+        for index, size, packet_total, byte_total in (
+            (day, len(self.day_packets), self.day_packets, self.day_bytes),
+            (hour, 24, self.hour_packets, self.hour_bytes),
+            (protocol.astype(np.int64), 256, self.proto_packets, self.proto_bytes),
+        ):
+            packet_total += np.bincount(index, weights=packets, minlength=size).astype(np.int64)
+            byte_total += np.bincount(index, weights=sizes, minlength=size).astype(np.int64)
+
+        self.src_packets = _add(self.src_packets, np.bincount(src, weights=packets).astype(np.int64))
+        self.src_bytes = _add(self.src_bytes, np.bincount(src, weights=sizes).astype(np.int64))
+        self.dst_packets = _add(self.dst_packets, np.bincount(dst, weights=packets).astype(np.int64))
+        self.dst_bytes = _add(self.dst_bytes, np.bincount(dst, weights=sizes).astype(np.int64))
+
+        pairs, index = np.unique((src << 32) | dst, return_inverse=True)
+        pair_bytes = np.bincount(index, weights=sizes).astype(np.int64)
+        self.pairs.merge(_chunk_top(pairs, pair_bytes, CONVERSATION_K))
+
+    # ------------------ sources ------------------
+    def add_archive(self):
+        for segment in archive.segments(self.since, self.until):
+            lo, hi = segment.bounds(self.since, self.until)
+            src_codes = self.addresses.remap(segment.values("src"))
+            dst_codes = self.addresses.remap(segment.values("dst"))
+            for start in range(lo, hi, CHUNK_ROWS):
+                end = min(start + CHUNK_ROWS, hi)
+                self.add(
+                    segment.column("timestamp")[start:end],
+                    src_codes[segment.column("src")[start:end]],
+                    dst_codes[segment.column("dst")[start:end]],
+                    segment.column("protocol")[start:end],
+                    segment.column("bytes")[start:end],
+                    segment.column("packets")[start:end],
+                )
+
+    def add_database(self):
+        logs = NetworkLog.objects.filter(timestamp__gte=self.since, timestamp__lt=self.until).values_list(
+            "timestamp", "source_ip", "destination_ip", "protocol", "bytes_transferred", "packets")
+        for ts, src, dst, protocol, sizes, packets in raw_columns(logs):
+            self.add(
+                np.array(ts, dtype="datetime64[us]"),
+                self.addresses.encode_packed(src),
+                self.addresses.encode_packed(dst),
+                np.array(protocol, dtype=np.int64),
+                np.array(sizes, dtype=np.int64),
+                np.array(packets, dtype=np.int64),
+            )
+
+    # ------------------ result ------------------
+    def _top(self, packets, sizes, n=TOP_N):
+        order = np.argsort(sizes)[::-1][:n]
+        return [{"ip": self.addresses.names[i], "packets": int(packets[i]), "bytes": int(sizes[i])}
+                for i in order if sizes[i] or packets[i]]
+
+    def result(self):
+        report = Report(since=self.since, until=self.until, rows=self.rows,
+                        packets=int(self.day_packets.sum()), bytes=int(self.day_bytes.sum()))
+        report.daily = [
+            {"day": (self.day0 + i).item(), "packets": int(self.day_packets[i]), "bytes": int(self.day_bytes[i])}
+            for i in range(len(self.day_packets))
+        ]
+        report.hourly = [
+            {"hour": hour, "packets": int(self.hour_packets[hour]), "bytes": int(self.hour_bytes[hour])}
+            for hour in range(24)
+        ]
+        for number in np.argsort(self.proto_bytes)[::-1].tolist():
+            if not self.proto_packets[number]:
+                continue
+            label = Protocol(number).label if number in Protocol.values else str(number)
+            report.protocols.append({
+                "protocol": label,
+                "packets": int(self.proto_packets[number]),
+                "bytes": int(self.proto_bytes[number]),
+                "share": 100 * int(self.proto_bytes[number]) / report.bytes if report.bytes else 0.0,
+            })
+        report.top_sources = self._top(self.src_packets, self.src_bytes)
+        report.top_destinations = self._top(self.dst_packets, self.dst_bytes)
+        names = self.addresses.names
+        report.conversations = [
+            {"src": names[pair >> 32], "dst": names[pair & 0xFFFFFFFF], "bytes": size}
+            for pair, size in self.pairs.top(TOP_N)
+        ]
+        report.conversation_error = self.pairs.floor
+        return report
+
+
+def alert_summary(since, until):
+    rows = (
+        Alert.objects.filter(last_seen__gte=since, first_seen__lt=until)
+        .values("severity")
+        .annotate(alerts=Count("id"), occurrences=Sum("count"))
+    )
+    counts = {row["severity"]: row for row in rows}
+    return [
+        {"severity": severity, "alerts": counts.get(severity, {}).get("alerts", 0),
+         "occurrences": counts.get(severity, {}).get("occurrences") or 0}
+        for severity, _ in reversed(Alert.SEVERITY_CHOICES)
+    ]
+
+
+def period_bounds(period="week", end=None):
+    """[since, until) covering the ``period`` days up to and including ``end`` (default: today)."""
+    end = end or datetime.now().date()
+    until = datetime.combine(end, datetime.min.time()) + timedelta(days=1)
+    return until - timedelta(days=PERIODS[period]), until
+
+
+def build_report(since, until):
+    started = time.perf_counter()
+    builder = ReportBuilder(since, until)
+    builder.add_archive()
+    builder.add_database()
+    report = builder.result()
+    report.alerts = alert_summary(since, until)
+    report.seconds = time.perf_counter() - started
+    return report
@@ -0,0 +1,212 @@
+"""
+Time-bucketed traffic rollups: packets and bytes per second, minute and
+hour, overall and per source IP, destination IP and protocol.
+
+Every batch of NetworkLog/Flow rows adds its 1-second rollups in the same
+transaction as the insert (RollupWriter). ``compact()`` later folds
+1-second rows older than KEEP[SECOND] into minute rows, and minute rows
+older than KEEP[MINUTE] into hour rows. At any time each packet is counted
+in exactly one resolution, so reads just sum whatever rows fall in the
+requested range.
+"""
+import math
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q, Sum
+
+from monitor import partitions, snapshot
+from monitor.ingest import BatchWriter
+from monitor.models import NetworkLog, TrafficRollup
+
+
+SECOND = 1
+MINUTE = 60
+HOUR = 3600
+RESOLUTIONS = (SECOND, MINUTE, HOUR)
+
+# Dimensions
+TOTAL = "total"
+SOURCE = "src"
+DESTINATION = "dst"
+PROTOCOL = "proto"
+DIMENSIONS = (TOTAL, SOURCE, DESTINATION, PROTOCOL)
+
+# How long rows stay at a resolution before compaction folds them into the next
+KEEP = {
+    SECOND: timedelta(seconds=getattr(settings, "MONITOR_ROLLUP_KEEP_SECONDS", 3600)),
+    MINUTE: timedelta(seconds=getattr(settings, "MONITOR_ROLLUP_KEEP_MINUTES", 2 * 86400)),
+}
+COMPACT_INTERVAL = getattr(settings, "MONITOR_ROLLUP_COMPACT_INTERVAL", 300)  # seconds
+PARTITION_CHECK_INTERVAL = 3600  # seconds between checks for the coming days' log partitions
+
+
+def truncate(when, resolution):
+    if resolution == SECOND:
+        return when.replace(microsecond=0)
+    if resolution == MINUTE:
+        return when.replace(second=0, microsecond=0)
+    return when.replace(minute=0, second=0, microsecond=0)
+
+
+# ------------------ writing ------------------
+def aggregate(rows, resolution=SECOND):
+    """{(resolution, bucket, dimension, item): [packets, bytes]} for NetworkLog/Flow rows."""
+    deltas = defaultdict(lambda: [0, 0])
+    for row in rows:
+        bucket = truncate(row.timestamp, resolution)
+        packets = row.packets
+        size = row.bytes_transferred
+        for dimension, item in ((TOTAL, ""), (SOURCE, row.source_ip),
+                                (DESTINATION, row.destination_ip), (PROTOCOL, str(row.protocol))):
+            delta = deltas[(resolution, bucket, dimension, item)]
+            delta[0] += packets
+            delta[1] += size
+    return deltas
+
+
+def upsert(deltas):
+    """Add packet/byte deltas to their rollup rows, creating rows as needed."""
+    if not deltas:
+        return
+    if connection.vendor in ("sqlite", "postgresql"):
+        table = connection.ops.quote_name(TrafficRollup._meta.db_table)
+        bucket_field = TrafficRollup._meta.get_field("bucket")
+        sql = (
+            f"INSERT INTO {table} (resolution, bucket, dimension, item, packets, bytes_transferred) "
+            f"VALUES (%s, %s, %s, %s, %s, %s) "
+            f"ON CONFLICT (resolution, bucket, dimension, item) DO UPDATE SET "
+            f"packets = {table}.packets + excluded.packets, "
+            f"bytes_transferred = {table}.bytes_transferred + excluded.bytes_transferred"
+        )
+        params = [
+            (resolution, bucket_field.get_db_prep_value(bucket, connection), dimension, item, packets, size)
+            for (resolution, bucket, dimension, item), (packets, size) in deltas.items()
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+        return
+
+    # Other backends: update, then create what was missing
+    for (resolution, bucket, dimension, item), (packets, size) in deltas.items():
+        updated = TrafficRollup.objects.filter(
+            resolution=resolution, bucket=bucket, dimension=dimension, item=item,
+        ).update(packets=F("packets") + packets, bytes_transferred=F("bytes_transferred") + size)
+        if not updated:
+            TrafficRollup.objects.create(resolution=resolution, bucket=bucket, dimension=dimension,
+                                         item=item, packets=packets, bytes_transferred=size)
+
+
+class RollupWriter(BatchWriter):
+    """BatchWriter that also maintains the 1-second rollups, and compacts them now and then."""
+
+    def __init__(self, *args, compact_interval=COMPACT_INTERVAL, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.compact_interval = compact_interval
+        self._next_compact = time.monotonic() + compact_interval
+        self._next_partitions = 0.0
+        self.compactions = 0
+
+    def start(self):
+        # Today's partition has to exist before the first insert, or the day's
+        # rows land in DEFAULT and the partition can no longer be created
+        self._keep_partitions()
+        return super().start()
+
+    def _keep_partitions(self):
+        """PostgreSQL: create the coming days' NetworkLog partitions (monitor/partitions.py)."""
+        self._next_partitions = time.monotonic() + PARTITION_CHECK_INTERVAL
+        if self.model is not NetworkLog or not partitions.partitioned():
+            return
+        try:
+            partitions.ensure_partitions()
+        except Exception as e:
+            print("⚠ Could not create the coming days' log partitions:", e)
+
+    def write(self, batch):
+        super().write(batch)
+        upsert(aggregate(batch))
+
+    def flush(self):
+        written = super().flush()
+        if written:
+            snapshot.mark_changed()
+        # Compact on the timer thread only, never on the persist stage's
+        on_timer = threading.current_thread() is self._timer
+        if on_timer and time.monotonic() >= self._next_partitions:
+            self._keep_partitions()
+        if (self.compact_interval and on_timer
+                and time.monotonic() >= self._next_compact):
+            self._next_compact = time.monotonic() + self.compact_interval
+            try:
+                compact()
+                self.compactions += 1
+            except Exception as e:
+                print("⚠ Rollup compaction failed:", e)
+        return written
+
+    def stats(self):
+        return {**super().stats(), "compactions": self.compactions}
+
+
+def compact(now=None):
+    """Fold 1s rows into minutes and minute rows into hours once they are past KEEP."""
+    now = now or datetime.now()
+    folded = {}
+    for fine, coarse in ((SECOND, MINUTE), (MINUTE, HOUR)):
+        cutoff = truncate(now - KEEP[fine], coarse)
+        with transaction.atomic():
+            old = TrafficRollup.objects.filter(resolution=fine, bucket__lt=cutoff)
+            deltas = defaultdict(lambda: [0, 0])
+            for bucket, dimension, item, packets, size in old.values_list(
+                "bucket", "dimension", "item", "packets", "bytes_transferred"
+            ).iterator(chunk_size=10000):
+                delta = deltas[(coarse, truncate(bucket, coarse), dimension, item)]
+                delta[0] += packets
+                delta[1] += size
+            upsert(deltas)
+            folded[fine], _ = old.delete()
+    return folded
+
+
+# ------------------ reading ------------------
+def series(since, until=None, step=MINUTE, dimension=TOTAL, item=""):
+    """[(bucket start, packets, bytes)] every ``step`` seconds over [since, until)."""
+    until = until or datetime.now()
+    start = truncate(since, MINUTE if step >= MINUTE else SECOND)
+    rows = TrafficRollup.objects.filter(
+        dimension=dimension, item=item, bucket__gte=start - timedelta(hours=1), bucket__lt=until,
+    ).values_list("bucket", "resolution", "packets", "bytes_transferred")
+
+    count = max(0, math.ceil((until - start).total_seconds() / step))
+    points = [[start + timedelta(seconds=i * step), 0, 0] for i in range(count)]
+    for bucket, resolution, packets, size in rows:
+        # A coarse row that started before ``since`` still overlaps it
+        if bucket + timedelta(seconds=resolution) <= start:
+            continue
+        index = max(0, int((bucket - start).total_seconds() // step))
+        if index < count:
+            points[index][1] += packets
+            points[index][2] += size
+    return [tuple(point) for point in points]
+
+
+def totals(dimension=TOTAL, since=None, until=None, limit=None):
+    """[{"item", "packets", "bytes"}] per item of ``dimension``, largest byte count first."""
+    rows = TrafficRollup.objects.filter(dimension=dimension)
+    if since is not None:
+        # Hour rows can't be split, so the one containing ``since`` counts whole
+        rows = rows.filter(Q(resolution=HOUR, bucket__gte=truncate(since, HOUR))
+                           | Q(resolution__lt=HOUR, bucket__gte=truncate(since, MINUTE)))
+    if until is not None:
+        rows = rows.filter(bucket__lt=until)
+    rows = (
+        rows.values("item")
+        .annotate(packets=Sum("packets"), bytes=Sum("bytes_transferred"))
+        .order_by("-bytes")
+    )
+    return list(rows[:limit] if limit else rows)
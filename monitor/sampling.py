@@ -0,0 +1,172 @@
+"""
+Capture profiles: BPF filter, snaplen and packet sampling for busy links.
+
+Every sampled-in packet carries a weight equal to the sampling rate, and
+the persist stage multiplies packet and byte counts by it. Dashboard sums
+and detection thresholds therefore see an unbiased estimate of the real
+traffic.
+"""
+import threading
+import zlib
+
+from django.conf import settings
+
+
+# Sampling modes
+COUNT = "count"  # deterministic 1-in-N packets
+FLOW = "flow"    # 1-in-N flows by hash of the 5-tuple (keeps whole conversations)
+SAMPLING_MODES = (COUNT, FLOW)
+
+ADAPT_EVERY = 1024  # packets between watermark checks
+
+
+class CaptureProfile:
+    def __init__(self, name, bpf="ip", snaplen=0, sampling=None, rate=1, adaptive=False,
+                 max_rate=1024, high_watermark=0.8, low_watermark=0.2):
+        if sampling not in (None,) + SAMPLING_MODES:
+            raise ValueError(f"Unknown sampling mode {sampling!r} in capture profile {name!r}")
+        self.name = name
+        self.bpf = bpf
+        self.snaplen = snaplen
+        self.sampling = sampling or (COUNT if adaptive or rate > 1 else None)
+        self.rate = max(1, int(rate))
+        self.adaptive = adaptive
+        self.max_rate = max_rate
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+
+    @classmethod
+    def load(cls, name=None):
+        profiles = getattr(settings, "MONITOR_CAPTURE_PROFILES", {})
+        name = name or getattr(settings, "MONITOR_CAPTURE_PROFILE", "default")
+        if name not in profiles:
+            if name == "default":
+                return cls("default")
+            raise ValueError(f"Unknown capture profile {name!r}")
+        return cls(name, **profiles[name])
+
+    def sampler(self):
+        if not self.sampling:
+            return None
+        return Sampler(self.sampling, self.rate, adaptive=self.adaptive, max_rate=self.max_rate,
+                       high_watermark=self.high_watermark, low_watermark=self.low_watermark)
+
+    def truncate(self, frame):
+        """Cut a raw frame down to snaplen; wirelen keeps the real size."""
+        if self.snaplen and len(frame.data) > self.snaplen:
+            return frame._replace(data=frame.data[:self.snaplen])
+        return frame
+
+    def __str__(self):
+        sampling = f"{self.sampling} 1/{self.rate}" if self.sampling else "off"
+        if self.adaptive:
+            sampling += f" (adaptive up to 1/{self.max_rate})"
+        return f"{self.name}: bpf={self.bpf!r} snaplen={self.snaplen or 'full'} sampling={sampling}"
+
+
+class Sampler:
+    """
+    Decides which packet records are kept and the weight they carry.
+
+    In adaptive mode the rate doubles whenever a watched queue passes the
+    high watermark and halves (down to the configured rate) once every
+    watched queue is back under the low watermark. Rates stay powers-of-two
+    multiples of the base rate, so under flow sampling the kept flows at a
+    higher rate are a subset of those kept at the lower one.
+    """
+
+    def __init__(self, mode, rate, adaptive=False, max_rate=1024, high_watermark=0.8, low_watermark=0.2):
+        self.mode = mode
+        self.base_rate = rate
+        self.rate = rate
+        self.adaptive = adaptive
+        self.max_rate = max_rate
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.queues = []
+        self._lock = threading.Lock()
+
+        # Counters
+        self.seen = 0
+        self.kept = 0
+        self.rate_changes = 0
+
+    def watch(self, *queues):
+        self.queues.extend(queues)
+
+    def weight(self, record):
+        """The record's weight if it is sampled in, 0 if it should be dropped."""
+        # Counters and the rate change only under the lock: several capture
+        # threads share one sampler
+        with self._lock:
+            self.seen += 1
+            seen = self.seen
+            if self.adaptive and seen % ADAPT_EVERY == 0:
+                self._adapt()
+            rate = self.rate
+
+        if rate <= 1:
+            keep = True
+        elif self.mode == FLOW:
+            keep = flow_hash(record) % rate == 0
+        else:
+            keep = seen % rate == 0
+
+        if not keep:
+            return 0
+        with self._lock:
+            self.kept += 1
+        return rate
+
+    def _adapt(self):
+        """Called with the lock held."""
+        if not self.queues:
+            return
+        fill = max(q.qsize() / q.maxsize for q in self.queues if q.maxsize)
+        if fill >= self.high_watermark and self.rate * 2 <= self.max_rate:
+            self.rate *= 2
+            self.rate_changes += 1
+            print(f"⚠ Pipeline at {fill:.0%}: sampling 1 in {self.rate}")
+        elif fill <= self.low_watermark and self.rate > self.base_rate:
+            self.rate //= 2
+            self.rate_changes += 1
+            print(f"ℹ Pipeline at {fill:.0%}: sampling 1 in {self.rate}")
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "rate": self.rate,
+            "seen": self.seen,
+            "kept": self.kept,
+            "rate_changes": self.rate_changes,
+        }
+
+
+def flow_hash(record):
+    """
+    Stable hash of the 5-tuple, the same for both directions of a flow.
+    (hash() is salted per process, so it can't be used for sampling.)
+    """
+    a = (record.src, record.sport or 0)
+    b = (record.dst, record.dport or 0)
+    if b < a:
+        a, b = b, a
+    return zlib.crc32(f"{a[0]}|{a[1]}|{b[0]}|{b[1]}|{record.proto}".encode())
+
+
+def sampled(parse, sampler):
+    """Wrap a parse handler so it drops sampled-out records and weights the rest."""
+    if sampler is None:
+        return parse
+
+    def parse_and_sample(item):
+        record = parse(item)
+        if record is None:
+            return None
+        weight = sampler.weight(record)
+        if not weight:
+            return None
+        record.weight = weight
+        return record
+
+    return parse_and_sample
@@ -0,0 +1,48 @@
+# monitor/signals.py
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from threatintel.models import ThreatIP
+
+from . import counters, snapshot
+from .models import Alert
+
+
+# Alert rows saved or deleted one at a time (admin, views, shell). The
+# emitter's bulk writes update the counters themselves. Alert.save() and
+# ThreatIP.save() run in a transaction, and deletes always do, so each
+# counter update below commits or rolls back together with its row. The
+# dashboard is only told about the change once it has committed.
+@receiver(pre_save, sender=Alert)
+def alert_saving(sender, instance, **kwargs):
+    instance._counted = None
+    if instance.pk is not None:
+        instance._counted = Alert.objects.filter(pk=instance.pk).values_list("severity", "reviewed").first()
+
+
+@receiver(post_save, sender=Alert)
+def alert_saved(sender, instance, created, **kwargs):
+    deltas = counters.alert_deltas(instance.severity, instance.reviewed)
+    old = getattr(instance, "_counted", None)
+    if old is not None and not created:
+        deltas = counters.merge(deltas, counters.alert_deltas(*old, sign=-1))
+    counters.add(deltas)
+    transaction.on_commit(snapshot.mark_changed)
+
+
+@receiver(post_delete, sender=Alert)
+def alert_deleted(sender, instance, **kwargs):
+    counters.add(counters.alert_deltas(instance.severity, instance.reviewed, sign=-1))
+    transaction.on_commit(snapshot.mark_changed)
+
+
+@receiver(post_save, sender=ThreatIP)
+def threat_ip_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.add({counters.THREAT_IPS: 1})
+
+
+@receiver(post_delete, sender=ThreatIP)
+def threat_ip_deleted(sender, instance, **kwargs):
+    counters.add({counters.THREAT_IPS: -1})
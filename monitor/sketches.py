@@ -0,0 +1,354 @@
+"""
+Bounded-memory traffic summaries for the dashboard.
+
+The persist stage records every packet into per-minute sketches:
+
+* ``SpaceSaving``: top-K source IPs by bytes. Counts are overestimates by
+  at most ``floor``.
+* ``HyperLogLog``: the number of distinct source IPs, about 1.6% standard
+  error at the default precision.
+
+Both can be merged, so a window is answered by merging the stored minute
+and hour buckets that cover it, and all-time by a single running bucket.
+None of that reads NetworkLog.
+"""
+import hashlib
+import heapq
+import math
+import threading
+import time
+import traceback
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+
+from monitor.models import TrafficSketch
+
+
+TOP_K = getattr(settings, "MONITOR_SKETCH_TOP_K", 100)
+HLL_PRECISION = getattr(settings, "MONITOR_SKETCH_HLL_PRECISION", 12)
+FLUSH_INTERVAL = getattr(settings, "MONITOR_SKETCH_FLUSH_INTERVAL", 5.0)       # seconds
+MINUTE_RETENTION = getattr(settings, "MONITOR_SKETCH_MINUTE_RETENTION", 2)     # days
+CLOSE_RETRIES = 5  # flush attempts on close() before pending minutes are given up
+
+# Bucket resolutions
+MINUTE = "minute"
+HOUR = "hour"
+TOTAL = "total"
+TOTAL_BUCKET = datetime(1970, 1, 1)
+
+
+class SpaceSaving:
+    """
+    Top-K heavy hitters. Items not in ``counts`` weigh at most ``floor``.
+
+    Built exactly from a Counter (``from_counter``) and combined with the
+    mergeable-summaries rule: an item missing on one side is charged that
+    side's floor, and only the K largest merged counts are kept.
+    """
+
+    def __init__(self, k=TOP_K, counts=None, floor=0):
+        self.k = k
+        self.counts = counts or {}
+        self.floor = floor
+
+    @classmethod
+    def from_counter(cls, counter, k=TOP_K):
+        if len(counter) <= k:
+            return cls(k, dict(counter))
+        top = heapq.nlargest(k + 1, counter.items(), key=lambda kv: kv[1])
+        return cls(k, dict(top[:k]), floor=top[k][1])
+
+    def merge(self, other):
+        merged = {}
+        for item in self.counts.keys() | other.counts.keys():
+            merged[item] = self.counts.get(item, self.floor) + other.counts.get(item, other.floor)
+        floor = self.floor + other.floor
+        if len(merged) > self.k:
+            top = heapq.nlargest(self.k + 1, merged.items(), key=lambda kv: kv[1])
+            merged = dict(top[:self.k])
+            floor = max(floor, top[self.k][1])
+        self.counts = merged
+        self.floor = floor
+        return self
+
+    def top(self, n):
+        return heapq.nlargest(n, self.counts.items(), key=lambda kv: kv[1])
+
+    def to_dict(self):
+        return {"k": self.k, "floor": self.floor, "counts": self.counts}
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data:
+            return cls()
+        return cls(data["k"], dict(data["counts"]), data["floor"])
+
+
+class HyperLogLog:
+    """Distinct-count estimator with 2**p one-byte registers."""
+
+    def __init__(self, p=HLL_PRECISION, registers=None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(registers) if registers else bytearray(self.m)
+
+    def add(self, item):
+        h = int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), "big")
+        index = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+        return self
+
+    def merge(self, other):
+        if other.p != self.p:
+            raise ValueError("Cannot merge HyperLogLogs of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # linear counting for small sets
+        return int(round(estimate))
+
+    def to_bytes(self):
+        return bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data, p=HLL_PRECISION):
+        return cls(p, data) if data else cls(p)
+
+
+class TrafficSummary:
+    """Merged sketches for one time range."""
+
+    def __init__(self):
+        self.talkers = SpaceSaving()
+        self.sources = HyperLogLog()
+        self.packets = 0
+        self.bytes = 0
+
+    def add_row(self, row):
+        self.talkers.merge(SpaceSaving.from_dict(row.talkers))
+        self.sources.merge(HyperLogLog.from_bytes(row.sources))
+        self.packets += row.packets
+        self.bytes += row.bytes_transferred
+
+    def top_talkers(self, n=5):
+        return self.talkers.top(n)
+
+    def unique_sources(self):
+        return self.sources.count()
+
+
+def bucket_start(when, resolution):
+    if resolution == MINUTE:
+        return when.replace(second=0, microsecond=0)
+    if resolution == HOUR:
+        return when.replace(minute=0, second=0, microsecond=0)
+    return TOTAL_BUCKET
+
+
+def traffic_summary(since=None, until=None):
+    """
+    Sketch summary of [since, until), or of everything recorded when
+    ``since`` is None. Whole hours come from hour buckets and the ragged
+    edges from minute buckets (one-minute granularity).
+    """
+    summary = TrafficSummary()
+    if since is None:
+        rows = TrafficSketch.objects.filter(resolution=TOTAL, bucket=TOTAL_BUCKET)
+    else:
+        until = until or datetime.now() + timedelta(minutes=1)
+        since = bucket_start(since, MINUTE)
+        first_hour = bucket_start(since + timedelta(minutes=59), HOUR)
+        last_hour = bucket_start(until, HOUR)
+        if first_hour < last_hour:
+            rows = list(TrafficSketch.objects.filter(resolution=HOUR, bucket__gte=first_hour, bucket__lt=last_hour))
+            rows += TrafficSketch.objects.filter(resolution=MINUTE, bucket__gte=since, bucket__lt=first_hour)
+            rows += TrafficSketch.objects.filter(resolution=MINUTE, bucket__gte=last_hour, bucket__lt=until)
+        else:
+            rows = TrafficSketch.objects.filter(resolution=MINUTE, bucket__gte=since, bucket__lt=until)
+    for row in rows:
+        summary.add_row(row)
+    return summary
+
+
+class _Bucket:
+    __slots__ = ("talkers", "packets", "bytes")
+
+    def __init__(self):
+        self.talkers = Counter()  # source IP -> bytes
+        self.packets = 0
+        self.bytes = 0
+
+
+class SketchRecorder:
+    """
+    Collects per-minute source byte counts from the persist stage and merges
+    them into the stored minute, hour and all-time sketches on a timer.
+    Several capture processes can record at once; each flush merges its
+    delta into the rows under a row lock. A flush that fails puts its
+    minutes back, and they are written on the next tick.
+    """
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._pending = {}  # minute -> _Bucket
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._timer = None
+        self._next_prune = None
+
+        # Counters
+        self.recorded = 0
+        self.flushes = 0
+        self.failed = 0
+
+    # ------------------ lifecycle ------------------
+    def start(self):
+        if self._timer is None:
+            self._stop.clear()
+            self._timer = threading.Thread(target=self._run_timer, name="sketch-recorder", daemon=True)
+            self._timer.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._timer is not None:
+            self._timer.join()
+            self._timer = None
+        for attempt in range(CLOSE_RETRIES):
+            self.flush()
+            if not self._pending:
+                break
+            time.sleep(self.flush_interval * (attempt + 1))
+
+    # ------------------ recording ------------------
+    def observe(self, record):
+        self.add(record.timestamp, record.src, record.length * record.weight, record.weight)
+
+    def add(self, when, src, size, packets=1):
+        minute = when.replace(second=0, microsecond=0)
+        with self._lock:
+            bucket = self._pending.get(minute)
+            if bucket is None:
+                bucket = self._pending[minute] = _Bucket()
+            bucket.talkers[src] += size
+            bucket.packets += packets
+            bucket.bytes += size
+            self.recorded += 1
+
+    # ------------------ writing ------------------
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            try:
+                with transaction.atomic():
+                    self.write(pending)
+            except Exception as e:
+                self._requeue(pending)
+                if not connection.in_atomic_block:
+                    connection.close_if_unusable_or_obsolete()  # reconnect after a dropped connection
+                self.failed += 1
+                print(f"❌ Failed to write traffic sketches for {len(pending)} minutes, "
+                      f"retrying on the next flush:", e)
+                traceback.print_exc()
+                return 0
+            self.flushes += 1
+            self._prune(max(pending))
+            return len(pending)
+
+    def _requeue(self, pending):
+        """Merge minutes that could not be written back into the pending ones."""
+        with self._lock:
+            for minute, failed in pending.items():
+                bucket = self._pending.get(minute)
+                if bucket is None:
+                    self._pending[minute] = failed
+                    continue
+                bucket.talkers.update(failed.talkers)
+                bucket.packets += failed.packets
+                bucket.bytes += failed.bytes
+
+    def write(self, pending):
+        # Fold the minutes into one delta per stored row
+        deltas = {}
+        for minute, bucket in pending.items():
+            talkers = SpaceSaving.from_counter(bucket.talkers)
+            sources = HyperLogLog().update(bucket.talkers)
+            for resolution in (MINUTE, HOUR, TOTAL):
+                key = (resolution, bucket_start(minute, resolution))
+                delta = deltas.get(key)
+                if delta is None:
+                    deltas[key] = delta = TrafficSummary()
+                delta.talkers.merge(talkers)
+                delta.sources.merge(sources)
+                delta.packets += bucket.packets
+                delta.bytes += bucket.bytes
+        for (resolution, start), delta in deltas.items():
+            self._merge_row(resolution, start, delta)
+
+    def _merge_row(self, resolution, start, delta):
+        row = TrafficSketch.objects.select_for_update().filter(resolution=resolution, bucket=start).first()
+        if row is None:
+            try:
+                with transaction.atomic():
+                    TrafficSketch.objects.create(
+                        resolution=resolution, bucket=start,
+                        packets=delta.packets, bytes_transferred=delta.bytes,
+                        talkers=delta.talkers.to_dict(), sources=delta.sources.to_bytes(),
+                    )
+                return
+            except IntegrityError:
+                # Another process created it first; merge into theirs
+                row = TrafficSketch.objects.select_for_update().get(resolution=resolution, bucket=start)
+
+        summary = TrafficSummary()
+        summary.add_row(row)
+        summary.talkers.merge(delta.talkers)
+        summary.sources.merge(delta.sources)
+        row.packets += delta.packets
+        row.bytes_transferred += delta.bytes
+        row.talkers = summary.talkers.to_dict()
+        row.sources = summary.sources.to_bytes()
+        row.save(update_fields=["packets", "bytes_transferred", "talkers", "sources"])
+
+    def _prune(self, latest):
+        """Drop minute buckets past retention (hour buckets are kept)."""
+        if self._next_prune is not None and latest < self._next_prune:
+            return
+        self._next_prune = latest + timedelta(hours=1)
+        cutoff = latest - timedelta(days=MINUTE_RETENTION)
+        TrafficSketch.objects.filter(resolution=MINUTE, bucket__lt=cutoff).delete()
+
+    def _run_timer(self):
+        try:
+            while not self._stop.wait(self.flush_interval):
+                self.flush()
+        finally:
+            # The timer thread owns its own DB connection.
+            connection.close()
+
+    # ------------------ reporting ------------------
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {"recorded": self.recorded, "pending_minutes": pending,
+                "flushes": self.flushes, "failed": self.failed}
@@ -0,0 +1,112 @@
+"""
+Shared dashboard snapshot.
+
+The dashboard page, its stats partial and its chart API all show the
+same numbers, and every open tab polls them every few seconds. Instead of
+reading the counters and merging sketches per request, they are put into
+one snapshot per (traffic source, summary window). The snapshot is kept
+in the Django cache, so all workers share it.
+
+A snapshot is rebuilt at most once every MONITOR_DASHBOARD_INTERVAL
+seconds, and only when the log writer or the alert emitter has signalled
+new data since it was built (``mark_changed``). Otherwise it is rebuilt
+once it is MONITOR_DASHBOARD_MAX_AGE seconds old. One request rebuilds
+while the others keep serving the previous snapshot, so a request costs a
+single cache read.
+"""
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.conf import settings
+from django.utils import timezone
+
+from monitor import counters, rollups
+from monitor.models import Alert
+from monitor.sketches import traffic_summary
+from monitor.sources import traffic_source
+
+
+INTERVAL = getattr(settings, "MONITOR_DASHBOARD_INTERVAL", 5)     # seconds between rebuilds
+MAX_AGE = getattr(settings, "MONITOR_DASHBOARD_MAX_AGE", 30)      # seconds, without a change signal
+
+CHANGED_KEY = "monitor:dashboard:changed"
+LOCK_SECONDS = 60  # a rebuild that died holds the lock no longer than this
+
+# Top talkers / unique sources come from the traffic sketches, for all time
+# or for ?window=15m|1h|24h|7d
+SUMMARY_WINDOWS = {
+    "15m": timedelta(minutes=15),
+    "1h": timedelta(hours=1),
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7),
+}
+
+
+def mark_changed():
+    """Tell the dashboards that new logs or alerts were written."""
+    try:
+        cache.set(CHANGED_KEY, time.time(), None)
+    except Exception as e:
+        print("⚠ Could not signal the dashboard snapshot:", e)
+
+
+def _timeline(minutes=12):
+    now = timezone.now()
+    since = rollups.truncate(now, rollups.MINUTE) - timedelta(minutes=minutes - 1)
+    points = rollups.series(since, since + timedelta(minutes=minutes), step=rollups.MINUTE)
+    return [bucket.strftime("%H:%M") for bucket, _, _ in points], [size for _, _, size in points]
+
+
+def build(source=None, window=None):
+    """Everything the dashboard shows, as plain data."""
+    source = traffic_source(source)
+    since = SUMMARY_WINDOWS.get(window)
+    summary = traffic_summary(timezone.now() - since if since else None)
+    timeline_labels, timeline_data = _timeline()
+    top_ips = summary.top_talkers(5)
+    totals = counters.get_many([counters.rows_counter(source.model), counters.severity_counter("High"),
+                                counters.THREAT_IPS, counters.HOSTS])
+    return {
+        "total_logs": totals[counters.rows_counter(source.model)],
+        "active_alerts": totals[counters.severity_counter("High")],
+        # Exact for all time; the sketches' estimate for a window
+        "unique_ips": summary.unique_sources() if since else totals[counters.HOSTS],
+        "threat_count": totals[counters.THREAT_IPS],
+        "timeline_labels": timeline_labels,
+        "timeline_data": timeline_data,
+        "top_ip_labels": [ip for ip, _ in top_ips],
+        "top_ip_values": [total for _, total in top_ips],
+        "latest_alerts": list(
+            Alert.objects.order_by("-last_seen").values("id", "message", "last_seen", "count")[:5]
+        ),
+    }
+
+
+def _stale(entry, changed, now):
+    age = now - entry["built"]
+    if age < INTERVAL:
+        return False
+    return age >= MAX_AGE or (changed or 0) > entry["built"]
+
+
+def get_snapshot(source=None, window=None):
+    """The current snapshot for ``source`` and ``window``, rebuilding it if due."""
+    source = traffic_source(source).name
+    window = window if window in SUMMARY_WINDOWS else "all"
+    key = f"monitor:dashboard:{source}:{window}"
+    cached = cache.get_many([key, CHANGED_KEY])
+    entry, now = cached.get(key), time.time()
+    if entry is not None and not _stale(entry, cached.get(CHANGED_KEY), now):
+        return entry["data"]
+
+    # One rebuild at a time; everyone else serves the previous snapshot
+    lock = f"{key}:lock"
+    if entry is not None and not cache.add(lock, True, LOCK_SECONDS):
+        return entry["data"]
+    try:
+        entry = {"built": now, "data": build(source, window)}
+        cache.set(key, entry, None)
+    finally:
+        cache.delete(lock)
+    return entry["data"]
@@ -0,0 +1,81 @@
+"""
+Read side of the two capture modes.
+
+Per-packet NetworkLog rows and aggregated Flow rows share the source_ip,
+destination_ip, protocol, bytes_transferred and packets columns. A
+TrafficSource wraps whatever else differs (model, time column), so the
+dashboard and detection queries can run against either table.
+"""
+from django.conf import settings
+from django.db.models import Sum
+from django.utils.dateparse import parse_datetime
+
+from monitor.models import NetworkLog, Flow
+
+
+class TrafficSource:
+    def __init__(self, name, model, time_field):
+        self.name = name
+        self.model = model
+        self.time_field = time_field
+
+    def all(self):
+        return self.model.objects.all()
+
+    def since(self, when):
+        return self.model.objects.filter(**{f"{self.time_field}__gte": when})
+
+    def latest(self, n):
+        return self.model.objects.order_by(f"-{self.time_field}", "-id")[:n]
+
+    # ------------------ cursors ------------------
+    # Live tables ask for the rows written after the newest id they show;
+    # history pages continue from the (time, id) of their last row. Both
+    # are index range scans, so page 1000 costs the same as page 1.
+    def last_id(self):
+        return self.model.objects.order_by("-id").values_list("id", flat=True).first() or 0
+
+    def newer(self, last_id, n):
+        """Rows written after row ``last_id``, newest first (at most ``n``)."""
+        return self.model.objects.filter(id__gt=last_id).order_by("-id")[:n]
+
+    def older(self, cursor, n):
+        """The ``n`` rows that follow ``cursor`` in newest-first order."""
+        when, last_id = cursor
+        rows = (
+            self.model.objects
+            .filter(**{f"{self.time_field}__lte": when})
+            .exclude(**{self.time_field: when, "id__gte": last_id})
+        )
+        return rows.order_by(f"-{self.time_field}", "-id")[:n]
+
+    def cursor(self, row):
+        return f"{getattr(row, self.time_field).isoformat()}_{row.id}"
+
+    @staticmethod
+    def parse_cursor(value):
+        """``(time, id)`` from a ``cursor()`` string, or None if it is malformed."""
+        when, _, last_id = (value or "").rpartition("_")
+        try:
+            when = parse_datetime(when)
+        except ValueError:
+            return None
+        if when is None or not last_id.isdigit():
+            return None
+        return when, int(last_id)
+
+    def packets(self):
+        """Aggregate counting the packets behind the rows (sampling-weighted)."""
+        return Sum("packets")
+
+
+SOURCES = {
+    "packets": TrafficSource("packets", NetworkLog, "timestamp"),
+    "flows": TrafficSource("flows", Flow, "last_seen"),
+}
+
+
+def traffic_source(name=None):
+    """The named source, defaulting to the configured capture mode."""
+    name = name or getattr(settings, "MONITOR_CAPTURE_MODE", "packets")
+    return SOURCES.get(name, SOURCES["packets"])
@@ -0,0 +1,52 @@
+// Live page updates from /monitor/live/ (server-sent events, monitor/live.py).
+// handlers: {event name: function(data)}. fallback() starts polling instead;
+// it runs when the browser has no EventSource or the server cannot stream
+// (it answers 204 under WSGI, which closes the EventSource for good).
+function monitorLive(url, handlers, fallback) {
+    if (!window.EventSource) {
+        fallback();
+        return;
+    }
+    const source = new EventSource(url);
+    for (const [name, handler] of Object.entries(handlers)) {
+        source.addEventListener(name, (event) => handler(JSON.parse(event.data)));
+    }
+    // Fell too far behind: start over from a fresh page
+    source.addEventListener("reload", () => window.location.reload());
+    source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED) {
+            fallback();
+        }
+    };
+}
+
+// Prepend rendered rows/items to a container, keeping at most `limit` children.
+// An element whose id is already shown replaces the old one.
+function monitorPrepend(container, html, limit) {
+    const template = document.createElement("template");
+    template.innerHTML = html.trim();
+    for (const element of template.content.children) {
+        if (element.id) {
+            document.getElementById(element.id)?.remove();
+        }
+    }
+    container.prepend(...template.content.children);
+    while (container.children.length > limit) {
+        container.lastElementChild.remove();
+    }
+}
+
+// Polling fallback for log tables: fetch only the rows written after the
+// newest one shown (container.dataset.lastId). The server answers 204 when
+// there are none, otherwise the rows and their newest id in X-Last-Id.
+function monitorPollRows(url, container, limit) {
+    const separator = url.includes("?") ? "&" : "?";
+    return fetch(url + separator + "since=" + (container.dataset.lastId || 0))
+        .then((response) => {
+            if (response.status !== 200) {
+                return;
+            }
+            container.dataset.lastId = response.headers.get("X-Last-Id");
+            return response.text().then((html) => monitorPrepend(container, html, limit));
+        });
+}
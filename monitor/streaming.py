@@ -0,0 +1,266 @@
+"""
+Streaming versions of the rules in monitor/detection.py.
+
+The capture pipeline feeds every record to a StreamingDetector. It keeps
+per-source sliding-window counters in memory and raises an alert when a
+source crosses a threshold, without reading the database. Each window is a
+ring of time buckets: adding to it is O(1) amortized, and expiring a bucket
+subtracts its total, so nothing is re-summed.
+
+Alerts are edge-triggered. A source fires once when it crosses the
+threshold, and fires again only after it has dropped below REARM times the
+threshold. Repeats within the alert window are merged by the emitter anyway.
+"""
+import threading
+
+from monitor import alerts
+from monitor.decoder import PROTO_ICMP
+from monitor.detection import (
+    HIGH_TRAFFIC_WINDOW, HIGH_TRAFFIC_BYTES,
+    PORT_SCAN_WINDOW, PORT_SCAN_TARGETS,
+    ICMP_FLOOD_WINDOW, ICMP_FLOOD_PACKETS,
+)
+
+
+BUCKETS = 30        # buckets per window
+REARM = 0.5         # re-arm once the value falls below this share of the threshold
+SWEEP_EVERY = 10.0  # seconds (of packet time) between evictions of idle sources
+
+
+class SumRing:
+    """Sum of values over the last ``size`` buckets."""
+
+    __slots__ = ("counts", "head", "total")
+
+    def __init__(self, size, bucket):
+        self.counts = [0] * size
+        self.head = bucket  # newest bucket index
+        self.total = 0
+
+    def add(self, bucket, value):
+        counts = self.counts
+        size = len(counts)
+        if bucket > self.head:
+            for b in range(max(self.head + 1, bucket - size + 1), bucket + 1):
+                self.total -= counts[b % size]
+                counts[b % size] = 0
+            self.head = bucket
+        elif bucket <= self.head - size:
+            return self.total  # older than the window (out-of-order packet)
+        counts[bucket % size] += value
+        self.total += value
+        return self.total
+
+    def to_state(self):
+        return {"head": self.head, "counts": self.counts}
+
+    @classmethod
+    def from_state(cls, state):
+        ring = cls(len(state["counts"]), state["head"])
+        ring.counts = list(state["counts"])
+        ring.total = sum(ring.counts)
+        return ring
+
+
+class DistinctRing:
+    """Number of distinct items seen over the last ``size`` buckets."""
+
+    __slots__ = ("items", "refs", "head")
+
+    def __init__(self, size, bucket):
+        self.items = [None] * size  # per bucket: set of items first seen there
+        self.refs = {}              # item -> number of buckets holding it
+        self.head = bucket
+
+    def add(self, bucket, item):
+        items = self.items
+        size = len(items)
+        refs = self.refs
+        if bucket > self.head:
+            for b in range(max(self.head + 1, bucket - size + 1), bucket + 1):
+                expired = items[b % size]
+                if expired:
+                    for old in expired:
+                        if refs[old] == 1:
+                            del refs[old]
+                        else:
+                            refs[old] -= 1
+                items[b % size] = None
+            self.head = bucket
+        elif bucket <= self.head - size:
+            return len(refs)
+        current = items[bucket % size]
+        if current is None:
+            current = items[bucket % size] = set()
+        if item not in current:
+            current.add(item)
+            refs[item] = refs.get(item, 0) + 1
+        return len(refs)
+
+    @property
+    def total(self):
+        return len(self.refs)
+
+    def to_state(self):
+        return {"head": self.head, "items": [sorted(items) if items else None for items in self.items]}
+
+    @classmethod
+    def from_state(cls, state):
+        ring = cls(len(state["items"]), state["head"])
+        for i, items in enumerate(state["items"]):
+            if items:
+                ring.items[i] = set(items)
+                for item in items:
+                    ring.refs[item] = ring.refs.get(item, 0) + 1
+        return ring
+
+
+class WindowRule:
+    """One threshold rule over a per-source sliding window."""
+
+    kind = None
+    severity = "High"
+    ring_class = SumRing
+
+    def __init__(self, window, threshold, buckets=BUCKETS):
+        self.size = buckets
+        self.width = window.total_seconds() / buckets
+        self.threshold = threshold
+        self.rings = {}
+        self.firing = set()
+        self.fired = 0
+
+    def value(self, record):
+        """What the record adds to its source's window, or None to skip it."""
+        raise NotImplementedError
+
+    def message(self, src, total):
+        raise NotImplementedError
+
+    def observe(self, record, now):
+        value = self.value(record)
+        if value is None:
+            return None
+        bucket = int(now // self.width)
+        src = record.src
+        ring = self.rings.get(src)
+        if ring is None:
+            ring = self.rings[src] = self.ring_class(self.size, bucket)
+        total = ring.add(bucket, value)
+
+        if total >= self.threshold:
+            if src not in self.firing:
+                self.firing.add(src)
+                self.fired += 1
+                return self.kind, src, self.severity, self.message(src, total)
+        elif src in self.firing and total < self.threshold * REARM:
+            self.firing.discard(src)
+        return None
+
+    def sweep(self, now):
+        """Forget sources with nothing left in their window."""
+        oldest = int(now // self.width) - self.size
+        idle = [src for src, ring in self.rings.items() if ring.head <= oldest]
+        for src in idle:
+            del self.rings[src]
+            self.firing.discard(src)
+
+    def stats(self):
+        return {"sources": len(self.rings), "firing": len(self.firing), "fired": self.fired}
+
+    # ------------------ persistence ------------------
+    def to_state(self):
+        return {
+            "width": self.width,
+            "size": self.size,
+            "rings": {src: ring.to_state() for src, ring in self.rings.items()},
+            "firing": sorted(self.firing),
+        }
+
+    def load_state(self, state):
+        """Restore windows saved by ``to_state``; ignored if the window layout changed."""
+        if not state or state.get("width") != self.width or state.get("size") != self.size:
+            return False
+        self.rings = {src: self.ring_class.from_state(ring) for src, ring in state["rings"].items()}
+        self.firing = set(state["firing"])
+        return True
+
+
+class HighTrafficRule(WindowRule):
+    kind = alerts.HIGH_TRAFFIC
+
+    def __init__(self):
+        super().__init__(HIGH_TRAFFIC_WINDOW, HIGH_TRAFFIC_BYTES)
+
+    def value(self, record):
+        return record.size
+
+    def message(self, src, total):
+        return f"High bandwidth usage from {src} ({total} bytes)"
+
+
+class PortScanRule(WindowRule):
+    # Distinct destinations per source; under flow sampling this undercounts
+    # like the stored rows do
+    kind = alerts.PORT_SCAN
+    severity = "Medium"
+    ring_class = DistinctRing
+
+    def __init__(self):
+        super().__init__(PORT_SCAN_WINDOW, PORT_SCAN_TARGETS)
+
+    def value(self, record):
+        return record.dst
+
+    def message(self, src, total):
+        return f"Possible port scanning detected from {src}"
+
+
+class IcmpFloodRule(WindowRule):
+    kind = alerts.ICMP_FLOOD
+
+    def __init__(self):
+        super().__init__(ICMP_FLOOD_WINDOW, ICMP_FLOOD_PACKETS)
+
+    def value(self, record):
+        return record.packets if record.proto == PROTO_ICMP else None
+
+    def message(self, src, total):
+        return f"ICMP flood detected from {src}"
+
+
+RULE_CLASSES = (HighTrafficRule, PortScanRule, IcmpFloodRule)
+
+
+class StreamingDetector:
+    """
+    Runs every rule on each record (in packet time) and appends the alerts
+    that fire to ``record.alerts``; the persist stage emits them.
+
+    Records need timestamp, src, dst, proto, size (bytes) and packets, so
+    stored rows can be replayed through the same rules (monitor/scheduler.py).
+    """
+
+    def __init__(self, rules=None):
+        self.rules = rules if rules is not None else [cls() for cls in RULE_CLASSES]
+        self._lock = threading.Lock()
+        self._next_sweep = None
+        self.observed = 0
+
+    def __call__(self, record):
+        now = record.timestamp.timestamp()
+        with self._lock:
+            self.observed += 1
+            for rule in self.rules:
+                alert = rule.observe(record, now)
+                if alert:
+                    record.alerts.append(alert)
+            if self._next_sweep is None or now >= self._next_sweep:
+                self._next_sweep = now + SWEEP_EVERY
+                for rule in self.rules:
+                    rule.sweep(now)
+        return record
+
+    def stats(self):
+        with self._lock:
+            return {"observed": self.observed, **{rule.kind: rule.stats() for rule in self.rules}}
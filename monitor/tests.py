@@ -1,3 +1,1591 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import csv
+import gzip
+import importlib
+import io
+import os
+import ipaddress
+import json
+import random
+import shutil
+import struct
+import tempfile
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from scapy.all import (
+    ICMP, IP, TCP, UDP, CookedLinux, Dot1AD, Dot1Q, Ether, IPv6, IPv6ExtHdrDestOpt, IPv6ExtHdrFragment,
+    IPv6ExtHdrHopByHop, IPv6ExtHdrRouting,
+)
+
+from monitor import alerts, archive, counters, decoder, export, live, partitions, rollups, snapshot
+from monitor.capture import PacketRecord, decode_frame, parse_frame
+from monitor.decoder import decode
+from monitor.flows import FlowTable
+from monitor.baselines import BaselineRunner, source_path
+from monitor.ingest import BatchWriter, SqliteBackend, _copy_text
+from monitor.models import Alert, DetectorState, Flow, KnownHost, NetworkLog, Protocol, TrafficRollup
+from monitor.pcapfile import Frame, PcapFormatError, read_frames
+from monitor.pipeline import DROP_OLDEST, SAMPLE, Pipeline, Stage
+from monitor.reports import build_report
+from monitor.sampling import COUNT, FLOW, Sampler
+from monitor.scheduler import RuleRunner, StoredRow
+from monitor.sketches import HyperLogLog, SketchRecorder, SpaceSaving, traffic_summary
+from monitor.sources import SOURCES
+from monitor.streaming import DistinctRing, StreamingDetector, SumRing, WindowRule
+from threatintel.models import ThreatIP
+
+
+# ------------------ decoder ------------------
+def eth(payload, **fields):
+    """An Ethernet frame with fixed MACs, so scapy does no ARP lookup."""
+    return bytes(Ether(src="02:00:00:00:00:01", dst="02:00:00:00:00:02", **fields) / payload)
+
+
+def sll2(payload, ethertype=decoder.ETH_IPV4):
+    """A LINKTYPE_LINUX_SLL2 frame: protocol, reserved, ifindex, hatype, pkttype, halen, address."""
+    return struct.pack("!HHIHBB8s", ethertype, 0, 2, 1, 0, 6, b"\x00" * 8) + payload
+
+
+class DecoderTests(SimpleTestCase):
+    TCP4 = IP(src="10.0.0.1", dst="10.0.0.2") / TCP(sport=1234, dport=80)
+    UDP6 = IPv6(src="2001:db8::1", dst="2001:db8::2") / UDP(sport=5353, dport=53)
+
+    def test_ethernet(self):
+        self.assertEqual(decode(eth(self.TCP4)), ("10.0.0.1", "10.0.0.2", 6, 1234, 80))
+        self.assertEqual(decode(eth(self.UDP6)), ("2001:db8::1", "2001:db8::2", 17, 5353, 53))
+        self.assertEqual(decode(eth(IP(src="10.0.0.1", dst="10.0.0.2") / ICMP())),
+                         ("10.0.0.1", "10.0.0.2", 1, None, None))
+
+    def test_vlan_tags(self):
+        self.assertEqual(decode(eth(Dot1Q(vlan=10) / self.TCP4))[:2], ("10.0.0.1", "10.0.0.2"))
+        qinq = Dot1AD(vlan=100) / Dot1Q(vlan=10) / self.UDP6
+        self.assertEqual(decode(eth(qinq)), ("2001:db8::1", "2001:db8::2", 17, 5353, 53))
+
+    def test_other_link_types(self):
+        expected = ("10.0.0.1", "10.0.0.2", 6, 1234, 80)
+        self.assertEqual(decode(bytes(self.TCP4), 101), expected)
+        self.assertEqual(decode(bytes(CookedLinux(proto=0x0800) / self.TCP4), decoder.LINKTYPE_LINUX_SLL),
+                         expected)
+        self.assertEqual(decode(sll2(bytes(self.TCP4)), decoder.LINKTYPE_LINUX_SLL2), expected)
+        self.assertEqual(decode(struct.pack("<I", 2) + bytes(self.TCP4), decoder.LINKTYPE_NULL), expected)
+
+    def test_ipv6_extension_headers(self):
+        chained = (IPv6(src="2001:db8::1", dst="2001:db8::2") / IPv6ExtHdrHopByHop() / IPv6ExtHdrRouting()
+                   / IPv6ExtHdrDestOpt() / TCP(sport=1, dport=22))
+        self.assertEqual(decode(eth(chained)), ("2001:db8::1", "2001:db8::2", 6, 1, 22))
+
+        first = IPv6(src="2001:db8::1", dst="2001:db8::2") / IPv6ExtHdrFragment(offset=0, m=1) / UDP(dport=53)
+        self.assertEqual(decode(eth(first))[2:], (17, 53, 53))
+        later = IPv6(src="2001:db8::1", dst="2001:db8::2") / IPv6ExtHdrFragment(offset=100, nh=17) / b"x"
+        self.assertEqual(decode(eth(later))[2:], (17, None, None))
+
+    def test_ipv4_fragments_carry_no_ports(self):
+        frame = IP(src="10.0.0.1", dst="10.0.0.2", frag=10, proto=6) / (b"x" * 16)
+        self.assertEqual(decode(eth(frame)), ("10.0.0.1", "10.0.0.2", 6, None, None))
+
+    def test_bad_ipv4_header_length(self):
+        header = bytearray(bytes(self.TCP4))
+        header[0] = 0x44  # IHL of 16 bytes: shorter than the fixed header
+        self.assertIsNone(decode(eth(bytes(header), type=0x0800)))
+        header[0] = 0x4F  # 60 bytes of options claimed, 40 captured
+        self.assertEqual(decode(eth(bytes(header), type=0x0800)), ("10.0.0.1", "10.0.0.2", 6, None, None))
+
+    def test_not_ip(self):
+        self.assertIsNone(decode(eth(b"\x00" * 28, type=0x0806)))  # ARP
+        self.assertIsNone(decode(sll2(b"\x00" * 28, ethertype=0x0806), decoder.LINKTYPE_LINUX_SLL2))
+        self.assertIsNone(decode(bytes(self.TCP4), 9999))  # unknown link type
+        self.assertIsNone(decode(b"\x50" + b"\x00" * 39, 101))  # IP version 5
+
+    def test_truncated_frames(self):
+        tcp = eth(self.TCP4)
+        udp6 = eth(self.UDP6)
+        self.assertIsNone(decode(b""))
+        self.assertIsNone(decode(tcp[:13]))
+        self.assertIsNone(decode(tcp[:14]))
+        self.assertIsNone(decode(tcp[:14 + 19]))
+        self.assertIsNone(decode(udp6[:14 + 39]))
+        self.assertIsNone(decode(eth(Dot1Q())[:16]))  # tag cut short
+        self.assertIsNone(decode(sll2(b"")[:19], decoder.LINKTYPE_LINUX_SLL2))
+        # Headers intact, transport cut: addresses without ports
+        self.assertEqual(decode(tcp[:14 + 20 + 2]), ("10.0.0.1", "10.0.0.2", 6, None, None))
+        hop = eth(IPv6(src="2001:db8::1", dst="2001:db8::2") / IPv6ExtHdrHopByHop() / TCP())
+        self.assertEqual(decode(hop[:14 + 40 + 4])[:3], ("2001:db8::1", "2001:db8::2", 0))
+
+    def test_agrees_with_scapy_path(self):
+        frames = [
+            Frame(1.5, decoder.LINKTYPE_ETHERNET, eth(self.TCP4), 60),
+            Frame(2.0, decoder.LINKTYPE_ETHERNET, eth(Dot1Q(vlan=7) / IP(src="10.0.0.3", dst="10.0.0.4") / UDP()), 70),
+            Frame(2.5, decoder.LINKTYPE_LINUX_SLL, bytes(CookedLinux(proto=0x0800) / self.TCP4), 80),
+        ]
+        for frame in frames:
+            raw, dissected = decode_frame(frame, verbose=False), parse_frame(frame, verbose=False)
+            self.assertEqual(raw, dissected)
+
+
+# ------------------ capture files ------------------
+def pcap(records, order="<", nanos=False, linktype=1):
+    """A pcap file of (timestamp, data) records."""
+    magic = 0xA1B23C4D if nanos else 0xA1B2C3D4
+    divisor = 10 ** 9 if nanos else 10 ** 6
+    out = struct.pack(order + "IHHiIII", magic, 2, 4, 0, 0, 65535, linktype)
+    for ts, data in records:
+        sec = int(ts)
+        out += struct.pack(order + "IIII", sec, round((ts - sec) * divisor), len(data), len(data)) + data
+    return out
+
+
+def block(block_type, body):
+    body += b"\x00" * (-len(body) % 4)
+    return struct.pack("<II", block_type, len(body) + 12) + body + struct.pack("<I", len(body) + 12)
+
+
+def shb():
+    return block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1))
+
+
+def idb(linktype, tsresol=None):
+    options = b""
+    if tsresol is not None:
+        options = struct.pack("<HHB3x", 9, 1, tsresol) + struct.pack("<HH", 0, 0)
+    return block(1, struct.pack("<HHI", linktype, 0, 0) + options)
+
+
+def epb(iface, ticks, data):
+    return block(6, struct.pack("<IIIII", iface, ticks >> 32, ticks & 0xFFFFFFFF, len(data), len(data)) + data)
+
+
+class PcapFileTests(SimpleTestCase):
+    FRAME = eth(IP(src="10.0.0.1", dst="10.0.0.2") / TCP())
+
+    def test_pcap_byte_orders_and_resolutions(self):
+        for order in "<>":
+            for nanos in (False, True):
+                frames = list(read_frames(io.BytesIO(pcap([(10.25, self.FRAME), (11.5, b"xy")], order, nanos))))
+                self.assertEqual([(f.timestamp, f.linktype, f.data, f.wirelen) for f in frames],
+                                 [(10.25, 1, self.FRAME, len(self.FRAME)), (11.5, 1, b"xy", 2)])
+
+    def test_pcap_truncated_last_record(self):
+        data = pcap([(1.0, self.FRAME), (2.0, self.FRAME)])
+        self.assertEqual(len(list(read_frames(io.BytesIO(data[:-5])))), 1)
+        self.assertEqual(len(list(read_frames(io.BytesIO(data[:-len(self.FRAME) - 10])))), 1)
+
+    def test_gzip_file(self):
+        fd, path = tempfile.mkstemp(suffix=".pcap.gz")
+        with os.fdopen(fd, "wb") as f:
+            f.write(gzip.compress(pcap([(1.0, self.FRAME)] * 3)))
+        try:
+            self.assertEqual(len(list(read_frames(path))), 3)
+        finally:
+            os.remove(path)
+
+    def test_not_a_capture(self):
+        with self.assertRaises(PcapFormatError):
+            list(read_frames(io.BytesIO(b"GIF89a....")))
+        with self.assertRaises(PcapFormatError):
+            list(read_frames(io.BytesIO(struct.pack("<I", 0xA1B2C3D4) + b"\x00" * 4)))
+
+    def test_pcapng_interfaces_and_timestamps(self):
+        data = (shb() + idb(1) + idb(101, tsresol=9)
+                + epb(0, 1_500_000, self.FRAME)           # microseconds
+                + epb(1, 2_250_000_000, b"\x45" * 20)     # nanoseconds on interface 1
+                + block(4, b"\x00" * 8))                  # name resolution: skipped
+        frames = list(read_frames(io.BytesIO(data)))
+        self.assertEqual([(f.timestamp, f.linktype, f.data) for f in frames],
+                         [(1.5, 1, self.FRAME), (2.25, 101, b"\x45" * 20)])
+
+    def test_pcapng_bad_blocks_skip_the_packet_not_the_file(self):
+        data = (shb() + idb(1)
+                + epb(3, 1_000_000, self.FRAME)    # no interface 3
+                + block(6, b"\x00" * 8)            # too short for an EPB
+                + epb(0, 2_000_000, self.FRAME))
+        self.assertEqual([f.timestamp for f in read_frames(io.BytesIO(data))], [2.0])
+
+    def test_pcapng_new_section_resets_interfaces(self):
+        data = shb() + idb(1) + epb(0, 1_000_000, b"a") + shb() + epb(0, 2_000_000, b"b")
+        self.assertEqual([f.data for f in read_frames(io.BytesIO(data))], [b"a"])
+
+    def test_pcapng_corrupt_blocks(self):
+        with self.assertRaises(PcapFormatError):
+            list(read_frames(io.BytesIO(shb() + struct.pack("<II", 6, 4))))
+        with self.assertRaises(PcapFormatError):
+            list(read_frames(io.BytesIO(shb() + block(1, b"\x01\x00"))))
+
+
+class StageTests(SimpleTestCase):
+    """Queue policies of a stage whose workers never run, so its queue only fills."""
+
+    def queued(self, stage):
+        return list(stage.queue.queue)
+
+    def test_block_waits_for_room(self):
+        stage = Stage("persist", None, maxsize=2)
+        self.assertTrue(stage.put(1) and stage.put(2))
+        producer = threading.Thread(target=stage.put, args=(3,))
+        producer.start()
+        producer.join(0.1)
+        self.assertTrue(producer.is_alive())  # back-pressure, not a drop
+        self.assertEqual(stage.queue.get(), 1)
+        producer.join(5)
+        self.assertEqual(self.queued(stage), [2, 3])
+        self.assertEqual((stage.received, stage.dropped), (3, 0))
+
+    def test_drop_oldest_keeps_the_newest(self):
+        stage = Stage("persist", None, maxsize=3, policy=DROP_OLDEST)
+        self.assertTrue(all(stage.put(i) for i in range(5)))
+        self.assertEqual(self.queued(stage), [2, 3, 4])
+        self.assertEqual((stage.received, stage.dropped), (5, 2))
+
+    def test_sample_admits_one_in_n_above_the_watermark(self):
+        stage = Stage("persist", None, maxsize=100, policy=SAMPLE, sample_rate=5, high_watermark=0.1)
+        admitted = [stage.put(i) for i in range(30)]
+        self.assertTrue(all(admitted[:10]))  # below the watermark of 10
+        self.assertEqual(admitted[10:].count(True), 4)
+        self.assertEqual(self.queued(stage)[10:], [14, 19, 24, 29])
+        self.assertEqual((stage.received, stage.dropped), (30, 16))
+
+        # Back under the watermark: every item is admitted and the count starts over
+        while stage.queue.qsize() > 5:
+            stage.queue.get()
+        self.assertTrue(stage.put(30))
+        self.assertEqual(stage._seen_while_saturated, 0)
+
+    def test_full_queue_drops_under_sample(self):
+        stage = Stage("persist", None, maxsize=2, policy=SAMPLE, sample_rate=1)
+        self.assertEqual([stage.put(i) for i in range(3)], [True, True, False])
+        self.assertEqual(stage.dropped, 1)
+
+
+class PipelineProcessTests(SimpleTestCase):
+    def test_failing_item_is_counted_and_skipped(self):
+        def parse(item):
+            if item == "bad":
+                raise ValueError("undecodable")
+            return item
+
+        seen = []
+        pipeline = Pipeline([Stage("parse", parse), Stage("persist", seen.append)])
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            for item in ("a", "bad", "b"):
+                pipeline.process(item)
+        self.assertEqual(seen, ["a", "b"])
+        parse_stats, persist_stats = (stage.stats() for stage in pipeline.stages)
+        self.assertEqual((parse_stats["received"], parse_stats["processed"], parse_stats["errors"]), (3, 2, 1))
+        self.assertEqual((persist_stats["received"], persist_stats["processed"]), (2, 2))
+
+
+# ------------------ flows ------------------
+class FlowTableTests(SimpleTestCase):
+    def setUp(self):
+        self.closed = []
+        self.table = FlowTable(self.on_close, idle_timeout=30, active_timeout=300)
+
+    def on_close(self, flow):
+        self.assertFalse(self.table._lock.locked())  # other threads keep adding meanwhile
+        self.closed.append(flow)
+
+    def add(self, seconds, length=100, src="10.0.0.1", sport=1234, weight=1):
+        self.table.add(PacketRecord(T0 + timedelta(seconds=seconds), src, "10.0.0.2", 6, length, sport, 80,
+                                    weight=weight))
+
+    def totals(self, flow):
+        return flow.source_ip, flow.packets, flow.bytes_transferred, flow.first_seen, flow.last_seen
+
+    def test_idle_flows_close_on_sweep(self):
+        self.add(0, 100)
+        self.add(5, 50)
+        self.add(20, 10, src="10.0.0.3")
+        self.table.sweep(T0 + timedelta(seconds=34))
+        self.assertEqual(self.closed, [])
+        self.table.sweep(T0 + timedelta(seconds=35))
+        self.assertEqual([self.totals(flow) for flow in self.closed],
+                         [("10.0.0.1", 2, 150, T0, T0 + timedelta(seconds=5))])
+        self.assertEqual(len(self.table), 1)
+
+        self.add(60, 10, src="10.0.0.4")  # a later packet sweeps too
+        self.assertEqual([flow.source_ip for flow in self.closed], ["10.0.0.1", "10.0.0.3"])
+
+    def test_long_flows_close_in_active_timeout_slices(self):
+        for seconds in range(0, 320, 10):
+            self.add(seconds)
+        self.assertEqual([self.totals(flow) for flow in self.closed],
+                         [("10.0.0.1", 31, 3100, T0, T0 + timedelta(seconds=300))])
+        self.assertEqual(len(self.table), 1)  # the packet at 310 s opened the next slice
+
+    def test_close_all_and_sampled_weights(self):
+        self.add(0, 100, weight=4)
+        self.add(1, 100, weight=4)
+        self.add(2, 60, sport=1235)
+        self.table.close_all()
+        self.assertEqual(sorted((flow.source_port, flow.packets, flow.bytes_transferred) for flow in self.closed),
+                         [(1234, 8, 800), (1235, 1, 60)])
+        self.assertEqual(self.table.stats(), {"active_flows": 0, "packets_seen": 3, "flows_closed": 2})
+
+
+# ------------------ sampling ------------------
+class SamplerTests(SimpleTestCase):
+    def record(self, i, reply=False):
+        ends = [(f"10.0.{i % 50}.1", 1000 + i % 50), ("10.1.0.1", 80)]
+        (src, sport), (dst, dport) = ends[::-1] if reply else ends
+        return PacketRecord(T0, src, dst, 6, 100, sport, dport)
+
+    def test_count_sampling_keeps_one_in_n_with_weight_n(self):
+        sampler = Sampler(COUNT, 8)
+        weights = [sampler.weight(self.record(i)) for i in range(800)]
+        self.assertEqual(weights.count(8), 100)
+        self.assertEqual(set(weights), {0, 8})
+
+    def test_flow_sampling_keeps_whole_conversations(self):
+        sampler = Sampler(FLOW, 4)
+        kept = {}
+        for i in range(400):
+            kept.setdefault(i % 50, set()).add(bool(sampler.weight(self.record(i, reply=i % 3 == 0))))
+        self.assertTrue(all(len(decisions) == 1 for decisions in kept.values()))  # both directions alike
+        self.assertTrue(0 < sum(True in decisions for decisions in kept.values()) < 50)
+
+    def test_counters_are_exact_across_threads(self):
+        sampler = Sampler(COUNT, 3)
+        kept = []
+
+        def work():
+            kept.append(sum(1 for i in range(20000) if sampler.weight(self.record(i))))
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((sampler.seen, sampler.kept), (80000, sum(kept)))
+        self.assertEqual(sampler.kept, 80000 // 3)
+
+
+# ------------------ alerts ------------------
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+T0 = datetime(2026, 10, 1, 12, 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class AlertEmitterTests(TestCase):
+    def setUp(self):
+        # The timer never fires during a test; the tests flush themselves
+        self.emitter = alerts.AlertEmitter(window=300, flush_interval=3600)
+
+    def tearDown(self):
+        self.emitter.close()
+
+    def emit(self, when, ip="10.0.0.1", kind=alerts.PORT_SCAN, severity="Medium", emitter=None):
+        (emitter or self.emitter).emit(kind, ip, severity, f"{kind} from {ip}", when=when)
+
+    def assertCountersExact(self):
+        self.assertEqual(counters.get(counters.ALERTS), Alert.objects.count())
+        for severity, _ in Alert.SEVERITY_CHOICES:
+            self.assertEqual(counters.get(counters.severity_counter(severity)),
+                             Alert.objects.filter(severity=severity).count())
+
+    def test_repeats_in_one_flush_make_one_row(self):
+        for seconds in (30, 0, 10):
+            self.emit(T0 + timedelta(seconds=seconds))
+        self.emit(T0, ip="10.0.0.2")
+        self.assertEqual(self.emitter.flush(), 2)
+        alert = Alert.objects.get(ip="10.0.0.1")
+        self.assertEqual((alert.count, alert.first_seen, alert.last_seen), (3, T0, T0 + timedelta(seconds=30)))
+        self.assertCountersExact()
+
+    def test_coalesces_inside_the_window_only(self):
+        self.emit(T0)
+        self.emitter.flush()
+        self.emit(T0 + timedelta(seconds=299))
+        self.emitter.flush()
+        self.assertEqual(list(Alert.objects.values_list("count", flat=True)), [2])
+
+        # More than a window after the last occurrence: a new row
+        self.emit(T0 + timedelta(seconds=299 + 301))
+        self.emitter.flush()
+        self.assertEqual(list(Alert.objects.order_by("id").values_list("count", flat=True)), [2, 1])
+        self.assertCountersExact()
+
+    def test_severity_change_moves_the_counters(self):
+        self.emit(T0, severity="Medium")
+        self.emitter.flush()
+        self.emit(T0 + timedelta(seconds=5), severity="High")
+        self.emitter.flush()
+        self.assertEqual(Alert.objects.get().severity, "High")
+        self.assertCountersExact()
+
+    def test_reviewed_alerts_are_not_reopened(self):
+        self.emit(T0)
+        self.emitter.flush()
+        alert = Alert.objects.get()
+        alert.reviewed = True
+        alert.save()
+        self.emit(T0 + timedelta(seconds=5))
+        self.emitter.flush()
+        self.assertEqual(Alert.objects.filter(reviewed=False).count(), 1)
+        self.assertEqual(Alert.objects.count(), 2)
+        self.assertCountersExact()
+        self.assertEqual(counters.get(counters.ALERTS_REVIEWED), 1)
+
+    def test_rows_of_other_processes_are_extended(self):
+        self.emit(T0)
+        self.emitter.flush()
+        other = alerts.AlertEmitter(window=300, flush_interval=3600)
+        try:
+            self.emit(T0 + timedelta(seconds=60), emitter=other)
+            other.flush()
+        finally:
+            other.close()
+        self.assertEqual(list(Alert.objects.values_list("count", flat=True)), [2])
+
+    def test_failed_write_is_retried(self):
+        self.emit(T0)
+        self.emitter.flush()
+        self.emit(T0 + timedelta(seconds=10))
+        self.emit(T0 + timedelta(seconds=20), ip="10.0.0.2")
+
+        def locked(batch):
+            self.emit(T0 + timedelta(seconds=30))  # arrives while the failing write runs
+            raise OperationalError("database is locked")
+
+        with mock.patch.object(self.emitter, "write", side_effect=locked), \
+                contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            self.assertEqual(self.emitter.flush(), 0)
+        stats = self.emitter.stats()
+        self.assertEqual((stats["pending"], stats["failed"]), (2, 2))
+
+        self.assertEqual(self.emitter.flush(), 2)
+        self.assertEqual(dict(Alert.objects.values_list("ip", "count")), {"10.0.0.1": 3, "10.0.0.2": 1})
+        first = Alert.objects.get(ip="10.0.0.1")
+        self.assertEqual((first.first_seen, first.last_seen), (T0, T0 + timedelta(seconds=30)))
+        self.assertCountersExact()
+
+    def test_distinct_alerts_beyond_max_pending_are_suppressed(self):
+        emitter = alerts.AlertEmitter(window=300, flush_interval=3600, max_pending=2)
+        try:
+            for ip in ("10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.0.1"):
+                self.emit(T0, ip=ip, emitter=emitter)
+            self.assertEqual(emitter.stats()["suppressed"], 1)
+            emitter.flush()
+        finally:
+            emitter.close()
+        self.assertEqual(dict(Alert.objects.values_list("ip", "count")), {"10.0.0.1": 2, "10.0.0.2": 1})
+
+
+# ------------------ streaming windows ------------------
+class BytesRule(WindowRule):
+    """30 one-second buckets, alerting at 100 bytes."""
+    kind = alerts.HIGH_TRAFFIC
+
+    def __init__(self):
+        super().__init__(timedelta(seconds=30), 100)
+
+    def value(self, record):
+        return record.size
+
+    def message(self, src, total):
+        return f"{src}: {total}"
+
+
+def row(seconds, size=10, src="10.0.0.1", dst="10.0.0.2"):
+    return StoredRow(T0 + timedelta(seconds=seconds), src, dst, 6, size, 1)
+
+
+class RingTests(SimpleTestCase):
+    def test_sum_ring_expires_old_buckets(self):
+        ring = SumRing(3, 10)
+        self.assertEqual(ring.add(10, 5), 5)
+        self.assertEqual(ring.add(11, 7), 12)
+        self.assertEqual(ring.add(12, 1), 13)
+        self.assertEqual(ring.add(13, 2), 10)   # bucket 10 left the window
+        self.assertEqual(ring.add(12, 4), 14)   # late, still inside
+        self.assertEqual(ring.add(10, 100), 14)  # late, outside: ignored
+        self.assertEqual(ring.add(100, 1), 1)   # a long gap empties the ring
+        self.assertEqual(ring.total, 1)
+
+    def test_sum_ring_state_round_trip(self):
+        ring = SumRing(4, 0)
+        for bucket, value in ((0, 1), (1, 2), (3, 4)):
+            ring.add(bucket, value)
+        restored = SumRing.from_state(ring.to_state())
+        self.assertEqual(restored.total, 7)
+        self.assertEqual(restored.add(5, 1), ring.add(5, 1))
+
+    def test_distinct_ring_counts_each_item_once(self):
+        ring = DistinctRing(3, 0)
+        self.assertEqual(ring.add(0, "a"), 1)
+        self.assertEqual(ring.add(0, "a"), 1)
+        self.assertEqual(ring.add(1, "a"), 1)
+        self.assertEqual(ring.add(1, "b"), 2)
+        self.assertEqual(ring.add(3, "c"), 3)   # bucket 0 expired, "a" still in bucket 1
+        self.assertEqual(ring.add(4, "d"), 2)   # bucket 1 expired: "a" and "b" gone
+        restored = DistinctRing.from_state(ring.to_state())
+        self.assertEqual(restored.total, 2)
+        self.assertEqual(restored.refs, ring.refs)
+
+
+class WindowRuleTests(SimpleTestCase):
+    def test_fires_once_and_rearms_below_half(self):
+        rule = BytesRule()
+        fired = [rule.observe(r, r.timestamp.timestamp()) for r in (row(0, 60), row(1, 60), row(2, 60))]
+        self.assertIsNone(fired[0])
+        self.assertEqual(fired[1][:2], (alerts.HIGH_TRAFFIC, "10.0.0.1"))
+        self.assertIsNone(fired[2])  # still over: edge-triggered
+
+        # 40 bytes in the window: under half the threshold, so it re-arms
+        self.assertIsNone(rule.observe(row(40, 40), T0.timestamp() + 40))
+        self.assertIsNotNone(rule.observe(row(41, 70), T0.timestamp() + 41))
+        self.assertEqual(rule.fired, 2)
+
+    def test_sweep_forgets_idle_sources(self):
+        rule = BytesRule()
+        rule.observe(row(0, src="10.0.0.1"), T0.timestamp())
+        rule.observe(row(25, src="10.0.0.2"), T0.timestamp() + 25)
+        rule.sweep(T0.timestamp() + 40)
+        self.assertEqual(set(rule.rings), {"10.0.0.2"})
+
+    def test_state_round_trip(self):
+        rule = BytesRule()
+        rule.observe(row(0, 150), T0.timestamp())
+        restored = BytesRule()
+        self.assertTrue(restored.load_state(rule.to_state()))
+        self.assertEqual(restored.firing, {"10.0.0.1"})
+        self.assertIsNone(restored.observe(row(1, 10), T0.timestamp() + 1))  # already firing
+        self.assertFalse(BytesRule().load_state({**rule.to_state(), "size": 10}))  # other layout
+
+    def test_detector_attaches_alerts_to_records(self):
+        class Record:
+            def __init__(self, seconds, size):
+                self.timestamp, self.src, self.dst, self.proto = T0 + timedelta(seconds=seconds), "10.0.0.9", "x", 6
+                self.size, self.packets, self.alerts = size, 1, []
+
+        detector = StreamingDetector([BytesRule()])
+        records = [detector(Record(i, 40)) for i in range(3)]
+        self.assertEqual([len(r.alerts) for r in records], [0, 0, 1])
+        self.assertEqual(detector.stats()["observed"], 3)
+
+
+# ------------------ packed addresses ------------------
+class PackedIPFieldTests(TestCase):
+    ADDRESSES = ["10.0.0.1", "192.0.2.255", "2001:db8::1", "::ffff:10.0.0.1", "fe80::1"]
+
+    def test_round_trip(self):
+        field = NetworkLog._meta.get_field("source_ip")
+        for ip in self.ADDRESSES:
+            packed = field.get_prep_value(ip)
+            self.assertEqual(len(packed), 4 if ":" not in ip else 16)
+            self.assertEqual(field.to_python(packed), str(ipaddress.ip_address(ip)))
+            log = NetworkLog.objects.create(timestamp=T0, source_ip=ip, destination_ip="2001:DB8::2",
+                                            protocol=17, bytes_transferred=1)
+            log.refresh_from_db()
+            self.assertEqual((log.source_ip, log.destination_ip), (str(ipaddress.ip_address(ip)), "2001:db8::2"))
+        self.assertIsNone(field.get_prep_value(None))
+
+    def test_filters_by_address(self):
+        for i, ip in enumerate(["10.0.0.1", "10.0.0.2", "10.0.0.10", "2001:db8::1", "10.0.0.1"]):
+            NetworkLog.objects.create(timestamp=T0 + timedelta(seconds=i), source_ip=ip, destination_ip="10.9.9.9",
+                                      protocol=6, bytes_transferred=1)
+        logs = NetworkLog.objects.order_by("timestamp")
+        self.assertEqual(logs.filter(source_ip="10.0.0.1").count(), 2)
+        self.assertEqual(logs.filter(source_ip="2001:db8:0::1").count(), 1)  # any spelling of the address
+        self.assertEqual(list(logs.filter(source_ip__in=["10.0.0.2", "2001:db8::1"])
+                              .values_list("source_ip", flat=True)), ["10.0.0.2", "2001:db8::1"])
+        # Within a family bytes order like addresses: 10.0.0.2 < 10.0.0.10
+        in_range = logs.filter(source_ip__gte="10.0.0.2", source_ip__lte="10.0.0.10")
+        self.assertEqual(sorted(in_range.values_list("source_ip", flat=True)), ["10.0.0.10", "10.0.0.2"])
+        self.assertEqual(logs.filter(destination_ip="10.9.9.9").count(), 5)
+
+
+class CompactSchemaMigrationTests(TransactionTestCase):
+    """Migration 0011 converts old text columns in chunks."""
+
+    migration = importlib.import_module("monitor.migrations.0011_compact_log_schema")
+    before = [("monitor", "0010_networklog_partitioning"), ("threatintel", "0003_threatip_ip_network")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_old_rows_are_converted_in_chunks(self):
+        old_apps = self.migrate(self.before)
+        OldLog = old_apps.get_model("monitor", "NetworkLog")
+        rows = [(" 10.0.0.1", "2001:DB8::1", "TCP"), ("10.0.0.2", "bogus", "17"), ("10.0.0.3", "", "icmp"),
+                ("10.0.0.4", "10.0.0.5", "GRE")]
+        OldLog.objects.bulk_create([
+            OldLog(timestamp=T0 + timedelta(seconds=i), source_ip=src, destination_ip=dst, protocol=protocol,
+                   bytes_transferred=1)
+            for i, (src, dst, protocol) in enumerate(rows)
+        ])
+
+        with mock.patch.object(self.migration, "CHUNK_SIZE", 3), \
+                mock.patch.object(self.migration, "transaction", wraps=transaction) as chunks:
+            self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+        self.assertEqual(chunks.atomic.call_count, 2)  # 4 logs, 3 per chunk; no flows
+        self.assertEqual(
+            list(NetworkLog.objects.order_by("timestamp").values_list("source_ip", "destination_ip", "protocol")),
+            [("10.0.0.1", "2001:db8::1", 6), ("10.0.0.2", "0.0.0.0", 17), ("10.0.0.3", "0.0.0.0", 1),
+             ("10.0.0.4", "10.0.0.5", 0)],
+        )
+        self.assertEqual(NetworkLog.objects.filter(source_ip="10.0.0.2").count(), 1)
+
+
+# ------------------ rollups ------------------
+class RollupTests(TestCase):
+    def setUp(self):
+        rng = random.Random(14)
+        self.logs = [
+            NetworkLog(timestamp=T0 + timedelta(seconds=rng.randrange(3 * 3600)),
+                       source_ip=f"10.0.0.{rng.randrange(5)}", destination_ip="192.0.2.1",
+                       protocol=rng.choice((6, 17)), bytes_transferred=rng.randrange(40, 1500),
+                       packets=rng.randrange(1, 4))
+            for _ in range(500)
+        ]
+        rollups.upsert(rollups.aggregate(self.logs[:300]))
+        rollups.upsert(rollups.aggregate(self.logs[300:]))  # a second batch adds to the same rows
+
+    def expected(self, dimension=rollups.TOTAL):
+        keys = {rollups.TOTAL: lambda log: "", rollups.SOURCE: lambda log: log.source_ip,
+                rollups.PROTOCOL: lambda log: str(log.protocol)}[dimension]
+        sums = {}
+        for log in self.logs:
+            packets, size = sums.get(keys(log), (0, 0))
+            sums[keys(log)] = (packets + log.packets, size + log.bytes_transferred)
+        return sums
+
+    def totals(self, dimension=rollups.TOTAL):
+        return {row["item"]: (row["packets"], row["bytes"]) for row in rollups.totals(dimension)}
+
+    def resolutions(self):
+        return set(TrafficRollup.objects.values_list("resolution", flat=True))
+
+    def test_compaction_keeps_the_totals(self):
+        for dimension in (rollups.TOTAL, rollups.SOURCE, rollups.PROTOCOL):
+            self.assertEqual(self.totals(dimension), self.expected(dimension))
+
+        # Seconds older than an hour fold into minutes
+        folded = rollups.compact(now=T0 + timedelta(hours=2, minutes=30))
+        self.assertGreater(folded[rollups.SECOND], 0)
+        self.assertEqual(self.resolutions(), {rollups.SECOND, rollups.MINUTE})
+        self.assertFalse(TrafficRollup.objects.filter(
+            resolution=rollups.SECOND, bucket__lt=T0 + timedelta(hours=1, minutes=30)).exists())
+        for dimension in (rollups.TOTAL, rollups.SOURCE, rollups.PROTOCOL):
+            self.assertEqual(self.totals(dimension), self.expected(dimension))
+
+        # Days later everything is in hour rows
+        rollups.compact(now=T0 + timedelta(days=3))
+        self.assertEqual(self.resolutions(), {rollups.HOUR})
+        self.assertEqual(TrafficRollup.objects.filter(dimension=rollups.TOTAL).count(), 3)
+        for dimension in (rollups.TOTAL, rollups.SOURCE, rollups.PROTOCOL):
+            self.assertEqual(self.totals(dimension), self.expected(dimension))
+
+    def test_series_sums_buckets_and_fills_gaps(self):
+        since, until = T0 - timedelta(minutes=10), T0 + timedelta(hours=3, minutes=10)
+        before = rollups.series(since, until, step=rollups.MINUTE)
+        self.assertEqual(len(before), 200)
+        self.assertEqual([point[0] for point in before[:2]], [since, since + timedelta(minutes=1)])
+        self.assertEqual(before[:10], [(since + timedelta(minutes=i), 0, 0) for i in range(10)])
+        self.assertEqual(sum(point[1] for point in before), self.expected()[""][0])
+        self.assertEqual(sum(point[2] for point in before), self.expected()[""][1])
+
+        rollups.compact(now=T0 + timedelta(hours=2, minutes=30))
+        self.assertEqual(rollups.series(since, until, step=rollups.MINUTE), before)
+
+        hours = rollups.series(T0, T0 + timedelta(hours=4), step=rollups.HOUR)
+        self.assertEqual(len(hours), 4)
+        self.assertEqual(hours[3], (T0 + timedelta(hours=3), 0, 0))
+        self.assertEqual(sum(point[2] for point in hours), self.expected()[""][1])
+
+
+# ------------------ sketches ------------------
+class SketchTests(SimpleTestCase):
+    def test_hyperloglog_estimates_and_merges(self):
+        hosts = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(20000)]
+        a = HyperLogLog().update(hosts[:12000])
+        b = HyperLogLog().update(hosts[8000:])
+        self.assertAlmostEqual(a.count(), 12000, delta=12000 * 0.05)
+        self.assertAlmostEqual(a.merge(b).count(), 20000, delta=20000 * 0.05)
+        self.assertEqual(HyperLogLog().update(hosts[:50]).count(), 50)  # linear counting is exact-ish
+        self.assertEqual(HyperLogLog.from_bytes(a.to_bytes()).count(), a.count())
+        self.assertEqual(a.merge(HyperLogLog().update(hosts[:100])).count(), a.count())  # idempotent
+        with self.assertRaises(ValueError):
+            a.merge(HyperLogLog(p=10))
+
+    def test_space_saving_bounds(self):
+        rng = random.Random(7)
+        halves = [Counter(), Counter()]
+        for i in range(5000):
+            src = f"h{min(int(rng.paretovariate(1.2)), 500)}"
+            halves[i % 2][src] += rng.randrange(60, 1500)
+        truth = halves[0] + halves[1]
+
+        merged = SpaceSaving.from_counter(halves[0], k=20).merge(SpaceSaving.from_counter(halves[1], k=20))
+        self.assertEqual(len(merged.counts), 20)
+        for item, estimate in merged.counts.items():
+            self.assertLessEqual(truth[item], estimate)
+            self.assertLessEqual(estimate, truth[item] + merged.floor)
+        # Anything heavier than the floor is listed
+        for item, count in truth.items():
+            if count > merged.floor:
+                self.assertIn(item, merged.counts)
+        self.assertEqual(merged.top(1)[0][0], truth.most_common(1)[0][0])
+
+    def test_space_saving_small_inputs_are_exact(self):
+        counts = Counter({"a": 5, "b": 3})
+        sketch = SpaceSaving.from_counter(counts, k=5).merge(SpaceSaving.from_counter(Counter({"a": 1}), k=5))
+        self.assertEqual((sketch.counts, sketch.floor), ({"a": 6, "b": 3}, 0))
+        restored = SpaceSaving.from_dict(sketch.to_dict())
+        self.assertEqual((restored.counts, restored.floor, restored.k), (sketch.counts, 0, 5))
+
+
+class SketchRecorderTests(TestCase):
+    def test_summaries_over_minutes_and_hours(self):
+        recorder = SketchRecorder()
+        exact = Counter()
+        for minute in range(0, 150, 3):   # 12:00 to 14:27
+            for host in range(minute % 7 + 1):
+                when = T0 + timedelta(minutes=minute, seconds=host)
+                recorder.add(when, f"10.0.0.{host}", 100 * (host + 1))
+                exact[(when, f"10.0.0.{host}")] += 100 * (host + 1)
+            if minute == 60:
+                recorder.flush()  # two flushes merge into the same rows
+        recorder.flush()
+
+        def expected(since, until):
+            talkers = Counter()
+            for (when, src), size in exact.items():
+                if since <= when < until:
+                    talkers[src] += size
+            return talkers
+
+        ranges = [(0, 180), (7, 139), (30, 40)]  # minutes after T0: whole hours, ragged edges, inside one hour
+        for since, until in ((T0 + timedelta(minutes=a), T0 + timedelta(minutes=b)) for a, b in ranges):
+            summary = traffic_summary(since, until)
+            talkers = expected(since, until)
+            self.assertEqual(summary.bytes, sum(talkers.values()))
+            self.assertEqual(summary.unique_sources(), len(talkers))
+            self.assertEqual(dict(summary.top_talkers(10)), dict(talkers))
+        self.assertEqual(traffic_summary().packets, len(exact))
+
+    def test_failed_flush_is_retried(self):
+        recorder = SketchRecorder(flush_interval=3600)
+        recorder.add(T0, "10.0.0.1", 100)
+        recorder.add(T0 + timedelta(minutes=1), "10.0.0.2", 50)
+
+        def locked(pending):
+            recorder.add(T0, "10.0.0.1", 10)  # arrives while the failing write runs
+            raise OperationalError("database is locked")
+
+        with mock.patch.object(recorder, "write", side_effect=locked), \
+                contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            self.assertEqual(recorder.flush(), 0)
+        self.assertEqual((recorder.stats()["pending_minutes"], recorder.stats()["failed"]), (2, 1))
+
+        self.assertEqual(recorder.flush(), 2)
+        summary = traffic_summary()
+        self.assertEqual((summary.packets, summary.bytes), (3, 160))
+        self.assertEqual(dict(summary.top_talkers(10)), {"10.0.0.1": 110, "10.0.0.2": 50})
+
+
+# ------------------ incremental detection ------------------
+def runner_lag():
+    return RuleRunner(BytesRule(), SOURCES["packets"]).lag
+
+
+class RuleRunnerTests(TestCase):
+    def log(self, when, size=1, **fields):
+        return NetworkLog.objects.create(timestamp=when, source_ip="10.0.0.1", destination_ip="10.0.0.2",
+                                         protocol=6, bytes_transferred=size, **fields)
+
+    def run_rule(self, chunk_size=1000):
+        runner = RuleRunner(BytesRule(), SOURCES["packets"], chunk_size=chunk_size).load()
+        return runner.run(), runner
+
+    def test_new_rule_starts_at_its_window(self):
+        now = datetime.now()
+        self.log(now - timedelta(days=1))
+        self.log(now - timedelta(seconds=10) - runner_lag())  # inside BytesRule's 30 s window
+        result, _ = self.run_rule()
+        self.assertEqual(result["rows"], 1)
+
+    def test_rows_inside_the_lag_wait_for_a_later_tick(self):
+        now = datetime.now()
+        self.log(now - timedelta(seconds=20) - runner_lag())
+        recent = self.log(now - timedelta(seconds=5))
+        self.assertEqual(self.run_rule()[0]["rows"], 1)
+
+        NetworkLog.objects.filter(id=recent.id).update(timestamp=now - timedelta(seconds=10) - runner_lag())
+        result, runner = self.run_rule()
+        self.assertEqual(result["rows"], 1)
+        self.assertEqual(runner.state.last_id, recent.id)
+        self.assertEqual(self.run_rule()[0]["rows"], 0)  # nothing is read twice
+
+    def test_equal_timestamps_across_chunks(self):
+        when = datetime.now() - timedelta(seconds=20) - runner_lag()
+        for _ in range(5):
+            self.log(when)
+        result, _ = self.run_rule(chunk_size=2)
+        self.assertEqual(result["rows"], 5)
+        self.assertEqual(self.run_rule(chunk_size=2)[0]["rows"], 0)
+
+    def test_lower_id_committed_late_is_not_skipped(self):
+        base = datetime.now() - timedelta(seconds=25) - runner_lag()
+        self.log(base, id=100)
+        self.assertEqual(self.run_rule()[0]["rows"], 1)
+        # A writer that took id 50 before id 100 commits after the tick
+        self.log(base + timedelta(seconds=1), id=50)
+        self.assertEqual(self.run_rule()[0]["rows"], 1)
+
+    def test_restart_resumes_from_the_saved_watermark_and_windows(self):
+        when = datetime.now() - timedelta(seconds=20) - runner_lag()
+        self.log(when, size=60)
+        self.run_rule()
+        self.log(when + timedelta(seconds=1), size=60)
+        with mock.patch.object(alerts.emitter, "emit") as emit:
+            result, _ = self.run_rule()
+        # The first row's bytes came back with the saved window
+        self.assertEqual((result["rows"], result["alerts"]), (1, 1))
+        self.assertEqual(emit.call_args.args[:2], (alerts.HIGH_TRAFFIC, "10.0.0.1"))
+
+
+class BaselineRunnerTests(TestCase):
+    def test_sources_keep_separate_state(self):
+        self.assertEqual(str(source_path("flows", "/data/baselines.npz")), "/data/baselines-flows.npz")
+        self.assertEqual(BaselineRunner(SOURCES["packets"]).path, source_path("packets"))
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        runners = [BaselineRunner(SOURCES[name], path=source_path(name, os.path.join(directory, "baselines.npz")))
+                   for name in ("packets", "flows")]
+        for runner in runners:
+            runner.load().run()
+            self.assertTrue(os.path.exists(runner.path))
+        runners[0].reset()
+        self.assertFalse(os.path.exists(runners[0].path))
+        self.assertTrue(os.path.exists(runners[1].path))
+        self.assertEqual(list(DetectorState.objects.values_list("name", flat=True)), ["flows:baseline"])
+
+
+# ------------------ batched writes ------------------
+def log_row(i=0, when=None):
+    return NetworkLog(timestamp=when or T0, source_ip=f"10.0.0.{i % 250}", destination_ip="192.0.2.1",
+                      protocol=6, bytes_transferred=100)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class BatchWriterTests(TestCase):
+    def quietly(self):
+        stack = contextlib.ExitStack()
+        stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+        stack.enter_context(contextlib.redirect_stderr(io.StringIO()))
+        return stack
+
+    def test_full_buffer_is_written(self):
+        writer = BatchWriter(batch_size=3, max_latency=3600, backend="orm")
+        writer.extend(log_row(i) for i in range(2))
+        self.assertEqual((writer.pending(), NetworkLog.objects.count()), (2, 0))
+        writer.add(log_row(2))
+        self.assertEqual((writer.pending(), NetworkLog.objects.count()), (0, 3))
+        self.assertEqual(writer.stats()["flushes"], 1)
+
+    def test_old_rows_are_flushed_by_the_timer(self):
+        writer = BatchWriter(batch_size=1000, max_latency=0.05, backend="orm")
+        flushed = threading.Event()
+        with mock.patch.object(writer, "flush", side_effect=lambda: flushed.set() or 1):
+            writer.start()
+            writer.add(log_row())
+            self.assertTrue(flushed.wait(5))
+            writer.close()
+
+    def test_close_drains_the_buffer(self):
+        writer = BatchWriter(batch_size=1000, max_latency=3600, backend="orm")
+        writer.extend(log_row(i) for i in range(5))
+        writer.close()
+        self.assertEqual(NetworkLog.objects.count(), 5)
+        self.assertEqual(writer.stats()["rows_pending"], 0)
+
+    def test_failed_batch_is_retried_in_order(self):
+        writer = BatchWriter(batch_size=2, max_latency=3600, backend="orm", retry_backoff=3600)
+        write = writer.write
+        with mock.patch.object(writer, "write", side_effect=[OperationalError("database is locked"), mock.DEFAULT],
+                               wraps=write), self.quietly():
+            writer.extend(log_row(i) for i in range(2))
+            self.assertEqual(NetworkLog.objects.count(), 0)
+            # Backing off: a full buffer waits instead of hammering the database
+            writer.extend(log_row(i) for i in range(2, 5))
+            stats = writer.stats()
+            self.assertEqual((stats["rows_pending"], stats["rows_failed"], stats["retries"]), (5, 0, 1))
+
+            writer._retry_at = 0  # the backoff is over
+            self.assertEqual(writer.flush(), 5)
+        self.assertEqual(list(NetworkLog.objects.order_by("id").values_list("source_ip", flat=True)),
+                         [f"10.0.0.{i}" for i in range(5)])
+        self.assertEqual(counters.get(counters.rows_counter(NetworkLog)), 5)
+
+    def test_batch_is_dropped_after_the_last_retry(self):
+        writer = BatchWriter(batch_size=1000, max_latency=3600, backend="orm", max_retries=2, retry_backoff=0)
+        writer.extend(log_row(i) for i in range(4))
+        with mock.patch.object(writer, "write", side_effect=OperationalError("database is locked")) as write, \
+                self.quietly():
+            writer.close()
+        self.assertEqual(write.call_count, 3)
+        stats = writer.stats()
+        self.assertEqual((stats["rows_pending"], stats["rows_failed"], stats["retries"]), (0, 4, 2))
+        self.assertEqual(NetworkLog.objects.count(), 0)
+
+
+class IngestBackendTests(TestCase):
+    def test_copy_text_escapes(self):
+        self.assertEqual(_copy_text(None), "\\N")
+        self.assertEqual(_copy_text("a\tb\nc\\d"), "a\\tb\\nc\\\\d")
+        self.assertEqual(_copy_text(b"\x0a\x00\x00\x01"), "\\\\x0a000001")
+        self.assertEqual(_copy_text(T0 + timedelta(microseconds=5)), "2026-10-01 12:00:00.000005")
+        self.assertEqual(_copy_text(1500), "1500")
+
+    def test_sqlite_backend_round_trip(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite only")
+        logs = [log_row(i, T0 + timedelta(seconds=i)) for i in range(3)]
+        logs.append(NetworkLog(timestamp=T0, source_ip="2001:db8::1", destination_ip="10.0.0.2", protocol=58,
+                               bytes_transferred=80, packets=3))
+        SqliteBackend().write(NetworkLog, logs, batch_size=2)
+        self.assertEqual(
+            list(NetworkLog.objects.order_by("id").values_list("timestamp", "source_ip", "protocol", "packets")),
+            [(log.timestamp, log.source_ip, log.protocol, log.packets) for log in logs],
+        )
+
+
+# ------------------ retention ------------------
+@override_settings(CACHES=LOCMEM_CACHE)
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.today = date.today()
+        self.midnight = datetime.combine(self.today, datetime.min.time())
+        for days in (45, 31, 30, 29, 0):
+            when = self.midnight - timedelta(days=days)
+            for i in range(4):
+                NetworkLog.objects.create(timestamp=when + timedelta(seconds=i), source_ip="10.0.0.1",
+                                          destination_ip="10.0.0.2", protocol=6, bytes_transferred=10)
+            Flow.objects.create(first_seen=when, last_seen=when, source_ip="10.0.0.1", destination_ip="10.0.0.2",
+                                protocol=6, bytes_transferred=10)
+        counters.rebuild()
+
+    def remaining_days(self):
+        stamps = NetworkLog.objects.values_list("timestamp", flat=True)
+        return sorted({(self.today - when.date()).days for when in stamps})
+
+    def test_delete_chunked_stops_at_the_cutoff(self):
+        cutoff = self.midnight - timedelta(days=30)
+        with mock.patch("monitor.partitions.time.sleep") as sleep:
+            self.assertEqual(partitions.delete_chunked(NetworkLog, "timestamp", cutoff, chunk=3, pause=0.01), 8)
+        self.assertEqual(sleep.call_count, 3)  # chunks of 3, 3 and 2
+        self.assertEqual(self.remaining_days(), [0, 29, 30])  # a row exactly at the cutoff stays
+        self.assertEqual(counters.get(counters.rows_counter(NetworkLog)), NetworkLog.objects.count())
+
+    def test_apply_retention_without_partitions(self):
+        summary = partitions.apply_retention(retention_days=30, today=self.today)
+        self.assertEqual((summary["partitioned"], summary["deleted"], summary["flows_deleted"]), (False, 8, 2))
+        self.assertEqual(self.remaining_days(), [0, 29, 30])
+        self.assertEqual(Flow.objects.count(), 3)
+
+        self.assertEqual(partitions.apply_retention(retention_days=0, today=self.today)["deleted"], 0)
+        self.assertEqual(NetworkLog.objects.count(), 12)
+
+    def test_manage_partitions_command(self):
+        out = io.StringIO()
+        call_command("manage_partitions", "--retention-days", "30", stdout=out)
+        self.assertIn("0 partitions dropped, 8 logs and 2 flows deleted", out.getvalue())
+        self.assertEqual(self.remaining_days(), [0, 29, 30])
+
+
+# ------------------ dashboard snapshot ------------------
+@override_settings(CACHES=LOCMEM_CACHE)
+class SnapshotTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = 1000.0
+        self.builds = 0
+        for target, replacement in (("monitor.snapshot.time", mock.Mock(time=lambda: self.now)),
+                                    ("monitor.snapshot.build", self.build)):
+            patcher = mock.patch(target, replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def build(self, source, window):
+        self.builds += 1
+        return {"build": self.builds}
+
+    def get(self):
+        return snapshot.get_snapshot("packets")["build"]
+
+    def test_staleness(self):
+        entry = {"built": 100.0}
+        self.assertFalse(snapshot._stale(entry, 150.0, 100.0 + snapshot.INTERVAL - 1))  # too soon, even if changed
+        self.assertTrue(snapshot._stale(entry, 150.0, 100.0 + snapshot.INTERVAL))
+        self.assertFalse(snapshot._stale(entry, 50.0, 100.0 + snapshot.INTERVAL))       # nothing new
+        self.assertFalse(snapshot._stale(entry, None, 100.0 + snapshot.MAX_AGE - 1))
+        self.assertTrue(snapshot._stale(entry, None, 100.0 + snapshot.MAX_AGE))
+
+    def test_rebuilt_only_after_a_change_or_max_age(self):
+        self.assertEqual(self.get(), 1)
+        self.now += snapshot.INTERVAL
+        self.assertEqual(self.get(), 1)
+        snapshot.mark_changed()
+        self.assertEqual(self.get(), 2)
+        cache.delete(snapshot.CHANGED_KEY)
+        self.now += snapshot.MAX_AGE - 1
+        self.assertEqual(self.get(), 2)
+        self.now += 1
+        self.assertEqual(self.get(), 3)
+        self.assertEqual(snapshot.get_snapshot("packets", "1h")["build"], 4)  # each window has its own
+
+    def test_one_rebuild_while_others_serve_the_old_snapshot(self):
+        self.assertEqual(self.get(), 1)
+        self.now += snapshot.MAX_AGE
+        started, release = threading.Event(), threading.Event()
+
+        def slow_build(source, window):
+            started.set()
+            release.wait(5)
+            return self.build(source, window)
+
+        results = []
+        with mock.patch("monitor.snapshot.build", slow_build):
+            rebuild = threading.Thread(target=lambda: results.append(self.get()))
+            rebuild.start()
+            self.assertTrue(started.wait(5))
+            self.assertEqual([self.get() for _ in range(3)], [1, 1, 1])  # the lock is taken
+            release.set()
+            rebuild.join(5)
+        self.assertEqual((results, self.builds), ([2], 2))
+        self.assertIsNone(cache.get("monitor:dashboard:packets:all:lock"))
+        self.assertEqual(self.get(), 2)
+
+
+# ------------------ counters ------------------
+@override_settings(CACHES=LOCMEM_CACHE)
+class CounterTests(TestCase):
+    def setUp(self):
+        counters._known_hosts.clear()  # the process-wide cache outlives each test's rollback
+
+    def tearDown(self):
+        counters._known_hosts.clear()
+
+    def assertCountersExact(self):
+        expected = {
+            counters.rows_counter(NetworkLog): NetworkLog.objects.count(),
+            counters.HOSTS: KnownHost.objects.count(),
+            counters.ALERTS: Alert.objects.count(),
+            counters.ALERTS_REVIEWED: Alert.objects.filter(reviewed=True).count(),
+            **{counters.severity_counter(severity): Alert.objects.filter(severity=severity).count()
+               for severity, _ in Alert.SEVERITY_CHOICES},
+        }
+        self.assertEqual(counters.get_many(list(expected)), expected)
+        rebuilt = counters.rebuild()
+        self.assertEqual({name: rebuilt[name] for name in expected}, expected)
+
+    def ingest(self, sources, when=T0):
+        writer = BatchWriter(batch_size=10000)
+        for src in sources:
+            writer.add(NetworkLog(timestamp=when, source_ip=src, destination_ip="192.0.2.1",
+                                  protocol=6, bytes_transferred=100))
+        writer.flush()
+        self.assertEqual(writer.stats()["rows_failed"], 0)
+
+    def test_ingest_counts_rows_and_new_hosts(self):
+        self.ingest(["10.0.0.1", "10.0.0.2", "10.0.0.1", "2001:db8::1"])
+        self.assertEqual(counters.get(counters.HOSTS), 3)
+        self.ingest(["10.0.0.2", "10.0.0.3"])
+        counters._known_hosts.clear()  # as in another process: the insert finds the known ones
+        self.ingest(["10.0.0.1", "10.0.0.3", "10.0.0.4"])
+        self.assertEqual(counters.get(counters.HOSTS), 5)
+        self.assertCountersExact()
+
+    def test_deletes_are_counted(self):
+        self.ingest([f"10.0.0.{i}" for i in range(10)], when=T0 - timedelta(days=40))
+        self.ingest(["10.0.1.1"] * 3, when=T0)
+        result = partitions.delete_chunked(NetworkLog, "timestamp", T0 - timedelta(days=1), chunk=4, pause=0)
+        self.assertEqual(result, 10)
+        self.assertEqual(counters.get(counters.rows_counter(NetworkLog)), 3)
+        self.assertEqual(counters.get(counters.HOSTS), 11)  # hosts are never forgotten
+        self.assertCountersExact()
+
+    def test_alert_review_and_delete(self):
+        for severity in ("Low", "High", "High"):
+            Alert.objects.create(message="m", severity=severity)
+        alert = Alert.objects.filter(severity="High").first()
+        alert.reviewed = True
+        alert.save()
+        alert.severity = "Medium"
+        alert.save()
+        self.assertEqual(counters.get(counters.ALERTS_REVIEWED), 1)
+        self.assertCountersExact()
+
+        alert.delete()
+        Alert.objects.filter(severity="Low").first().delete()
+        self.assertEqual(counters.get(counters.ALERTS), 1)
+        self.assertCountersExact()
+
+    def test_counters_follow_rolled_back_saves(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Alert.objects.create(message="m", severity="High")
+            ThreatIP.objects.create(ip="203.0.113.9")
+            raise RuntimeError("the caller's transaction fails")
+        self.assertCountersExact()
+        self.assertEqual(counters.get(counters.THREAT_IPS), ThreatIP.objects.count())
+
+        # A counter update that fails takes its save down with it
+        with mock.patch.object(counters, "add", side_effect=OperationalError("database is locked")):
+            with self.assertRaises(OperationalError):
+                Alert.objects.create(message="m", severity="Low")
+            with self.assertRaises(OperationalError):
+                ThreatIP.objects.create(ip="203.0.113.10")
+        self.assertEqual((Alert.objects.count(), ThreatIP.objects.count()), (0, 0))
+        self.assertCountersExact()
+
+
+# ------------------ live updates ------------------
+@override_settings(CACHES=LOCMEM_CACHE)
+class HubTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(live, "POLL_INTERVAL", 0.01)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def collect(self, wanted):
+        self.collected.append(set(wanted))
+        return {(topic, source): f"{topic}:{source}" for topic, source in wanted}
+
+    @staticmethod
+    def drain(subscriber):
+        messages = []
+        while not subscriber.queue.empty():
+            messages.append(subscriber.queue.get_nowait())
+        return sorted(messages)
+
+    async def polls(self, count=20):
+        await asyncio.sleep(live.POLL_INTERVAL * count)
+
+    def test_changes_fan_out_per_topic_and_source(self):
+        self.collected = []
+
+        async def scenario():
+            hub = live.Hub()
+            hub._collect = self.collect
+            dashboard = hub.subscribe({live.STATS, live.TRAFFIC}, "packets")
+            flows = hub.subscribe({live.TRAFFIC}, "flows")
+            await self.polls()
+            # The first read of the marker counts as a change: everything once
+            self.assertEqual(self.collected, [{(live.STATS, "packets"), (live.TRAFFIC, "packets"),
+                                               (live.TRAFFIC, "flows")}])
+            self.assertEqual(self.drain(dashboard), [(live.STATS, "stats:packets"),
+                                                     (live.TRAFFIC, "traffic:packets")])
+            self.assertEqual(self.drain(flows), [(live.TRAFFIC, "traffic:flows")])
+
+            await self.polls()
+            self.assertEqual(len(self.collected), 1)  # no new data, no queries
+
+            # Rows go out at once; the cards wait for the snapshot interval
+            with mock.patch.object(snapshot, "INTERVAL", 3600):
+                await sync_to_async(cache.set)(snapshot.CHANGED_KEY, 1.0)
+                await self.polls()
+            self.assertEqual(self.collected[1:], [{(live.TRAFFIC, "packets"), (live.TRAFFIC, "flows")}])
+            self.assertEqual(self.drain(dashboard), [(live.TRAFFIC, "traffic:packets")])
+            self.assertEqual(self.drain(flows), [(live.TRAFFIC, "traffic:flows")])
+            self.assertEqual(hub.messages, 5)
+
+            # The task stops with the last subscriber and starts over with the next
+            hub.unsubscribe(dashboard)
+            hub.unsubscribe(flows)
+            await self.polls()
+            self.assertTrue(hub._task.done())
+            self.assertIs(hub._marker, live._UNSEEN)
+
+        asyncio.run(scenario())
+
+    def test_a_full_queue_marks_the_subscriber_lagging(self):
+        async def scenario():
+            subscriber = live.Subscriber({live.TRAFFIC}, "packets")
+            for i in range(live.QUEUE_SIZE + 1):
+                subscriber.send(live.TRAFFIC, i)
+            self.assertTrue(subscriber.lagging)
+            self.assertEqual(subscriber.queue.qsize(), live.QUEUE_SIZE)
+
+        asyncio.run(scenario())
+
+
+class LiveEventsViewTests(TestCase):
+    def test_wsgi_answers_204(self):
+        url = reverse("monitor:live")
+        self.assertEqual(self.client.get(url).status_code, 302)  # login first
+        user = get_user_model().objects.create_user(email="viewer@example.com", password="x", role="viewer")
+        self.client.force_login(user)
+        response = self.client.get(url, {"topic": [live.STATS, live.TRAFFIC]})
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(response.streaming)
+
+
+# ------------------ keyset pages ------------------
+class KeysetPageTests(TestCase):
+    source = SOURCES["packets"]
+
+    def setUp(self):
+        # Three rows per timestamp, inserted out of time order
+        for seconds in (2, 0, 1, 2, 0, 1, 2, 0, 1):
+            NetworkLog.objects.create(timestamp=T0 + timedelta(seconds=seconds), source_ip="10.0.0.1",
+                                      destination_ip="10.0.0.2", protocol=6, bytes_transferred=seconds)
+
+    def newest_first(self):
+        return list(NetworkLog.objects.order_by("-timestamp", "-id").values_list("id", flat=True))
+
+    def test_pages_split_equal_timestamps_without_gaps_or_repeats(self):
+        for size in (1, 2, 4, 9, 10):
+            page = list(self.source.latest(size))
+            seen = [log.id for log in page]
+            while len(page) == size:
+                cursor = self.source.parse_cursor(self.source.cursor(page[-1]))
+                page = list(self.source.older(cursor, size))
+                seen += [log.id for log in page]
+            self.assertEqual(seen, self.newest_first(), f"page size {size}")
+
+    def test_cursor_parsing(self):
+        log = NetworkLog.objects.order_by("id").first()
+        self.assertEqual(self.source.parse_cursor(self.source.cursor(log)), (log.timestamp, log.id))
+        for bad in (None, "", "garbage", "2026-10-01T12:00:00_x", "2026-13-01T12:00:00_5", "_5"):
+            self.assertIsNone(self.source.parse_cursor(bad), bad)
+
+    def test_newer_returns_rows_after_an_id(self):
+        last_id = self.source.last_id()
+        self.assertEqual(list(self.source.newer(last_id, 10)), [])
+        added = [NetworkLog.objects.create(timestamp=T0, source_ip="10.0.0.3", destination_ip="10.0.0.2",
+                                           protocol=17, bytes_transferred=1) for _ in range(3)]
+        self.assertEqual([log.id for log in self.source.newer(last_id, 2)], [added[2].id, added[1].id])
+
+    def test_logs_partial_deltas(self):
+        url = reverse("monitor:logs_partial")
+        last_id = self.source.last_id()
+        self.assertEqual(self.client.get(url, {"since": "abc"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"since": last_id}).status_code, 204)
+
+        log = NetworkLog.objects.create(timestamp=T0, source_ip="10.0.0.9", destination_ip="10.0.0.2",
+                                        protocol=6, bytes_transferred=1)
+        response = self.client.get(url, {"since": last_id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Last-Id"], str(log.id))
+        self.assertContains(response, f'id="log-{log.id}"')
+
+    def test_logs_partial_pages(self):
+        url = reverse("monitor:logs_partial")
+        with mock.patch("monitor.views.LOG_ROWS", 4):
+            first = self.client.get(url)
+            second = self.client.get(first.context["older_url"])
+        ids = [log.id for log in first.context["logs"]] + [log.id for log in second.context["logs"]]
+        self.assertEqual(ids, self.newest_first()[:8])
+        self.assertTrue(second.context["paged"])
+        self.assertEqual(second.context["newest_url"], url)
+
+
+# ------------------ archive ------------------
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        patcher = mock.patch.object(archive, "ARCHIVE_DIR", archive.Path(self.dir))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.dir, True)
+
+        rng = random.Random(3)
+        logs = []
+        for i in range(230):
+            age = timedelta(days=30) if i < 200 else timedelta(hours=1)
+            logs.append(NetworkLog(
+                timestamp=T0 - age + timedelta(seconds=rng.randrange(3600)),  # not in id order
+                source_ip=rng.choice(["10.0.0.1", "10.0.0.2", "10.1.0.1", "2001:db8::1"]),
+                destination_ip=rng.choice(["192.0.2.1", "192.0.2.2", "2001:db8::2"]),
+                protocol=rng.choice([1, 6, 17]), bytes_transferred=rng.randrange(60, 1500), packets=1,
+            ))
+        NetworkLog.objects.bulk_create(logs)
+        counters.rebuild()
+
+    def test_archived_logs_read_back_unchanged(self):
+        queries = [{}, {"src": "10.0.0.1"}, {"ip": "2001:db8::2"}, {"src": ipaddress.ip_network("10.0.0.0/16")},
+                   {"protocol": 6, "dst": "192.0.2.1"}]
+        before = [sorted(archive.traffic_rows(**query)) for query in queries]
+        counts = [archive.traffic_count(**query) for query in queries]
+
+        written, deleted = archive.archive_logs(older_than_days=7, now=T0, segment_rows=64)
+        self.assertEqual(([segment.rows for segment in written], deleted), ([64, 64, 64, 8], 200))
+        self.assertEqual(NetworkLog.objects.count(), 30)
+        for segment in written:
+            timestamps = segment.column("timestamp")
+            self.assertTrue((timestamps[1:] >= timestamps[:-1]).all())
+
+        self.assertEqual([sorted(archive.traffic_rows(**query)) for query in queries], before)
+        self.assertEqual([archive.traffic_count(**query) for query in queries], counts)
+        self.assertEqual(counters.get(counters.rows_counter(NetworkLog)), 30)
+
+    def test_unfinished_purge_is_completed(self):
+        with mock.patch.object(archive, "purge", return_value=0):
+            written, _ = archive.archive_logs(older_than_days=7, now=T0, segment_rows=1000)
+        self.assertEqual(NetworkLog.objects.count(), 230)  # segment written, rows still there
+        self.assertFalse(written[0].meta["purged"])
+
+        written, deleted = archive.archive_logs(older_than_days=7, now=T0, segment_rows=1000)
+        self.assertEqual((written, deleted), ([], 200))
+        self.assertEqual(archive.traffic_count()["rows"], 230)
+
+    def test_late_commit_inside_the_id_range_is_kept(self):
+        old = NetworkLog.objects.filter(timestamp__lt=T0 - timedelta(days=7)).order_by("id")
+        late = old[100]
+        late_id = late.pk
+        late.delete()  # not yet committed while the segment is read
+        with mock.patch.object(archive, "purge", return_value=0):
+            written, _ = archive.archive_logs(older_than_days=7, now=T0, segment_rows=1000)
+        self.assertLess(written[0].meta["min_id"], late_id)
+        self.assertGreater(written[0].meta["max_id"], late_id)
+
+        late.pk = late_id
+        late.save(force_insert=True)
+        self.assertEqual(archive.purge(written[0]), 199)
+        self.assertTrue(NetworkLog.objects.filter(pk=late_id).exists())
+
+        # The next run archives it
+        written, deleted = archive.archive_logs(older_than_days=7, now=T0, segment_rows=1000)
+        self.assertEqual(([segment.rows for segment in written], deleted), ([1], 1))
+        self.assertEqual(archive.traffic_count()["rows"], 230)
+
+
+# ------------------ reports ------------------
+class ReportBuilderTests(TestCase):
+    SOURCES = ["10.0.0.1", "10.0.0.2", "10.0.0.0", "a00::", "2001:db8::1"]  # 10.0.0.0 and a00:: pack alike
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        patcher = mock.patch.object(archive, "ARCHIVE_DIR", archive.Path(self.dir))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.dir, True)
+
+        rng = random.Random(19)
+        self.since = datetime(2026, 9, 28)
+        self.until = self.since + timedelta(days=3)
+        self.logs = [
+            NetworkLog(timestamp=self.since + timedelta(seconds=rng.randrange(-3600, 3 * 86400 + 3600)),
+                       source_ip=rng.choice(self.SOURCES), destination_ip=rng.choice(["192.0.2.1", "192.0.2.2"]),
+                       protocol=rng.choice([1, 6, 17, 47]), bytes_transferred=rng.randrange(60, 1500),
+                       packets=rng.randrange(1, 5))
+            for _ in range(400)
+        ]
+        NetworkLog.objects.bulk_create(self.logs)
+        counters.rebuild()
+
+    def expected(self):
+        """The report's sections counted by hand over the logs in [since, until)."""
+        logs = [log for log in self.logs if self.since <= log.timestamp < self.until]
+        sums = {"daily": {}, "hourly": {}, "protocols": {}, "sources": {}, "conversations": Counter()}
+        for log in logs:
+            protocol = Protocol(log.protocol).label if log.protocol in Protocol.values else str(log.protocol)
+            for section, key in (("daily", log.timestamp.date()), ("hourly", log.timestamp.hour),
+                                 ("protocols", protocol), ("sources", str(ipaddress.ip_address(log.source_ip)))):
+                packets, size = sums[section].get(key, (0, 0))
+                sums[section][key] = (packets + log.packets, size + log.bytes_transferred)
+            sums["conversations"][(log.source_ip, log.destination_ip)] += log.bytes_transferred
+        sums["rows"] = len(logs)
+        sums["packets"] = sum(log.packets for log in logs)
+        sums["bytes"] = sum(log.bytes_transferred for log in logs)
+        return sums
+
+    def assertMatches(self, report):
+        expected = self.expected()
+        self.assertEqual((report.rows, report.packets, report.bytes),
+                         (expected["rows"], expected["packets"], expected["bytes"]))
+        self.assertEqual({row["day"]: (row["packets"], row["bytes"]) for row in report.daily}, expected["daily"])
+        self.assertEqual({row["hour"]: (row["packets"], row["bytes"]) for row in report.hourly if row["packets"]},
+                         expected["hourly"])
+        self.assertEqual({row["protocol"]: (row["packets"], row["bytes"]) for row in report.protocols},
+                         expected["protocols"])
+        self.assertAlmostEqual(sum(row["share"] for row in report.protocols), 100.0)
+        self.assertEqual({row["ip"]: (row["packets"], row["bytes"]) for row in report.top_sources},
+                         expected["sources"])
+        top = expected["conversations"].most_common()
+        self.assertEqual(report.conversation_error, 0)
+        self.assertEqual([row["bytes"] for row in report.conversations], [size for _, size in top[:10]])
+        for row in report.conversations:
+            self.assertEqual(expected["conversations"][(row["src"], row["dst"])], row["bytes"])
+
+    def test_report_matches_hand_counts(self):
+        self.assertMatches(build_report(self.since, self.until))
+
+    def test_archived_and_live_logs_add_up(self):
+        archive.archive_logs(older_than_days=1, now=self.since + timedelta(days=2), segment_rows=50)
+        self.assertTrue(NetworkLog.objects.exists())
+        self.assertMatches(build_report(self.since, self.until))
+
+
+# ------------------ export ------------------
+class ExportTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        patcher = mock.patch.object(archive, "ARCHIVE_DIR", archive.Path(self.dir))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.dir, True)
+
+        self.logs = [
+            NetworkLog(timestamp=T0 + timedelta(hours=i), source_ip=src, destination_ip="192.0.2.1", protocol=protocol,
+                       bytes_transferred=100 + i, packets=1)
+            for i, (src, protocol) in enumerate([("10.0.0.1", 6), ("10.0.0.2", 17), ("10.1.0.1", 6),
+                                                  ("2001:db8::1", 58), ("10.0.0.1", 1)] * 3)
+        ]
+        NetworkLog.objects.bulk_create(self.logs)
+        user = get_user_model().objects.create_user(email="viewer@example.com", role="viewer")
+        self.client.force_login(user)
+
+    def get(self, **params):
+        response = self.client.get(reverse("monitor:export_logs_csv"), params)
+        self.assertEqual(response.status_code, 200)
+        body = b"".join(response.streaming_content)
+        if params.get("gzip"):
+            self.assertEqual(response["Content-Type"], "application/gzip")
+            body = gzip.decompress(body)
+        return response, body.decode()
+
+    def expected(self, match=lambda log: True):
+        return [(log.timestamp.isoformat(), log.source_ip, log.destination_ip, log.protocol, log.bytes_transferred,
+                 log.packets) for log in sorted(self.logs, key=lambda log: log.timestamp) if match(log)]
+
+    def csv_rows(self, body):
+        header, *rows = csv.reader(io.StringIO(body))
+        self.assertEqual(tuple(header), export.FIELDS)
+        return [(ts, src, dst, int(protocol), int(size), int(packets))
+                for ts, src, dst, protocol, size, packets in rows]
+
+    def test_parse_query(self):
+        since, until, filters = export.parse_query({"since": "2026-10-01", "until": "2026-10-02",
+                                                    "src": "10.0.0.0/8", "dst": "10.0.0.1/32", "protocol": "UDP"})
+        self.assertEqual((since, until), (datetime(2026, 10, 1), datetime(2026, 10, 3)))  # a bare until is inclusive
+        self.assertEqual(filters, {"ip": None, "src": ipaddress.ip_network("10.0.0.0/8"), "dst": "10.0.0.1",
+                                   "protocol": 17})
+        self.assertEqual(export.parse_query({"until": "2026-10-02T06:30"})[1], datetime(2026, 10, 2, 6, 30))
+        self.assertEqual(export.parse_query({"protocol": "47"})[2]["protocol"], 47)
+        for bad in ({"since": "yesterday"}, {"ip": "10.0.0.300"}, {"protocol": "sctp"}, {"protocol": "300"}):
+            with self.assertRaises(ValueError):
+                export.parse_query(bad)
+
+    def test_csv_and_ndjson_bodies(self):
+        with mock.patch.object(export, "FLUSH_ROWS", 4):  # several pieces
+            response, body = self.get()
+            self.assertEqual(response["Content-Type"], "text/csv")
+            self.assertEqual(self.csv_rows(body), self.expected())
+
+            response, body = self.get(format="ndjson")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual([tuple(json.loads(line).values()) for line in body.splitlines()], self.expected())
+        self.assertEqual(list(json.loads(body.splitlines()[0])), list(export.FIELDS))
+
+    def test_gzip_streams_decode(self):
+        with mock.patch.object(export, "FLUSH_ROWS", 4):
+            for fmt in ("csv", "ndjson"):
+                response, body = self.get(format=fmt, gzip="1")
+                self.assertIn(f"network_logs.{fmt}.gz", response["Content-Disposition"])
+                _, plain = self.get(format=fmt)
+                self.assertEqual(body, plain)
+        pieces = list(export.gzipped(["a,b\n", "", "c,d\n"]))
+        self.assertEqual(pieces[0][:2], b"\x1f\x8b")  # gzip magic from wbits 31
+        self.assertEqual(gzip.decompress(b"".join(pieces)), b"a,b\nc,d\n")
+
+    def test_filters(self):
+        _, body = self.get(src="10.0.0.0/16", protocol="tcp")
+        self.assertEqual(self.csv_rows(body),
+                         self.expected(lambda log: log.source_ip.startswith("10.0.") and log.protocol == 6))
+        _, body = self.get(since="2026-10-01T14:00", until="2026-10-01T20:00")
+        self.assertEqual(self.csv_rows(body),
+                         self.expected(lambda log: T0 + timedelta(hours=2) <= log.timestamp < T0 + timedelta(hours=8)))
+        _, body = self.get(ip="192.0.2.9")
+        self.assertEqual(self.csv_rows(body), [])  # header only
+
+    def test_bad_queries_are_rejected(self):
+        url = reverse("monitor:export_logs_csv")
+        for params in ({"since": "nope"}, {"src": "bogus"}, {"format": "xml"}):
+            self.assertEqual(self.client.get(url, params).status_code, 400, params)
+
+
+# ------------------ capture supervisor ------------------
+class SupervisorTests(SimpleTestCase):
+    capture = importlib.import_module("capture_packets")
+
+    def summary(self, packets, dropped=0):
+        return {"packets": packets, "dropped": dropped, "written": packets}
+
+    def supervisor(self, procs):
+        supervisor = self.capture.Supervisor(["eth0"], mock.Mock(queues=len(procs)))
+        supervisor.procs = procs
+        supervisor.start_worker = mock.Mock()
+        return supervisor
+
+    def test_rates(self):
+        self.assertEqual(self.capture.rates(None, (100.0, self.summary(50))), (0.0, 0.0))
+        self.assertEqual(self.capture.rates((100.0, self.summary(50, 4)), (110.0, self.summary(250, 24))),
+                         (20.0, 2.0))
+        self.assertEqual(self.capture.rates((100.0, self.summary(50)), (100.0, self.summary(60))), (0.0, 0.0))
+
+    def test_restart_resets_the_rate(self):
+        # The restarted worker counts from zero: no negative rate, then a fresh one
+        self.assertEqual(self.capture.rates((100.0, self.summary(5000, 40)), (130.0, self.summary(300))),
+                         (0.0, 0.0))
+        self.assertEqual(self.capture.rates((100.0, self.summary(5000, 40)), (130.0, self.summary(6000, 10))),
+                         (0.0, 0.0))
+
+    def test_dead_worker_is_restarted_after_the_delay(self):
+        alive, dead = mock.Mock(exitcode=None), mock.Mock(exitcode=1)
+        alive.is_alive.return_value, dead.is_alive.return_value = True, False
+        supervisor = self.supervisor([alive, dead])
+        supervisor.previous[1] = (100.0, self.summary(5000))
+        delay = self.capture.RESTART_DELAY
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            supervisor.restart_dead(1000.0)
+            supervisor.restart_dead(1000.0 + delay - 1)
+            supervisor.start_worker.assert_not_called()
+            supervisor.restart_dead(1000.0 + delay)
+        supervisor.start_worker.assert_called_once_with(1)
+        self.assertEqual(supervisor.restarts, [0, 1])
+        self.assertNotIn(1, supervisor.previous)
+        self.assertEqual(supervisor.dead_since, {})
+
+    def test_worker_that_recovers_is_not_restarted(self):
+        proc = mock.Mock(exitcode=None)
+        proc.is_alive.side_effect = [False, True, False]
+        supervisor = self.supervisor([proc])
+        delay = self.capture.RESTART_DELAY
+
+        supervisor.restart_dead(1000.0)
+        supervisor.restart_dead(1000.0 + delay - 1)  # alive again: the dead clock starts over
+        supervisor.restart_dead(1000.0 + delay)
+        supervisor.start_worker.assert_not_called()
+        self.assertEqual(supervisor.dead_since, {0: 1000.0 + delay})
+
+    def test_report_sums_shards_and_skips_a_restarted_one(self):
+        supervisor = self.supervisor([mock.Mock(), mock.Mock()])
+        supervisor.latest = {0: (100.0, self.summary(1000)), 1: (100.0, self.summary(2000))}
+        with contextlib.redirect_stdout(io.StringIO()):
+            supervisor.report()
+        supervisor.latest = {0: (110.0, self.summary(1500, 10)), 1: (110.0, self.summary(100))}
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            supervisor.report()
+        self.assertIn("eth0: 50 pkt/s | 1 drops/s | 1600 packets | 10 dropped", out.getvalue())
@@ -10,6 +10,7 @@ urlpatterns = [
     path("alerts/", views.alerts_list_view, name="alerts"),
     path("stats/partial/", views.stats_partial, name="stats_partial"),
     path("dashboard/api/data/", views.dashboard_data_api, name="dashboard_data_api"),
+    path("live/", views.live_events, name="live"),
    
     path("logs/partial/", views.logs_partial, name="logs_partial"),
 
@@ -1,86 +1,65 @@
 from django.shortcuts import render, redirect
-from django.db.models import Sum
-from django.http import HttpResponse
-import csv
-import io
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from datetime import timedelta
+from django.core.cache import cache
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.http import urlencode
 
 from authsystem.decorators import role_required
 from .models import NetworkLog, Alert
-from threatintel.models import ThreatIP
+from .sources import traffic_source
+from .snapshot import get_snapshot
+from . import archive, counters, export, live, reports
 from django.http import JsonResponse
 
 
+# The dashboard, its stats partial and its chart API all read one shared
+# snapshot (monitor/snapshot.py), for ?source= and ?window=15m|1h|24h|7d
+def _snapshot(request):
+    return get_snapshot(request.GET.get("source"), request.GET.get("window"))
 
-def dashboard_data_api(request):
-    logs = NetworkLog.objects.order_by('-timestamp')[:12]
-    timeline_labels = [log.timestamp.strftime("%H:%M:%S") for log in logs[::-1]]
-    timeline_data = [log.bytes_transferred for log in logs[::-1]]
-
-    top_ips = (
-        NetworkLog.objects.values('source_ip')
-        .annotate(total=Sum('bytes_transferred'))
-        .order_by('-total')[:5]
-    )
-    top_ip_labels = [r['source_ip'] for r in top_ips]
-    top_ip_values = [r['total'] for r in top_ips]
 
+def dashboard_data_api(request):
+    snapshot = _snapshot(request)
     return JsonResponse({
-        "timeline_labels": timeline_labels,
-        "timeline_data": timeline_data,
-        "top_ip_labels": top_ip_labels,
-        "top_ip_values": top_ip_values,
+        "timeline_labels": snapshot["timeline_labels"],
+        "timeline_data": snapshot["timeline_data"],
+        "top_ip_labels": snapshot["top_ip_labels"],
+        "top_ip_values": snapshot["top_ip_values"],
     })
 
 def stats_partial(request):
-    total_logs = NetworkLog.objects.count()
-    active_alerts = Alert.objects.filter(severity="High").count()
-    unique_ips = NetworkLog.objects.values("source_ip").distinct().count()
-    threat_count = ThreatIP.objects.count()
-
+    snapshot = _snapshot(request)
     return render(request, "monitor/partials/stats_partial.html", {
-        "total_logs": total_logs,
-        "active_alerts": active_alerts,
-        "unique_ips": unique_ips,
-        "threat_count": threat_count,
+        "total_logs": snapshot["total_logs"],
+        "active_alerts": snapshot["active_alerts"],
+        "unique_ips": snapshot["unique_ips"],
+        "threat_count": snapshot["threat_count"],
     })
 
 
 
+# Server-sent live updates for the dashboard and traffic pages (monitor/live.py)
+@role_required(['admin', 'analyst', 'viewer'])
+def live_events(request):
+    if not isinstance(request, ASGIRequest):
+        # No streaming under WSGI; 204 tells EventSource to stop, and the page polls
+        return HttpResponse(status=204)
+    topics = set(request.GET.getlist("topic")) & live.TOPICS
+    source = traffic_source(request.GET.get("source")).name
+    response = StreamingHttpResponse(live.stream(topics, source), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx: pass events through unbuffered
+    return response
+
+
+
 # Dashboard (existing)
 @role_required(['admin', 'analyst', 'viewer'])
 def dashboard_view(request):
-    total_logs = NetworkLog.objects.count()
-    active_alerts = Alert.objects.filter(severity="High").count()
-    unique_ips = NetworkLog.objects.values("source_ip").distinct().count()
-    threat_count = ThreatIP.objects.count()
-
-    # timeline (last 12 entries)
-    logs = NetworkLog.objects.order_by('-timestamp')[:12]
-    timeline_labels = [log.timestamp.strftime("%H:%M:%S") for log in logs[::-1]]  # oldest -> newest
-    timeline_data = [log.bytes_transferred for log in logs[::-1]]
-
-    top_ips = (
-        NetworkLog.objects.values('source_ip')
-        .annotate(total=Sum('bytes_transferred'))
-        .order_by('-total')[:5]
-    )
-    top_ip_labels = [r['source_ip'] for r in top_ips]
-    top_ip_values = [r['total'] for r in top_ips]
-
-    latest_alerts = Alert.objects.order_by('-timestamp')[:5]
-
-    return render(request, "monitor/dashboard.html", {
-        "total_logs": total_logs,
-        "active_alerts": active_alerts,
-        "unique_ips": unique_ips,
-        "timeline_labels": timeline_labels,
-        "timeline_data": timeline_data,
-        "top_ip_labels": top_ip_labels,
-       "top_ip_values": top_ip_values,
-        "latest_alerts": latest_alerts,
-        "threat_count": threat_count,
-    })
+    return render(request, "monitor/dashboard.html", _snapshot(request))
 
 
 
@@ -88,14 +67,14 @@ def dashboard_view(request):
 # --- Alerts list ---
 @role_required(['admin', 'analyst', 'viewer'])
 def alerts_list_view(request):
-    alerts = Alert.objects.order_by('-timestamp')
+    alerts = Alert.objects.order_by('-last_seen')
     return render(request, "monitor/alerts.html", {"alerts": alerts})
 
 
 # HTMX partial endpoint for alert refresh
 @role_required(['admin', 'analyst', 'viewer'])
 def alerts_partial(request):
-    latest_alerts = Alert.objects.order_by('-timestamp')[:10]
+    latest_alerts = Alert.objects.order_by('-last_seen')[:10]
     return render(request, "monitor/alerts_partial.html", {
         "latest_alerts": latest_alerts
     })
@@ -106,7 +85,7 @@ def alerts_partial(request):
 @role_required(['admin', 'analyst', 'viewer'])
 def anomalies_view(request):
     # For now, anomalies are Alerts with severity "High" or special flag
-    anomalies = Alert.objects.filter(severity="High").order_by('-timestamp')
+    anomalies = Alert.objects.filter(severity="High").order_by('-last_seen')
     return render(request, "monitor/anomalies.html", {"anomalies": anomalies})
 
 
@@ -114,7 +93,7 @@ def anomalies_view(request):
 @role_required(['admin', 'analyst', 'viewer'])
 def system_status_view(request):
     # Provide some basic info. You can extend with real sniffer status.
-    total_logs = NetworkLog.objects.count()
+    total_logs = counters.get(counters.rows_counter(NetworkLog))
     last_log = NetworkLog.objects.order_by('-timestamp').first()
     last_time = last_log.timestamp if last_log else None
 
@@ -125,40 +104,110 @@ def system_status_view(request):
         "sniffer_interface": request.GET.get("iface", "auto-detected"),
     }
     return render(request, "monitor/system_status.html", context)
+# Log tables: ?since=<id> returns only the rows written after that id (to
+# prepend), ?before=<cursor> the page after a row (keyset on time and id)
+def _new_rows(request, source, size):
+    since = request.GET["since"]
+    if not since.isdigit():
+        return HttpResponseBadRequest("since must be a log id")
+    logs = list(source.newer(int(since), size))
+    if not logs:
+        return HttpResponse(status=204)  # nothing new; htmx leaves the table alone
+    response = render(request, "monitor/partials/traffic_rows.html", {"logs": logs})
+    response["X-Last-Id"] = logs[0].id
+    return response
+
+
+def _log_page(request, source, size):
+    last_id = source.last_id()  # read first: a row written meanwhile comes again as "new", never gets lost
+    before = source.parse_cursor(request.GET.get("before"))
+    logs = list(source.older(before, size) if before else source.latest(size))
+    query = {"source": request.GET["source"]} if request.GET.get("source") else {}
+
+    def page_url(**extra):
+        return f"{request.path}?{urlencode(dict(query, **extra))}".rstrip("?")
+
+    return {
+        "logs": logs,
+        "last_id": last_id,
+        "paged": before is not None,
+        "newest_url": page_url() if before else None,
+        "older_url": page_url(before=source.cursor(logs[-1])) if len(logs) == size else None,
+    }
+
+
+LOG_ROWS = 50
+
+
 def logs_partial(request):
-    logs = NetworkLog.objects.order_by('-timestamp')[:50]  # latest 50
-    return render(request, "monitor/partials/logs_partial.html", {"logs": logs})
+    source = traffic_source("packets")
+    if "since" in request.GET:
+        return _new_rows(request, source, LOG_ROWS)
+    return render(request, "monitor/partials/logs_partial.html", _log_page(request, source, LOG_ROWS))
 
 @role_required(['admin', 'analyst', 'viewer'])
 def traffic_view(request):
-    logs = NetworkLog.objects.order_by('-timestamp')[:300]  # correct model
+    source = traffic_source(request.GET.get("source"))
+    if "since" in request.GET:
+        return _new_rows(request, source, live.TRAFFIC_ROWS)
+    context = _log_page(request, source, live.TRAFFIC_ROWS)
 
     # HTMX request = return only the table
     if request.htmx:
-        return render(request, "monitor/partials/traffic_table.html", {"logs": logs})
+        return render(request, "monitor/partials/traffic_table.html", context)
 
     # Regular page view = return full page
-    return render(request, "monitor/traffic.html", {"logs": logs})
+    return render(request, "monitor/traffic.html", context)
 
 
 
 # --- Reports & Exports ---
+REPORT_CACHE_SECONDS = 300
+
+
 @role_required(['admin', 'analyst', 'viewer'])
 def reports_view(request):
-    # options page: daily summary etc.
-    total_logs = NetworkLog.objects.count()
-    return render(request, "monitor/reports.html", {"total_logs": total_logs})
+    # Daily / weekly / monthly summary over the database and the archive (monitor/reports.py)
+    period = request.GET.get("period", "week")
+    if period not in reports.PERIODS:
+        period = "week"
+    end = parse_date(request.GET.get("end") or "")
+    since, until = reports.period_bounds(period, end)
+    key = f"monitor:report:{period}:{since:%Y%m%d}"
+    report = cache.get(key)
+    if report is None:
+        report = reports.build_report(since, until)
+        cache.set(key, report, REPORT_CACHE_SECONDS)
+
+    hot_logs = counters.get(counters.rows_counter(NetworkLog))
+    archived = archive.archive_stats()
+    peak_hour = max((h["bytes"] for h in report.hourly), default=0)
+    return render(request, "monitor/reports.html", {
+        "total_logs": hot_logs + archived["rows"],
+        "hot_logs": hot_logs,
+        "archive": archived,
+        "periods": list(reports.PERIODS),
+        "period": period,
+        "report": report,
+        "hourly": [dict(h, percent=100 * h["bytes"] / peak_hour if peak_hour else 0) for h in report.hourly],
+        "export_recent_since": timezone.now() - timedelta(days=1),
+    })
 
 
 @role_required(['admin', 'analyst', 'viewer'])
 def export_logs_csv(request):
-    # Export recent logs as CSV
-    logs = NetworkLog.objects.order_by('-timestamp')[:1000]
-    buf = io.StringIO()
-    writer = csv.writer(buf)
-    writer.writerow(["timestamp", "source_ip", "destination_ip", "protocol", "bytes_transferred"])
-    for l in logs:
-        writer.writerow([l.timestamp.isoformat(), l.source_ip, l.destination_ip, l.protocol, l.bytes_transferred])
-    resp = HttpResponse(buf.getvalue(), content_type="text/csv")
-    resp['Content-Disposition'] = 'attachment; filename=network_logs.csv'
+    # Stream every log matching ?since=&until=&ip=&src=&dst=&protocol= from the
+    # archive and the database, as CSV or ?format=ndjson, ?gzip=1 (monitor/export.py)
+    try:
+        since, until, filters = export.parse_query(request.GET)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    fmt = request.GET.get("format", "csv")
+    if fmt not in export.FORMATS:
+        return HttpResponseBadRequest("format must be csv or ndjson")
+    gzip = request.GET.get("gzip") in ("1", "true", "yes")
+    filename = f"network_logs.{fmt}" + (".gz" if gzip else "")
+    resp = StreamingHttpResponse(export.stream(since, until, filters, fmt, gzip),
+                                 content_type="application/gzip" if gzip else export.FORMATS[fmt])
+    resp['Content-Disposition'] = f'attachment; filename={filename}'
     return resp
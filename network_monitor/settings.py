@@ -85,9 +85,34 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # The capture process writes logs, rollups and alerts from several
+            # threads; wait for the write lock instead of failing after 5s
+            'timeout': 30,
+            # Take the write lock when a transaction starts, so a transaction
+            # that reads first can't fail with "database is locked" later on
+            'transaction_mode': 'IMMEDIATE',
+            # WAL: web readers never block the capture writer and vice versa
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+        },
     }
 }
 
+# PostgreSQL instead of SQLite when POSTGRES_DB is set
+if os.environ.get('POSTGRES_DB'):
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ['POSTGRES_DB'],
+        'USER': os.environ.get('POSTGRES_USER', ''),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', ''),
+        'PORT': os.environ.get('POSTGRES_PORT', ''),
+    }
+
+# Keep connections open between requests instead of reconnecting each time
+DATABASES['default']['CONN_MAX_AGE'] = 60
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
 # ---------------------------
 # AUTHENTICATION
 # ---------------------------
@@ -135,14 +160,21 @@ LOGIN_REDIRECT_URL = '/monitor/dashboard/'
 LOGOUT_REDIRECT_URL = '/login/'
 
 # ---------------------------
-# CACHING (For login rate limiting)
+# CACHING (login rate limiting, dashboard snapshot, reports)
 # ---------------------------
+# Shared by every worker process: files under BASE_DIR/cache, or Redis
+# when REDIS_URL is set
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "unique-snowflake",
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "cache",
     }
 }
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ['REDIS_URL'],
+    }
 
 # ---------------------------
 # EMAIL CONFIGURATION
@@ -166,6 +198,158 @@ DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 SESSION_COOKIE_SECURE = False  # True only if using HTTPS
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 
+# ---------------------------
+# CAPTURE PIPELINE
+# ---------------------------
+# "packets": one NetworkLog row per packet
+# "flows":   5-tuple Flow rows, closed on idle/active timeout (seconds)
+MONITOR_CAPTURE_MODE = "packets"
+# "raw": struct-based header decoder, "scapy": full scapy dissection
+MONITOR_CAPTURE_PARSER = "raw"
+MONITOR_FLOW_IDLE_TIMEOUT = 30
+MONITOR_FLOW_ACTIVE_TIMEOUT = 300
+# How log/flow batches are written: "copy" (PostgreSQL COPY), "sqlite"
+# (one tuned writer connection per writer), "orm" (bulk_create), or "auto"
+# to pick by database. manage.py bench_ingest compares them.
+MONITOR_INGEST_BACKEND = "auto"
+# A batch whose write fails is retried up to MONITOR_BATCH_MAX_RETRIES times,
+# waiting MONITOR_BATCH_RETRY_BACKOFF seconds (doubled each time) in between,
+# before its rows are counted as failed and dropped.
+MONITOR_BATCH_MAX_RETRIES = 5
+MONITOR_BATCH_RETRY_BACKOFF = 0.5
+# Interfaces captured in parallel, one worker process each (capture_packets.py
+# --iface overrides; empty = the interface hard-coded in the script)
+MONITOR_CAPTURE_INTERFACES = []
+
+# Capture profiles (capture_packets.py --profile NAME):
+#   bpf       capture filter
+#   snaplen   bytes kept per frame (0 = whole frame; raw parser only)
+#   sampling  None, "count" (1 in N packets) or "flow" (1 in N flows by 5-tuple hash)
+#   rate      N; stored packet/byte counts are multiplied by it
+#   adaptive  raise the rate (up to max_rate) while pipeline queues are
+#             above high_watermark, lower it again below low_watermark
+MONITOR_CAPTURE_PROFILE = "default"
+MONITOR_CAPTURE_PROFILES = {
+    "default": {"bpf": "ip"},
+    "busy-link": {
+        "bpf": "ip",
+        "snaplen": 128,
+        "sampling": "flow",
+        "rate": 4,
+        "adaptive": True,
+        "max_rate": 256,
+        "high_watermark": 0.8,
+        "low_watermark": 0.2,
+    },
+}
+
+# Per-stage worker pool, queue size and overflow policy
+# ("block", "drop_oldest" or "sample") for capture_packets.py
+MONITOR_PIPELINE = {
+    "parse": {"workers": 1, "maxsize": 10000, "policy": "drop_oldest"},
+    "enrich": {"workers": 2, "maxsize": 10000, "policy": "drop_oldest"},
+    "persist": {"workers": 1, "maxsize": 20000, "policy": "block"},
+}
+
+# ---------------------------
+# ALERTS
+# ---------------------------
+# Repeats of the same alert (kind + IP) within MONITOR_ALERT_WINDOW seconds
+# update one Alert row (count, first/last seen); writes happen every
+# MONITOR_ALERT_FLUSH_INTERVAL seconds.
+MONITOR_ALERT_WINDOW = 300
+MONITOR_ALERT_FLUSH_INTERVAL = 2.0
+# High-traffic / port-scan / ICMP-flood rules evaluated on the live packet
+# stream (in-memory sliding windows) instead of GROUP BY queries
+MONITOR_STREAMING_DETECTION = True
+# Seconds between ticks of manage.py run_detection (the same rules over
+# stored rows, resuming from a per-rule watermark)
+MONITOR_DETECTION_INTERVAL = 10
+
+# ---------------------------
+# HOST BASELINES
+# ---------------------------
+# run_detection also learns each host's normal traffic per hour of day
+# (EWMA mean/variance of bytes, packets, destinations and protocol mix over
+# MONITOR_BASELINE_INTERVAL-second samples, weight MONITOR_BASELINE_ALPHA)
+# and raises "anomaly" alerts at a z-score of MONITOR_BASELINE_Z, once an
+# hour has MONITOR_BASELINE_MIN_SAMPLES samples. The state lives in
+# one file per traffic source next to MONITOR_BASELINE_PATH (baselines.npz
+# becomes baselines-packets.npz and baselines-flows.npz); hosts idle for
+# MONITOR_BASELINE_FORGET_DAYS are dropped.
+MONITOR_BASELINES = True
+MONITOR_BASELINE_INTERVAL = 60
+MONITOR_BASELINE_ALPHA = 0.05
+MONITOR_BASELINE_Z = 4.0
+MONITOR_BASELINE_MIN_SAMPLES = 8
+MONITOR_BASELINE_PATH = BASE_DIR / "baselines.npz"
+MONITOR_BASELINE_FORGET_DAYS = 30
+
+# ---------------------------
+# DASHBOARD SNAPSHOT
+# ---------------------------
+# The dashboard, its stats partial and chart API read one cached snapshot,
+# rebuilt at most every MONITOR_DASHBOARD_INTERVAL seconds after new logs
+# or alerts are written, and every MONITOR_DASHBOARD_MAX_AGE seconds anyway.
+MONITOR_DASHBOARD_INTERVAL = 5
+MONITOR_DASHBOARD_MAX_AGE = 30
+# Open dashboard/traffic pages get pushed updates from /monitor/live/
+# (server-sent events) when the site runs under ASGI:
+#   uvicorn network_monitor.asgi:application
+# Each server process checks for new data every MONITOR_LIVE_POLL seconds
+# while any page is connected. Under WSGI (runserver) the pages poll.
+MONITOR_LIVE_POLL = 1.0
+
+# ---------------------------
+# DASHBOARD SKETCHES
+# ---------------------------
+# Top talkers (Space-Saving, K entries) and unique sources (HyperLogLog,
+# 2**precision registers) per minute/hour/all time, written by the capture
+# process every MONITOR_SKETCH_FLUSH_INTERVAL seconds. Minute buckets are
+# kept for MONITOR_SKETCH_MINUTE_RETENTION days.
+MONITOR_SKETCH_TOP_K = 100
+MONITOR_SKETCH_HLL_PRECISION = 12
+MONITOR_SKETCH_FLUSH_INTERVAL = 5.0
+MONITOR_SKETCH_MINUTE_RETENTION = 2
+
+# ---------------------------
+# TRAFFIC ROLLUPS
+# ---------------------------
+# Packets/bytes per second, overall and per source/destination/protocol,
+# written with every log batch. Second rows older than KEEP_SECONDS fold
+# into minute rows, minute rows older than KEEP_MINUTES into hour rows
+# (every COMPACT_INTERVAL seconds in the capture process, or
+# manage.py compact_rollups).
+MONITOR_ROLLUP_KEEP_SECONDS = 3600
+MONITOR_ROLLUP_KEEP_MINUTES = 2 * 86400
+MONITOR_ROLLUP_COMPACT_INTERVAL = 300
+
+# ---------------------------
+# LOG RETENTION
+# ---------------------------
+# manage.py manage_partitions (daily, or --loop) removes logs and flows
+# older than MONITOR_LOG_RETENTION_DAYS (None keeps everything).
+# Partitioning is PostgreSQL only: NetworkLog is partitioned by day, whole
+# partitions are dropped, and the log writer and manage_partitions create
+# the next MONITOR_PARTITION_PREMAKE_DAYS ahead of time. On SQLite there
+# are no partitions; rows are deleted MONITOR_RETENTION_CHUNK at a time
+# with MONITOR_RETENTION_PAUSE seconds between chunks.
+MONITOR_LOG_RETENTION_DAYS = 30
+MONITOR_PARTITION_PREMAKE_DAYS = 3
+MONITOR_RETENTION_CHUNK = 5000
+MONITOR_RETENTION_PAUSE = 0.05
+
+# ---------------------------
+# LOG ARCHIVE
+# ---------------------------
+# manage.py archive_logs moves logs older than MONITOR_ARCHIVE_AFTER_DAYS
+# into columnar segment files (at most MONITOR_ARCHIVE_SEGMENT_ROWS rows
+# each) under MONITOR_ARCHIVE_DIR. Reports and exports read both tiers.
+# Keep this below MONITOR_LOG_RETENTION_DAYS, or retention deletes the logs first.
+MONITOR_ARCHIVE_DIR = BASE_DIR / "archive"
+MONITOR_ARCHIVE_AFTER_DAYS = 7
+MONITOR_ARCHIVE_SEGMENT_ROWS = 1000000
+
 # ---------------------------
 # DEFAULT PRIMARY KEY
 # ---------------------------
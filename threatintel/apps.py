@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ThreatintelConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'threatintel'
+
+    def ready(self):
+        import threatintel.signals  # noqa: F401
@@ -1,5 +1,6 @@
 from django import forms
 from .models import ThreatIP
+from .prefixes import normalize_network
 
 class ThreatIPForm(forms.ModelForm):
     class Meta:
@@ -8,10 +9,17 @@ class ThreatIPForm(forms.ModelForm):
         widgets = {
             'ip': forms.TextInput(attrs={
                 'class': 'w-full p-2 rounded bg-[#0d1a2b] text-gray-200 border border-cyan-500/20',
-                'placeholder': 'e.g., 192.168.1.100'
+                'placeholder': 'e.g., 192.168.1.100 or 203.0.113.0/24'
             }),
             'source': forms.TextInput(attrs={
                 'class': 'w-full p-2 rounded bg-[#0d1a2b] text-gray-200 border border-cyan-500/20',
                 'placeholder': 'e.g., Malware, Botnet'
             }),
         }
+
+    def clean_ip(self):
+        ip = self.cleaned_data["ip"]
+        try:
+            return normalize_network(ip)
+        except ValueError:
+            raise forms.ValidationError("Enter a valid IP address or CIDR network.")
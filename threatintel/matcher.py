@@ -0,0 +1,153 @@
+import ipaddress
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import ThreatIP
+from .prefixes import PrefixTable, parse_network
+
+
+REFRESH_INTERVAL = getattr(settings, "THREATINTEL_REFRESH_INTERVAL", 30)  # seconds
+BITS = {4: 32, 6: 128}
+NETWORK_CLASSES = {4: ipaddress.IPv4Network, 6: ipaddress.IPv6Network}
+
+
+@lru_cache(maxsize=65536)
+def _address(ip):
+    """(version, integer) of an address string, or None; cached, as traffic repeats hosts."""
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+    return addr.version, int(addr)
+
+
+def _network(value):
+    try:
+        return parse_network(value)
+    except ValueError:
+        return None
+
+
+class ThreatMatcher:
+    """
+    In-process copy of the ThreatIP table for hot-path lookups.
+
+    Entries may be single addresses or CIDR networks. They are kept in one
+    longest-prefix table per IP version (see prefixes.PrefixTable), so a
+    lookup never touches the database.
+
+    Changes made in this process arrive through the ThreatIP signals. Changes
+    made by other processes (the web app, the feed updater) are picked up by
+    ``refresh()``: rows with a higher id than the last one seen are loaded
+    incrementally, and a full reload only happens when rows were deleted.
+    """
+
+    def __init__(self, refresh_interval=REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._tables = {4: PrefixTable(32), 6: PrefixTable(128)}
+        self._max_id = 0
+        self._count = 0
+        self._loaded = False
+        self._next_refresh = 0.0
+        self._lock = threading.Lock()
+
+    # ------------------ loading ------------------
+    def load(self):
+        networks = {4: [], 6: []}
+        max_id = count = 0
+        for pk, ip in ThreatIP.objects.values_list("id", "ip").iterator(chunk_size=5000):
+            net = _network(ip)
+            if net:
+                networks[net.version].append(net)
+            max_id = max(max_id, pk)
+            count += 1
+
+        tables = {v: PrefixTable.build(BITS[v], nets) for v, nets in networks.items()}
+        with self._lock:
+            self._tables = tables
+            self._max_id = max_id
+            self._count = count
+            self._loaded = True
+            self._next_refresh = time.monotonic() + self.refresh_interval
+
+    def refresh(self):
+        if not self._loaded:
+            return self.load()
+
+        state = ThreatIP.objects.aggregate(max_id=Max("id"), count=Count("id"))
+        max_id = state["max_id"] or 0
+
+        added = []
+        if max_id > self._max_id:
+            added = list(ThreatIP.objects.filter(id__gt=self._max_id).values_list("id", "ip"))
+
+        if state["count"] != self._count + len(added):
+            # Something was deleted elsewhere; the only safe move is a reload.
+            return self.load()
+
+        with self._lock:
+            for pk, ip in added:
+                self._add(ip)
+            self._max_id = max(self._max_id, max_id)
+            self._count = state["count"]
+            self._next_refresh = time.monotonic() + self.refresh_interval
+
+    def refresh_if_due(self):
+        if time.monotonic() >= self._next_refresh:
+            self.refresh()
+
+    def invalidate(self):
+        self._loaded = False
+
+    # ------------------ incremental updates ------------------
+    def _add(self, ip):
+        net = _network(ip)
+        if net:
+            self._tables[net.version].add(net)
+
+    def added(self, row):
+        if not self._loaded:
+            return
+        with self._lock:
+            self._add(row.ip)
+            self._max_id = max(self._max_id, row.pk)
+            self._count += 1
+
+    def removed(self, row):
+        if not self._loaded:
+            return
+        net = _network(row.ip)
+        with self._lock:
+            if net:
+                self._tables[net.version].discard(net)
+            self._count -= 1
+
+    # ------------------ lookups ------------------
+    def match(self, ip):
+        """
+        The most specific listed network containing ``ip`` (an ip_network),
+        or None when the address is not listed.
+        """
+        if not self._loaded:
+            self.load()
+        addr = _address(ip)
+        if addr is None:
+            return None
+        version, value = addr
+        hit = self._tables[version].lookup(value)
+        if hit is None:
+            return None
+        return NETWORK_CLASSES[version](hit)
+
+    def __contains__(self, ip):
+        return self.match(ip) is not None
+
+    def __len__(self):
+        return len(self._tables[4]) + len(self._tables[6])
+
+
+matcher = ThreatMatcher()
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:43
+
+import threatintel.prefixes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('threatintel', '0002_rename_added_on_threatip_created_at_threatip_notes_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='threatip',
+            name='ip',
+            field=models.CharField(max_length=64, unique=True, validators=[threatintel.prefixes.validate_network]),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Rewrites ThreatIP entries saved before 0003 in the canonical form that
+# ThreatIP.save() now uses ("10.0.0.1/32" -> "10.0.0.1", "10.0.0.7/24" ->
+# "10.0.0.0/24", "2001:DB8::1" -> "2001:db8::1"). Entries that turn out to
+# be the same address or network are merged into the oldest one: it keeps
+# its source (or takes the first non-empty one) and gathers every note.
+# Values that do not parse are left for the admin to fix.
+
+from django.db import migrations
+
+from threatintel.prefixes import normalize_network
+
+
+def normalize_entries(apps, schema_editor):
+    ThreatIP = apps.get_model("threatintel", "ThreatIP")
+    Counter = apps.get_model("monitor", "Counter")
+
+    groups = {}
+    for entry in ThreatIP.objects.order_by("created_at", "id"):
+        try:
+            ip = normalize_network(entry.ip)
+        except ValueError:
+            continue
+        groups.setdefault(ip, []).append(entry)
+
+    removed = 0
+    for ip, (keep, *duplicates) in groups.items():
+        if not duplicates and keep.ip == ip:
+            continue
+        notes = [keep.notes] if keep.notes else []
+        for entry in duplicates:
+            keep.source = keep.source or entry.source
+            if entry.notes and entry.notes not in notes:
+                notes.append(entry.notes)
+        ThreatIP.objects.filter(id__in=[entry.id for entry in duplicates]).delete()
+        removed += len(duplicates)
+        keep.ip = ip
+        keep.notes = "\n".join(notes)
+        keep.save(update_fields=["ip", "source", "notes"])
+
+    # Migrations send no signals, so recount for the dashboard's counter here
+    if removed:
+        Counter.objects.filter(name="threat_ips").update(value=ThreatIP.objects.count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('threatintel', '0003_threatip_ip_network'),
+        ('monitor', '0012_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_entries, migrations.RunPython.noop),
+    ]
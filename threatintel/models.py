@@ -1,10 +1,26 @@
-from django.db import models
+from django.db import models, transaction
+
+from .prefixes import normalize_network, validate_network
 
 class ThreatIP(models.Model):
-    ip = models.CharField(max_length=64, unique=True)
+    # A single address ("203.0.113.7") or a CIDR network ("203.0.113.0/24")
+    ip = models.CharField(max_length=64, unique=True, validators=[validate_network])
     source = models.CharField(max_length=100, blank=True)
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    def save(self, *args, **kwargs):
+        try:
+            self.ip = normalize_network(self.ip)
+        except ValueError:
+            pass  # left for full_clean()/the form to report
+        # The threat_ips counter update (monitor/signals.py) commits or rolls back with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    @property
+    def is_network(self):
+        return "/" in self.ip
+
     def __str__(self):
         return f"{self.ip} ({self.source})"
@@ -0,0 +1,20 @@
+# threatintel/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import ThreatIP
+from .matcher import matcher
+
+
+@receiver(post_save, sender=ThreatIP)
+def threat_ip_saved(sender, instance, created, **kwargs):
+    if created:
+        matcher.added(instance)
+    else:
+        # The address itself may have been edited; reload on next lookup.
+        matcher.invalidate()
+
+
+@receiver(post_delete, sender=ThreatIP)
+def threat_ip_deleted(sender, instance, **kwargs):
+    matcher.removed(instance)
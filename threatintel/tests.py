@@ -1,3 +1,151 @@
-from django.test import TestCase
+import importlib
+import ipaddress
+from datetime import datetime, timedelta
 
-# Create your tests here.
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase, TestCase
+
+from .matcher import ThreatMatcher
+from .models import ThreatIP
+from .prefixes import PrefixTable, normalize_network, validate_network
+
+
+def _lookup(table, ip):
+    """The matching network of a PrefixTable lookup as text, or None."""
+    addr = ipaddress.ip_address(ip)
+    hit = table.lookup(int(addr))
+    if hit is None:
+        return None
+    return str(ipaddress.ip_network(hit) if addr.version == 4 else ipaddress.IPv6Network(hit))
+
+
+class NormalizeNetworkTests(SimpleTestCase):
+    def test_single_hosts_are_bare_addresses(self):
+        self.assertEqual(normalize_network("10.0.0.1/32"), "10.0.0.1")
+        self.assertEqual(normalize_network(" 10.0.0.1 "), "10.0.0.1")
+        self.assertEqual(normalize_network("2001:DB8::1/128"), "2001:db8::1")
+
+    def test_host_bits_are_dropped(self):
+        self.assertEqual(normalize_network("10.0.0.7/24"), "10.0.0.0/24")
+        self.assertEqual(normalize_network("2001:db8::1/32"), "2001:db8::/32")
+
+    def test_invalid_values(self):
+        with self.assertRaises(ValueError):
+            normalize_network("10.0.0.300")
+        with self.assertRaises(ValidationError):
+            validate_network("not-an-ip")
+
+
+class PrefixTableTests(SimpleTestCase):
+    NETWORKS = ["10.0.0.0/8", "10.1.0.0/16", "10.1.2.0/24", "10.1.2.3/32", "0.0.0.0/0"]
+
+    def _tables(self, networks):
+        networks = [ipaddress.ip_network(n) for n in networks]
+        added = PrefixTable(32)
+        for network in networks:
+            added.add(network)
+        return added, PrefixTable.build(32, networks)
+
+    def test_longest_prefix_wins_among_overlaps(self):
+        for table in self._tables(self.NETWORKS):
+            self.assertEqual(_lookup(table, "10.1.2.3"), "10.1.2.3/32")
+            self.assertEqual(_lookup(table, "10.1.2.4"), "10.1.2.0/24")
+            self.assertEqual(_lookup(table, "10.1.3.4"), "10.1.0.0/16")
+            self.assertEqual(_lookup(table, "10.2.0.1"), "10.0.0.0/8")
+            self.assertEqual(_lookup(table, "192.0.2.1"), "0.0.0.0/0")
+
+    def test_no_match_outside_every_prefix(self):
+        for table in self._tables(["10.0.0.0/8", "192.168.1.0/24"]):
+            self.assertIsNone(_lookup(table, "11.0.0.0"))
+            self.assertIsNone(_lookup(table, "192.168.2.1"))
+            self.assertIsNone(_lookup(table, "9.255.255.255"))
+
+    def test_adjacent_networks_of_one_length(self):
+        for table in self._tables(["10.0.1.0/24", "10.0.3.0/24", "10.0.2.0/24"]):
+            self.assertEqual(_lookup(table, "10.0.2.200"), "10.0.2.0/24")
+            self.assertIsNone(_lookup(table, "10.0.4.1"))
+
+    def test_duplicates_are_stored_once(self):
+        table = PrefixTable(32)
+        table.add(ipaddress.ip_network("10.0.0.0/8"))
+        table.add(ipaddress.ip_network("10.0.0.0/8"))
+        self.assertEqual(len(table), 1)
+        self.assertEqual(len(PrefixTable.build(32, [ipaddress.ip_network("10.0.0.0/8")] * 2)), 1)
+
+    def test_discard_falls_back_to_shorter_prefix(self):
+        table, _ = self._tables(["10.0.0.0/8", "10.1.0.0/16"])
+        table.discard(ipaddress.ip_network("10.1.0.0/16"))
+        self.assertEqual(_lookup(table, "10.1.0.1"), "10.0.0.0/8")
+        table.discard(ipaddress.ip_network("10.0.0.0/8"))
+        self.assertIsNone(_lookup(table, "10.1.0.1"))
+        self.assertEqual(len(table), 0)
+        table.discard(ipaddress.ip_network("10.0.0.0/8"))  # already gone: no error
+
+    def test_ipv6(self):
+        networks = [ipaddress.ip_network(n) for n in ("2001:db8::/32", "2001:db8:1::/48", "2001:db8:1::5/128")]
+        table = PrefixTable.build(128, networks)
+        self.assertEqual(_lookup(table, "2001:db8:1::5"), "2001:db8:1::5/128")
+        self.assertEqual(_lookup(table, "2001:db8:1::6"), "2001:db8:1::/48")
+        self.assertEqual(_lookup(table, "2001:db8:2::1"), "2001:db8::/32")
+        self.assertIsNone(_lookup(table, "2001:db9::1"))
+
+
+class ThreatMatcherTests(TestCase):
+    def setUp(self):
+        ThreatIP.objects.create(ip="203.0.113.0/24", source="feed")
+        ThreatIP.objects.create(ip="203.0.113.7/32", source="manual")
+        ThreatIP.objects.create(ip="2001:db8::/32", source="feed")
+        self.matcher = ThreatMatcher()
+        self.matcher.load()
+
+    def test_saved_entries_are_normalized(self):
+        self.assertTrue(ThreatIP.objects.filter(ip="203.0.113.7").exists())
+        self.assertFalse(ThreatIP.objects.get(ip="203.0.113.7").is_network)
+
+    def test_most_specific_entry_matches(self):
+        self.assertEqual(str(self.matcher.match("203.0.113.7")), "203.0.113.7/32")
+        self.assertEqual(str(self.matcher.match("203.0.113.8")), "203.0.113.0/24")
+        self.assertEqual(str(self.matcher.match("2001:db8:ffff::1")), "2001:db8::/32")
+        self.assertIn("203.0.113.200", self.matcher)
+        self.assertNotIn("198.51.100.1", self.matcher)
+        self.assertNotIn("not an address", self.matcher)
+
+    def test_refresh_picks_up_rows_written_elsewhere(self):
+        ThreatIP.objects.bulk_create([ThreatIP(ip="198.51.100.0/24")])  # no signals, like a feed import
+        self.assertNotIn("198.51.100.1", self.matcher)
+        self.matcher.refresh()
+        self.assertIn("198.51.100.1", self.matcher)
+
+        ThreatIP.objects.filter(ip="203.0.113.0/24").delete()
+        self.matcher.refresh()
+        self.assertNotIn("203.0.113.8", self.matcher)
+        self.assertIn("203.0.113.7", self.matcher)
+        self.assertEqual(len(self.matcher), 3)
+
+
+class NormalizeMigrationTests(TestCase):
+    migration = importlib.import_module("threatintel.migrations.0004_normalize_threatip")
+
+    def test_entries_are_normalized_and_duplicates_merged(self):
+        from monitor import counters
+
+        # bulk_create skips save(), like rows written before 0003
+        ThreatIP.objects.bulk_create([
+            ThreatIP(ip="10.9.9.9/32", source="", notes="first"),
+            ThreatIP(ip="10.9.9.9", source="feed", notes="second"),
+            ThreatIP(ip="10.9.9.9/32 ", source="other", notes="first"),
+            ThreatIP(ip="10.8.0.7/24", source="feed"),
+            ThreatIP(ip="2001:DB8::1", source="feed"),
+            ThreatIP(ip="bogus", source="feed"),
+        ])
+        now = datetime(2026, 10, 1)
+        for days, ip in enumerate(["10.9.9.9/32", "10.9.9.9", "10.9.9.9/32 "]):
+            ThreatIP.objects.filter(ip=ip).update(created_at=now + timedelta(days=days))
+        self.migration.normalize_entries(apps, None)
+
+        entries = {entry.ip: entry for entry in ThreatIP.objects.all()}
+        self.assertEqual(set(entries), {"10.9.9.9", "10.8.0.0/24", "2001:db8::1", "bogus"})
+        merged = entries["10.9.9.9"]
+        self.assertEqual((merged.source, merged.notes, merged.created_at), ("feed", "first\nsecond", now))
+        self.assertEqual(counters.get(counters.THREAT_IPS), 4)
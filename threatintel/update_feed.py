@@ -1,4 +1,8 @@
+from monitor import counters
+
 from .models import ThreatIP
+from .matcher import matcher
+from .prefixes import normalize_network
 from .feed_sources import fetch_feed, TOR_EXIT_NODE_FEED, BOTNET_FEED
 
 def update_threat_feeds():
@@ -8,12 +12,24 @@ def update_threat_feeds():
         "Botnet Activity": fetch_feed(BOTNET_FEED),
     }
 
-    added = 0
+    existing = set(ThreatIP.objects.values_list("ip", flat=True))
+    new_rows = []
 
     for source, ip_list in feeds.items():
-        for ip in ip_list:
-            if not ThreatIP.objects.filter(ip=ip).exists():
-                ThreatIP.objects.create(ip=ip, source=source)
-                added += 1
+        for entry in ip_list:
+            # Feeds mix single addresses and CIDR networks (e.g. firehol ipsets)
+            try:
+                ip = normalize_network(entry)
+            except ValueError:
+                continue
+            if ip not in existing:
+                existing.add(ip)
+                new_rows.append(ThreatIP(ip=ip, source=source))
+
+    # bulk_create skips post_save, so pull the new rows into the matcher here
+    ThreatIP.objects.bulk_create(new_rows, batch_size=1000, ignore_conflicts=True)
+    matcher.refresh()
+    # ...and it skips the counter signal too
+    counters.set_value(counters.THREAT_IPS, ThreatIP.objects.count())
 
-    return added
+    return len(new_rows)